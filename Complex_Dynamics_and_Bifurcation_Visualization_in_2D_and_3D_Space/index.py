@@ -1,9 +1,17 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 import numpy as np
 
+try:
+  from numba import njit, prange
+except ImportError:  # numba не установлена - расчёты только на NumPy
+  njit = None
+
 # Задание 1: Функция для расчета следующей точки в 2D
 def point_2d(x, y, a, b):
-  x1, y1 = 1 - a * x**2 + y, b * x
+  # x * x, а не x**2: умножение округляется одинаково для float и массивов NumPy
+  x1, y1 = 1 - a * (x * x) + y, b * x
   return x1, y1
 
 # Задание 2: Параметры для 2D траекторий
@@ -18,14 +26,32 @@ def route_2D(x, y, a, b, step):
     route_y.append(y)
   return route_x, route_y
 
+# Векторный вариант route_2D: много начальных точек и пар (a, b) за один проход
+def route_2D_batch(x, y, a, b, step, out=None):
+  """
+  x, y, a, b - числа или массивы, приводимые к общей длине n.
+  Возвращает массивы route_x, route_y формы (step + 1, n): строка i - точки после i шагов,
+  столбец j - траектория route_2D(x[j], y[j], a[j], b[j], step). Шаг считается тем же point_2d,
+  поэтому значения совпадают со скалярными бит в бит; расходящиеся траектории дают inf/nan.
+  out - необязательная пара заранее выделенных массивов формы (step + 1, n).
+  """
+  x, y, a, b = (np.ravel(v) for v in np.broadcast_arrays(x, y, a, b))
+  n = len(x)
+  if out is None:
+    out = (np.empty((step + 1, n)), np.empty((step + 1, n)))
+  route_x, route_y = out
+  route_x[0], route_y[0] = x, y
+  with np.errstate(over='ignore', invalid='ignore'):
+    for i in range(step):
+      route_x[i + 1], route_y[i + 1] = point_2d(route_x[i], route_y[i], a, b)
+  return route_x, route_y
+
 
 # Задание 3: Построение 2D траекторий
 def plot_2d_trajectories(initial_x, initial_y, parameters, steps=1000):
-  route_x_2d, route_y_2d = [], []
-  for a, b in parameters:
-    route_x, route_y = route_2D(initial_x, initial_y, a, b, steps)
-    route_x_2d.append(route_x)
-    route_y_2d.append(route_y)
+  a, b = np.array(parameters, dtype=float).T
+  routes_x, routes_y = route_2D_batch(initial_x, initial_y, a, b, steps)
+  route_x_2d, route_y_2d = routes_x.T, routes_y.T
 
   figure, ax = plt.subplots(figsize=(8, 8))
   colors = ["b", "g", "r"]
@@ -41,7 +67,8 @@ def plot_2d_trajectories(initial_x, initial_y, parameters, steps=1000):
 
 # Задание 4: Функция для расчета следующей точки в 3D
 def point_3d(x, y, z, B, M1, M2):
-  x1, y1, z1 = y, z, M1 + B * x + M2 * y - z**2.0
+  # z * z, а не z**2.0 - как и в point_2d, чтобы совпадали скалярный и векторный расчёт
+  x1, y1, z1 = y, z, M1 + B * x + M2 * y - z * z
   return x1, y1, z1
 
 # Задание 4: Функция для расчета 3D траекторий
@@ -54,6 +81,19 @@ def route_3D(x, y, z, B, M1, M2, step):
     route_z.append(z)
   return route_x, route_y, route_z
 
+# Векторный вариант route_3D: столбец j - траектория route_3D(x[j], ..., M2[j], step)
+def route_3D_batch(x, y, z, B, M1, M2, step, out=None):
+  x, y, z, B, M1, M2 = (np.ravel(v) for v in np.broadcast_arrays(x, y, z, B, M1, M2))
+  n = len(x)
+  if out is None:
+    out = tuple(np.empty((step + 1, n)) for _ in range(3))
+  route_x, route_y, route_z = out
+  route_x[0], route_y[0], route_z[0] = x, y, z
+  with np.errstate(over='ignore', invalid='ignore'):
+    for i in range(step):
+      route_x[i + 1], route_y[i + 1], route_z[i + 1] = point_3d(route_x[i], route_y[i], route_z[i], B, M1, M2)
+  return route_x, route_y, route_z
+
 
 # Задание 4: Построение 3D траекторий
 def plot_3d_trajectories(initial_x, initial_y, initial_z, parameters, B, steps=1000):
@@ -78,14 +118,6 @@ def plot_3d_trajectories(initial_x, initial_y, initial_z, parameters, B, steps=1
   ax.legend()
   plt.show()
 
-# Параметры для построения графиков
-parameters = [(0.9, -0.3), (1.27, 0.03), (1.42, 0.26)]
-plot_2d_trajectories(0.1, 0.1, parameters)
-
-B = 0.7
-para_3d = [(0.06, 0.06), (-0.5, 0.03), (-0.28, 0.23)]
-plot_3d_trajectories(0.1, 0.1, 0.1, para_3d, B)
-
 # Задание 5: Логистическое отображение и бифуркационное дерево
 def logistic_map(x, r, steps=10000, marked=1000):
   for _ in range(steps - marked):
@@ -96,21 +128,414 @@ def logistic_map(x, r, steps=10000, marked=1000):
     route.append(x)
   return route
 
-def plot_bifurcation_diagram(r_start=2.4, r_end=4.0, r_steps=1000, x_start=0.5):
-  r_values = np.linspace(r_start, r_end, r_steps)
-  r_points = []
-  x_values = []
+BIFURCATION_CHUNK = 4096  # Число значений r, итерируемых вместе (рабочий набор остаётся в кэше)
+
+# Векторный logistic_map для части значений r: x итерируется на месте, последние marked шагов - в out
+def _logistic_chunk(x, r, steps, marked, out):
+  tmp = np.empty_like(x)
+  # Переходный процесс пропускается без сохранения; порядок операций как в logistic_map: (r * x) * (1 - x)
+  for _ in range(steps - marked):
+    np.subtract(1, x, out=tmp)
+    x *= r
+    x *= tmp
+  for i in range(marked):
+    np.subtract(1, x, out=tmp)
+    x *= r
+    x *= tmp
+    out[i] = x
 
-  for r in r_values:
-    points = logistic_map(x_start, r)
-    r_points.extend([r] * len(points))
-    x_values.extend(points)
+if njit is not None:
+  # То же самое, скомпилированное numba: каждый столбец r итерируется в своём потоке
+  @njit(cache=True, parallel=True)
+  def _logistic_jit(x, r, steps, marked, out):
+    for j in prange(len(r)):
+      xj = x[j]
+      rj = r[j]
+      for _ in range(steps - marked):
+        xj = rj * xj * (1 - xj)
+      for i in range(marked):
+        xj = rj * xj * (1 - xj)
+        out[i, j] = xj
+
+def bifurcation_points(r_values, x_start=0.5, steps=10000, marked=1000, out=None, use_jit=None,
+                       chunk=BIFURCATION_CHUNK):
+  """
+  logistic_map сразу для всех r: возвращает массив (marked, len(r_values)), столбец j которого
+  совпадает с logistic_map(x_start, r_values[j], steps, marked).
+  out - заранее выделенный массив такой формы (например, np.memmap для 10^5 столбцов и больше).
+  use_jit - None: numba, если установлена; True/False - принудительно.
+  Без numba значения r обрабатываются частями по chunk столбцов.
+  """
+  r_values = np.ascontiguousarray(r_values, dtype=np.float64)
+  if out is None:
+    out = np.empty((marked, len(r_values)))
+  if use_jit is None:
+    use_jit = njit is not None
+  if use_jit:
+    if njit is None:
+      raise ImportError("Для use_jit=True нужна библиотека numba")
+    _logistic_jit(np.full(len(r_values), x_start, dtype=np.float64), r_values, steps, marked, out)
+    return out
+  for start in range(0, len(r_values), chunk):
+    part = slice(start, start + chunk)
+    x = np.full(len(r_values[part]), x_start, dtype=np.float64)
+    _logistic_chunk(x, r_values[part], steps, marked, out[:, part])
+  return out
+
+def plot_bifurcation_diagram(r_start=2.4, r_end=4.0, r_steps=1000, x_start=0.5, density=False):
+  if density:
+    # Вместо миллиона точек scatter - гистограмма плотности (см. bifurcation_density)
+    image = bifurcation_density(r_start, r_end, r_steps, x_start)
+    plot_density(image, 'Бифуркационное дерево для логистического отображения', xlabel='r', ylabel='x')
+    return
+  r_values = np.linspace(r_start, r_end, r_steps)
+  x_values = bifurcation_points(r_values, x_start)
+  r_points = np.broadcast_to(r_values, x_values.shape)
 
   plt.figure(figsize=(12, 8))
-  plt.scatter(r_points, x_values, s=0.1, color='green')
+  plt.scatter(r_points.ravel(), x_values.ravel(), s=0.1, color='green')
   plt.xlabel('r')
   plt.ylabel('x')
   plt.title('Бифуркационное дерево для логистического отображения')
   plt.show()
 
-plot_bifurcation_diagram()
+
+# Перебор параметров: сводка по каждой точке сетки параметров, считается в пуле процессов
+SWEEP_TRANSIENT = 1000  # Шагов переходного процесса, которые отбрасываются
+SWEEP_SAMPLES = 256  # Шагов, по которым определяются период и границы аттрактора
+MAX_PERIOD = 64
+PERIOD_TOLERANCE = 1e-6
+ESCAPE_RADIUS = 1e6  # Траектория, ушедшая дальше, считается расходящейся
+SWEEP_CHUNK = 4096  # Точек сетки параметров в одной задаче процесса
+
+def detect_period(routes, max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE):
+  """
+  routes - массивы координат формы (samples, n), например из route_2D_batch.
+  Возвращает для каждой траектории наименьший период p <= max_period, для которого
+  все точки повторяются через p шагов с точностью tol, или 0, если периода нет.
+  """
+  routes = [np.asarray(route) for route in routes]
+  samples, n = routes[0].shape
+  period = np.zeros(n, dtype=np.int64)
+  with np.errstate(invalid='ignore'):
+    for p in range(1, min(max_period, samples - 1) + 1):
+      open_ = np.flatnonzero(period == 0)
+      if not len(open_):
+        break
+      repeats = np.ones(len(open_), dtype=bool)
+      for route in routes:
+        part = route[:, open_]
+        repeats &= (np.abs(part[p:] - part[:-p]) <= tol * (1 + np.abs(part[p:]))).all(axis=0)
+      period[open_[repeats]] = p
+  return period
+
+def summarize_routes(routes, max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE):
+  """Признак расходимости, период и границы аттрактора (min/max каждой координаты) по траекториям."""
+  names = "xyz"[:len(routes)]
+  with np.errstate(invalid='ignore'):
+    diverged = np.zeros(routes[0].shape[1], dtype=bool)
+    for route in routes:
+      diverged |= ~(np.abs(route) <= ESCAPE_RADIUS).all(axis=0)
+  summary = {'diverged': diverged, 'period': np.where(diverged, 0, detect_period(routes, max_period, tol))}
+  for name, route in zip(names, routes):
+    summary[f"{name}_min"] = np.where(diverged, np.nan, route.min(axis=0))
+    summary[f"{name}_max"] = np.where(diverged, np.nan, route.max(axis=0))
+  return summary
+
+def _henon_sweep_task(task):
+  a, b, x, y, transient, samples, max_period, tol = task
+  # Переходный процесс - без сохранения точек
+  with np.errstate(over='ignore', invalid='ignore'):
+    for _ in range(transient):
+      x, y = point_2d(x, y, a, b)
+  return summarize_routes(route_2D_batch(x, y, a, b, samples - 1), max_period, tol)
+
+def _map3d_sweep_task(task):
+  M1, M2, B, x, y, z, transient, samples, max_period, tol = task
+  with np.errstate(over='ignore', invalid='ignore'):
+    for _ in range(transient):
+      x, y, z = point_3d(x, y, z, B, M1, M2)
+  return summarize_routes(route_3D_batch(x, y, z, B, M1, M2, samples - 1), max_period, tol)
+
+def _run_sweep(task_function, grids, fixed, workers, chunk):
+  """Делит точки сетки на задачи по chunk и считает их в пуле процессов (workers=1 - в этом процессе)."""
+  shape = grids[0].shape
+  flat = [grid.ravel() for grid in grids]
+  tasks = [tuple(values[start:start + chunk] for values in flat) + fixed for start in range(0, flat[0].size, chunk)]
+  # Пустая сетка: одна пустая задача даёт пустые массивы нужных типов
+  tasks = tasks or [tuple(values[:0] for values in flat) + fixed]
+  workers = workers or os.cpu_count() or 1
+  if workers == 1 or len(tasks) == 1:
+    parts = [task_function(task) for task in tasks]
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      parts = list(executor.map(task_function, tasks))
+  return {key: np.concatenate([part[key] for part in parts]).reshape(shape) for key in parts[0]}
+
+def sweep_2d(a_values, b_values, x=0.1, y=0.1, transient=SWEEP_TRANSIENT, samples=SWEEP_SAMPLES,
+             max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE, workers=None, chunk=SWEEP_CHUNK):
+  """
+  Отображение Хенона (point_2d) на сетке параметров: результат - словарь массивов формы
+  (len(b_values), len(a_values)): diverged, period, x_min, x_max, y_min, y_max.
+  """
+  a_grid, b_grid = np.meshgrid(np.asarray(a_values, dtype=float), np.asarray(b_values, dtype=float))
+  return _run_sweep(_henon_sweep_task, (a_grid, b_grid),
+                    (float(x), float(y), transient, samples, max_period, tol), workers, chunk)
+
+def sweep_3d(M1_values, M2_values, B=0.7, x=0.1, y=0.1, z=0.1, transient=SWEEP_TRANSIENT, samples=SWEEP_SAMPLES,
+             max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE, workers=None, chunk=SWEEP_CHUNK):
+  """
+  3D-отображение (point_3d) на сетке (M1, M2): массивы формы (len(M2_values), len(M1_values)):
+  diverged, period и границы x, y, z.
+  """
+  M1_grid, M2_grid = np.meshgrid(np.asarray(M1_values, dtype=float), np.asarray(M2_values, dtype=float))
+  return _run_sweep(_map3d_sweep_task, (M1_grid, M2_grid),
+                    (float(B), float(x), float(y), float(z), transient, samples, max_period, tol), workers, chunk)
+
+# Показатели Ляпунова и классификация режимов без построения графиков
+LYAPUNOV_STEPS = 5000  # Шагов усреднения после переходного процесса
+CHAOS_THRESHOLD = 1e-3  # Старший показатель больше порога - хаос
+
+REGIME_PERIODIC = 1
+REGIME_QUASIPERIODIC = 2
+REGIME_CHAOTIC = 3
+REGIME_DIVERGENT = 4
+
+REGIME_NAMES = {
+  REGIME_PERIODIC: "периодический",
+  REGIME_QUASIPERIODIC: "квазипериодический или с периодом больше MAX_PERIOD",
+  REGIME_CHAOTIC: "хаотический",
+  REGIME_DIVERGENT: "расходящийся",
+}
+
+# Шаг отображения и его якобиан, применённый к касательному вектору v
+def _logistic_step(state, params):
+  x, = state
+  r, = params
+  return (r * x * (1 - x),)
+
+def _logistic_tangent(state, v, params):
+  x, = state
+  r, = params
+  return (r * (1 - 2 * x) * v[0],)
+
+def _henon_step(state, params):
+  return point_2d(*state, *params)
+
+def _henon_tangent(state, v, params):
+  # J = [[-2ax, 1], [b, 0]]
+  x, _ = state
+  a, b = params
+  return -2 * a * x * v[0] + v[1], b * v[0]
+
+def _map3d_step(state, params):
+  B, M1, M2 = params
+  return point_3d(*state, B, M1, M2)
+
+def _map3d_tangent(state, v, params):
+  # J = [[0, 1, 0], [0, 0, 1], [B, M2, -2z]]
+  _, _, z = state
+  B, _, M2 = params
+  return v[1], v[2], B * v[0] + M2 * v[1] - 2 * z * v[2]
+
+def _analyze_chunk(step, tangent, state, params, transient, steps, samples, max_period, tol):
+  """
+  Итерирует траектории вместе с касательным вектором. Старший показатель Ляпунова - среднее
+  log|J v| за steps шагов после transient (вектор нормируется на каждом шаге).
+  Траектория, вышедшая за ESCAPE_RADIUS, сразу исключается из расчёта; когда таких не осталось
+  ни одной активной, цикл прерывается досрочно. Период ищется по последним samples точкам.
+  """
+  n = len(state[0])
+  lyapunov = np.full(n, np.nan)
+  escape_step = np.full(n, -1, dtype=np.int64)
+  history = [np.full((samples, n), np.nan) for _ in state]
+  active = np.arange(n)
+  unit = 1 / np.sqrt(len(state))
+  v = tuple(np.full(n, unit) for _ in state)
+  log_sum = np.zeros(n)
+  tiny = np.finfo(float).tiny  # log(0) в сверхустойчивых точках заменяется на log(tiny)
+  total = transient + steps
+  with np.errstate(over='ignore', invalid='ignore'):
+    for i in range(total):
+      v = tangent(state, v, params)
+      norm = np.sqrt(sum(c * c for c in v))
+      if i >= transient:
+        log_sum += np.log(np.maximum(norm, tiny))
+      # Нулевой вектор (например, x = 0.5 у логистического отображения) заменяется единичным
+      degenerate = ~(norm > 0)
+      v = tuple(np.where(degenerate, unit, c / np.where(degenerate, 1, norm)) for c in v)
+      state = step(state, params)
+      if i >= total - samples:
+        for route, coord in zip(history, state):
+          route[i - total + samples, active] = coord
+      escaped = np.zeros(len(active), dtype=bool)
+      for coord in state:
+        escaped |= ~(np.abs(coord) <= ESCAPE_RADIUS)
+      if escaped.any():
+        escape_step[active[escaped]] = i + 1
+        keep = ~escaped
+        active, log_sum = active[keep], log_sum[keep]
+        state, v, params = (tuple(c[keep] for c in group) for group in (state, v, params))
+      if not len(active):
+        break
+  diverged = escape_step >= 0
+  lyapunov[active] = log_sum / steps
+  period = detect_period(history, max_period, tol)
+  period[diverged] = 0
+  return {'lyapunov': lyapunov, 'diverged': diverged, 'escape_step': escape_step, 'period': period,
+          'regime': classify_regime(lyapunov, period, diverged)}
+
+def classify_regime(lyapunov, period, diverged, threshold=CHAOS_THRESHOLD):
+  """
+  Код режима (REGIME_*) по старшему показателю Ляпунова, периоду и признаку расходимости.
+  Положительный показатель важнее найденного периода: орбита, попавшая точно на
+  неустойчивый цикл, повторяется, но соседние орбиты от неё разбегаются - это хаос.
+  """
+  chaotic = lyapunov > threshold
+  regime = np.where(chaotic, REGIME_CHAOTIC, REGIME_QUASIPERIODIC)
+  regime = np.where((period > 0) & ~chaotic, REGIME_PERIODIC, regime)
+  return np.where(diverged, REGIME_DIVERGENT, regime)
+
+def _logistic_analysis_task(task):
+  r, x, transient, steps, samples, max_period, tol = task
+  return _analyze_chunk(_logistic_step, _logistic_tangent, (np.full(len(r), x),), (r,),
+                        transient, steps, samples, max_period, tol)
+
+def _henon_analysis_task(task):
+  a, b, x, y, transient, steps, samples, max_period, tol = task
+  return _analyze_chunk(_henon_step, _henon_tangent, (np.full(len(a), x), np.full(len(a), y)), (a, b),
+                        transient, steps, samples, max_period, tol)
+
+def _map3d_analysis_task(task):
+  M1, M2, B, x, y, z, transient, steps, samples, max_period, tol = task
+  state = (np.full(len(M1), x), np.full(len(M1), y), np.full(len(M1), z))
+  return _analyze_chunk(_map3d_step, _map3d_tangent, state, (np.full(len(M1), B), M1, M2),
+                        transient, steps, samples, max_period, tol)
+
+def logistic_lyapunov(r_values, x_start=0.1, transient=SWEEP_TRANSIENT, steps=LYAPUNOV_STEPS, samples=SWEEP_SAMPLES,
+                      max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE, workers=1, chunk=SWEEP_CHUNK):
+  """
+  Логистическое отображение для всех r: словарь массивов формы r_values -
+  lyapunov (nan у расходящихся), diverged, escape_step (-1, если не ушла), period, regime.
+  x_start по умолчанию не 0.5: при r = 4 точка 0.5 за два шага попадает в неустойчивую
+  неподвижную точку 0 (0.5 -> 1 -> 0), и хаотичный режим выглядел бы периодом 1.
+  """
+  r_values = np.asarray(r_values, dtype=float)
+  return _run_sweep(_logistic_analysis_task, (r_values,),
+                    (float(x_start), transient, steps, samples, max_period, tol), workers, chunk)
+
+def henon_lyapunov(a, b, x=0.1, y=0.1, transient=SWEEP_TRANSIENT, steps=LYAPUNOV_STEPS, samples=SWEEP_SAMPLES,
+                   max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE, workers=1, chunk=SWEEP_CHUNK):
+  """То же для отображения Хенона (point_2d); a и b - числа или массивы, приводимые к общей форме."""
+  a, b = (np.array(v, dtype=float) for v in np.broadcast_arrays(a, b))
+  return _run_sweep(_henon_analysis_task, (a, b),
+                    (float(x), float(y), transient, steps, samples, max_period, tol), workers, chunk)
+
+def map3d_lyapunov(M1, M2, B=0.7, x=0.1, y=0.1, z=0.1, transient=SWEEP_TRANSIENT, steps=LYAPUNOV_STEPS,
+                   samples=SWEEP_SAMPLES, max_period=MAX_PERIOD, tol=PERIOD_TOLERANCE, workers=1, chunk=SWEEP_CHUNK):
+  """То же для 3D-отображения (point_3d); M1 и M2 - числа или массивы, приводимые к общей форме."""
+  M1, M2 = (np.array(v, dtype=float) for v in np.broadcast_arrays(M1, M2))
+  return _run_sweep(_map3d_analysis_task, (M1, M2),
+                    (float(B), float(x), float(y), float(z), transient, steps, samples, max_period, tol),
+                    workers, chunk)
+
+# Растеризация в гистограмму плотности: точки суммируются в счётчики пикселей по мере расчёта,
+# поэтому память зависит только от размера изображения, а не от числа точек
+class DensityImage:
+  def __init__(self, x_range, y_range, width=1600, height=1000):
+    self.x_range = x_range
+    self.y_range = y_range
+    self.width = width
+    self.height = height
+    self.counts = np.zeros((height, width), dtype=np.int64)
+
+  def pixel_index(self, x, y):
+    """Номера пикселей (строка * width + столбец) для точек внутри области; остальные отбрасываются."""
+    (x0, x1), (y0, y1) = self.x_range, self.y_range
+    x = np.ravel(x)
+    y = np.ravel(y)
+    with np.errstate(invalid='ignore'):
+      inside = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+    col = ((x[inside] - x0) * (self.width / (x1 - x0))).astype(np.int64)
+    row = ((y[inside] - y0) * (self.height / (y1 - y0))).astype(np.int64)
+    return np.minimum(row, self.height - 1) * self.width + np.minimum(col, self.width - 1)
+
+  def add(self, x, y):
+    """Добавляет порцию точек (массивы любой формы)."""
+    index = self.pixel_index(x, y)
+    if len(index) >= self.counts.size:
+      self.counts += np.bincount(index, minlength=self.counts.size).reshape(self.counts.shape)
+    elif len(index):
+      # Порция меньше изображения: копим прямо в счётчиках, без временного массива размером с картинку
+      np.add.at(self.counts.reshape(-1), index, 1)
+
+  def shade(self, scale="log", gamma=1.0):
+    """
+    Яркость пикселей в [0, 1]: scale="log" - log(1 + n) / log(1 + max), "linear" - n / max;
+    затем степень gamma (gamma < 1 высветляет редкие точки).
+    """
+    peak = self.counts.max()
+    if peak == 0:
+      return np.zeros(self.counts.shape)
+    if scale == "log":
+      image = np.log1p(self.counts) / np.log1p(peak)
+    elif scale == "linear":
+      image = self.counts / peak
+    else:
+      raise ValueError(f"Неизвестная шкала: {scale}")
+    return image ** gamma if gamma != 1.0 else image
+
+  def save(self, filename, scale="log", gamma=1.0, cmap="inferno"):
+    """Сохраняет изображение (PNG и другие форматы matplotlib) без окна; ось y направлена вверх."""
+    plt.imsave(filename, self.shade(scale, gamma), cmap=cmap, vmin=0, vmax=1, origin="lower")
+
+# Бифуркационное дерево плотностью: каждая порция столбцов r сразу переводится в счётчики
+def bifurcation_density(r_start=2.4, r_end=4.0, r_steps=1600, x_start=0.5, steps=10000, marked=1000,
+                        height=1000, chunk=BIFURCATION_CHUNK, use_jit=None):
+  image = DensityImage((r_start, r_end), (0.0, 1.0), width=r_steps, height=height)
+  # Значения r - в центрах столбцов пикселей, чтобы каждое попало ровно в свой столбец
+  r_values = r_start + (np.arange(r_steps) + 0.5) * ((r_end - r_start) / r_steps)
+  buffer = np.empty((marked, min(chunk, r_steps)))
+  for start in range(0, r_steps, chunk):
+    part = r_values[start:start + chunk]
+    points = bifurcation_points(part, x_start, steps, marked, out=buffer[:, :len(part)], use_jit=use_jit)
+    image.add(np.broadcast_to(part, points.shape), points)
+  return image
+
+# Плотность траекторий Хенона: шаги считаются блоками по block строк в одном и том же буфере
+def henon_density(x, y, a, b, steps, x_range=(-1.5, 1.5), y_range=(-0.5, 0.5), width=1600, height=1000,
+                  skip=0, block=256):
+  """skip - число начальных шагов, которые не попадают в изображение (переходный процесс)."""
+  image = DensityImage(x_range, y_range, width, height)
+  x, y, a, b = (np.ravel(v) for v in np.broadcast_arrays(x, y, a, b))
+  buffer = (np.empty((block + 1, len(x))), np.empty((block + 1, len(x))))
+  done = 0
+  while done < steps:
+    count = min(block, steps - done)
+    route_x, route_y = route_2D_batch(x, y, a, b, count, out=(buffer[0][:count + 1], buffer[1][:count + 1]))
+    first = max(skip - done, 0) + 1
+    if first <= count:
+      image.add(route_x[first:], route_y[first:])
+    x, y = route_x[count].copy(), route_y[count].copy()
+    done += count
+  return image
+
+def plot_density(image, title="", scale="log", gamma=1.0, cmap="inferno", xlabel="x", ylabel="y"):
+  plt.figure(figsize=(12, 8))
+  (x0, x1), (y0, y1) = image.x_range, image.y_range
+  plt.imshow(image.shade(scale, gamma), cmap=cmap, origin="lower", extent=(x0, x1, y0, y1), aspect="auto")
+  plt.xlabel(xlabel)
+  plt.ylabel(ylabel)
+  plt.title(title)
+  plt.show()
+
+if __name__ == "__main__":
+  # Параметры для построения графиков
+  parameters = [(0.9, -0.3), (1.27, 0.03), (1.42, 0.26)]
+  plot_2d_trajectories(0.1, 0.1, parameters)
+
+  B = 0.7
+  para_3d = [(0.06, 0.06), (-0.5, 0.03), (-0.28, 0.23)]
+  plot_3d_trajectories(0.1, 0.1, 0.1, para_3d, B)
+
+  plot_bifurcation_diagram()
@@ -0,0 +1,399 @@
+"""
+Бенчмарк и сверка формул GeometricShapesLibrary.
+
+Для каждого вида фигур и каждого размера входа замеряются создание из исходных параметров
+(списков Python) с проверкой, проверка с долей некорректных фигур, get_sq и get_perimetr -
+по одной фигуре (Circle, Triangle, Quadrangle, Nangle) и пакетом (ShapeBatch). N-угольники
+бывают правильными, произвольными выпуклыми и невыпуклыми; для двух последних замеряются
+ещё проверки выпуклости и самопересечений, а для отдельных больших невыпуклых многоугольников -
+polygon_is_simple и площадь. Затем площади сверяются между формулами:
+Герон и две стороны с углом в Triangle.get_sq, диагонали и формула шнурования для
+Quadrangle, формула правильного многоугольника и формула шнурования для Nangle,
+площадь по сторонам и углам с площадью по исходным вершинам для произвольных N-угольников,
+а также одиночные классы с пакетными. Результаты пишутся в JSON:
+
+    python benchmark.py --sizes 1000 100000 --output new.json --compare old.json
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import numpy as np
+import matplotlib
+
+from index import (Circle, Triangle, Quadrangle, Nangle, InvalidShapeError, VALID, make_batch,
+                   build_vertices, polygon_vertices, polygon_is_simple, shoelace_area)
+
+KINDS = ('circle', 'triangle', 'quadrangle', 'nangle', 'nangle_irregular', 'nangle_concave')
+OPERATIONS = ('construct', 'validate', 'get_sq', 'get_perimetr')
+SHAPE_CHECKS = 'is_convex/is_simple'  # Дополнительная операция для произвольных N-угольников
+IRREGULAR_KINDS = ('nangle_irregular', 'nangle_concave')
+INVALID_SHARE = 0.1  # Доля фигур с неверной суммой углов (или радиусом) при замере проверки
+DEFAULT_THRESHOLD = 0.2  # Допустимое замедление при сравнении (20%)
+DEFAULT_TOLERANCE = 1e-9  # Допустимое относительное расхождение формул площади
+
+
+def n_angles_of(kind, nangle_n):
+    return {'circle': 0, 'triangle': 3, 'quadrangle': 4}.get(kind, nangle_n)
+
+
+def generate(kind, size, rng, nangle_n):
+    """Углы (size, n) и стороны корректных и замкнутых фигур данного вида."""
+    if kind == 'circle':
+        return np.empty((size, 0)), rng.uniform(0.5, 5, (size, 1))
+    if kind == 'triangle':
+        # Углы случайны, стороны - по теореме синусов (угол C лежит между сторонами a и b)
+        a_angle = rng.uniform(10, 150, size)
+        b_angle = rng.uniform(5, 170 - a_angle)
+        angles = np.column_stack([a_angle, b_angle, 180 - a_angle - b_angle])
+        return angles, rng.uniform(1, 10, (size, 1)) * np.sin(np.radians(angles))
+    if kind == 'quadrangle':
+        return generate_quadrangles(size, rng)
+    if kind in IRREGULAR_KINDS:
+        angles, sides, _ = generate_polygons(size, nangle_n, rng, concave=kind == 'nangle_concave')
+        return angles, sides
+    n = nangle_n
+    return np.full((size, n), (n - 2) * 180 / n), np.repeat(rng.uniform(1, 10, (size, 1)), n, axis=1)
+
+
+def generate_polygons(size, n, rng, concave):
+    """
+    Произвольные простые N-угольники: вершины обходятся против часовой стрелки по возрастанию
+    полярного угла. Выпуклые лежат на окружности; у невыпуклых радиусы вершин случайны,
+    а первая вершина вдавлена внутрь (при n >= 8 почти всегда есть угол больше 180 градусов).
+    Возвращает углы, стороны и площадь по исходным вершинам (для сверки с площадью по сторонам и углам).
+    """
+    # Шаги полярного угла различаются не больше чем втрое: при n >= 5 каждый меньше 180 градусов,
+    # поэтому многоугольник звёздный относительно начала координат и не самопересекается
+    steps = rng.uniform(1, 3, (size, n))
+    polar = 2 * np.pi * (np.cumsum(steps, axis=1) - steps) / steps.sum(axis=1, keepdims=True)
+    radius = rng.uniform(1, 10, (size, 1))
+    if concave:
+        radius = radius * rng.uniform(0.4, 1, (size, n))
+        radius[:, 0] *= 0.3  # Вмятина у первой вершины
+    return polygon_parameters(radius * np.cos(polar), radius * np.sin(polar))
+
+
+def polygon_parameters(x, y):
+    """Внутренние углы, стороны и площадь многоугольников по вершинам (N, n), обход против часовой стрелки."""
+    dx, dy = np.roll(x, -1, axis=1) - x, np.roll(y, -1, axis=1) - y
+    headings = np.degrees(np.arctan2(dy, dx))
+    turns = (headings - np.roll(headings, 1, axis=1) + 180) % 360 - 180
+    return 180 - turns, np.hypot(dx, dy), np.abs(shoelace_area(x, y))
+
+
+def generate_flower(n, rng):
+    """
+    Большой невыпуклый многоугольник - «цветок» с плавно меняющимся радиусом: типичный контур
+    из коротких сторон (у случайных радиусов из generate_polygons все n сторон длинные и лежат
+    рядом, что для сетки polygon_is_simple - худший случай).
+    """
+    polar = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    petals, phase = rng.integers(5, 12), rng.uniform(0, 2 * np.pi)
+    radius = 10 * (1 + 0.4 * np.sin(petals * polar + phase) + 0.05 * np.sin(7 * petals * polar))
+    return polygon_parameters((radius * np.cos(polar))[None], (radius * np.sin(polar))[None])
+
+
+def generate_quadrangles(size, rng):
+    """
+    Четырёхугольники, обход которых (как в draw) замыкается: углы случайны, стороны c и d
+    подбираются из условия замыкания; четверть фигур - прямоугольники.
+    """
+    angles = np.empty((0, 4))
+    sides = np.empty((0, 4))
+    while len(angles) < size:
+        count = 2 * (size - len(angles)) + 16
+        first = rng.uniform(40, 140, (count, 3))
+        candidate = np.column_stack([first, 360 - first.sum(axis=1)])
+        headings = np.radians(np.cumsum(candidate, axis=1))
+        known = rng.uniform(1, 10, (count, 2))
+        # c * e2 + d * e3 = -(a * e0 + b * e1), где e_i - направление i-й стороны
+        rhs = -(known[:, :1] * np.stack([np.cos(headings[:, 0]), np.sin(headings[:, 0])], axis=1)
+                + known[:, 1:] * np.stack([np.cos(headings[:, 1]), np.sin(headings[:, 1])], axis=1))
+        matrix = np.stack([np.stack([np.cos(headings[:, 2]), np.cos(headings[:, 3])], axis=1),
+                           np.stack([np.sin(headings[:, 2]), np.sin(headings[:, 3])], axis=1)], axis=1)
+        solvable = np.abs(np.linalg.det(matrix)) > 1e-6
+        solved = np.full((count, 2), -1.0)
+        solved[solvable] = np.linalg.solve(matrix[solvable], rhs[solvable][..., None])[..., 0]
+        good = (candidate[:, 3] > 0) & (candidate[:, 3] < 360) & (solved > 0.1).all(axis=1)
+        angles = np.concatenate([angles, candidate[good]])
+        sides = np.concatenate([sides, np.column_stack([known, solved])[good]])
+    angles, sides = angles[:size], sides[:size]
+    rectangles = rng.random(size) < 0.25
+    angles[rectangles] = 90
+    sides[rectangles] = np.tile(rng.uniform(1, 10, (rectangles.sum(), 2)), 2)
+    return angles, sides
+
+
+def spoil(kind, angles, sides, rng):
+    """Копии массивов, в которых INVALID_SHARE фигур некорректны."""
+    angles, sides = angles.copy(), sides.copy()
+    bad = rng.random(len(sides)) < INVALID_SHARE
+    if kind == 'circle':
+        sides[bad, 0] = -sides[bad, 0]
+    else:
+        angles[bad, 0] += 5
+    return angles, sides
+
+
+def make_shape(kind, n_angles, angles, sides):
+    if kind == 'circle':
+        return Circle(sides[0])
+    if kind == 'triangle':
+        return Triangle(angles, sides)
+    if kind == 'quadrangle':
+        return Quadrangle(angles, sides)
+    return Nangle(n_angles, angles, sides)
+
+
+class Timer:
+    """Замер времени операции над count фигурами."""
+    @staticmethod
+    def measure(func, count):
+        started = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - started
+        return {'seconds': round(seconds, 6), 'count': count,
+                'per_second': round(count / seconds, 1) if seconds > 0 else None}
+
+
+def run_scalar(kind, n_angles, angles, sides, bad_angles, bad_sides):
+    angles, sides = angles.tolist(), sides.tolist()
+    bad_angles, bad_sides = bad_angles.tolist(), bad_sides.tolist()
+    shapes = []
+    ops = {}
+
+    def construct():
+        shapes.extend(make_shape(kind, n_angles, a, s) for a, s in zip(angles, sides))
+    ops['construct'] = Timer.measure(construct, len(sides))
+
+    def validate():
+        # Некорректные фигуры сигнализируют исключением (круг ещё и печатает сообщение)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for a, s in zip(bad_angles, bad_sides):
+                try:
+                    make_shape(kind, n_angles, a, s)
+                except InvalidShapeError:
+                    pass
+    ops['validate'] = Timer.measure(validate, len(bad_sides))
+    # Первое обращение к фигуре вычисляет значение, дальше оно берётся из кэша
+    ops['get_sq'] = Timer.measure(lambda: [shape.get_sq() for shape in shapes], len(shapes))
+    ops['get_perimetr'] = Timer.measure(lambda: [shape.get_perimetr() for shape in shapes], len(shapes))
+    if kind in IRREGULAR_KINDS:
+        ops[SHAPE_CHECKS] = Timer.measure(lambda: [shape.is_convex() or shape.is_simple() for shape in shapes],
+                                          len(shapes))
+    return ops
+
+
+def build_checked_batch(n_angles, angles, sides):
+    """
+    Пакетный аналог конструкторов: массивы из исходных списков, проверка всех фигур
+    и пакет только из корректных (с восстановленными углами).
+    """
+    batch = make_batch(n_angles, np.array(angles, dtype=np.float64).reshape(len(sides), -1),
+                       np.array(sides, dtype=np.float64))
+    codes, repaired = batch.validate()
+    return repaired[codes == VALID]
+
+
+def run_batch(kind, n_angles, angles, sides, bad_angles, bad_sides):
+    # Исходные параметры - списки Python, как у одиночных классов: перевод в массивы входит в замер
+    angles, sides = angles.tolist(), sides.tolist()
+    bad_angles, bad_sides = bad_angles.tolist(), bad_sides.tolist()
+    holder = {}
+    ops = {}
+
+    def construct():
+        holder['batch'] = build_checked_batch(n_angles, angles, sides)
+    ops['construct'] = Timer.measure(construct, len(sides))
+    batch = holder['batch']
+    ops['validate'] = Timer.measure(lambda: build_checked_batch(n_angles, bad_angles, bad_sides), len(bad_sides))
+    ops['get_sq'] = Timer.measure(batch.get_sq, len(batch))
+    ops['get_perimetr'] = Timer.measure(batch.get_perimetr, len(batch))
+    if kind in IRREGULAR_KINDS:
+        def shape_checks():
+            # Выпуклые замкнутые многоугольники простые; самопересечения ищутся только у остальных
+            x, y = batch.get_vertices()
+            rest = np.flatnonzero(batch.closed_mask() & ~batch.convex_mask())
+            return [polygon_is_simple(x[i], y[i]) for i in rest]
+        ops[SHAPE_CHECKS] = Timer.measure(shape_checks, len(batch))
+    return ops
+
+
+def run_large_polygons(vertex_counts, rng):
+    """Отдельные большие невыпуклые многоугольники: polygon_is_simple и Nangle (площадь и is_simple)."""
+    results = []
+    for n in vertex_counts:
+        angles, sides, _ = generate_flower(n, rng)
+        x, y = polygon_vertices(angles, sides)
+        shape = Nangle(n, angles[0].tolist(), sides[0].tolist())
+        ops = {'polygon_is_simple': Timer.measure(lambda: polygon_is_simple(x[0], y[0]), n),
+               'Nangle.get_sq': Timer.measure(shape.get_sq, n),
+               'Nangle.is_simple': Timer.measure(shape.is_simple, n)}
+        result = {'kind': 'polygon', 'path': 'scalar', 'size': n, 'ops': ops}
+        print(case_id(result))
+        for name, op in ops.items():
+            print(f"    {name:<20} {op['seconds']:>10.4f} с")
+        results.append(result)
+    return results
+
+
+def relative_error(first, second):
+    first, second = np.asarray(first, dtype=np.float64), np.asarray(second, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error = np.abs(first - second) / np.maximum(np.abs(first), np.abs(second))
+    error = np.where((first == second) | (np.isnan(first) & np.isnan(second)), 0, error)
+    return float(np.nanmax(error)) if len(error) else 0.0, int(np.isnan(error).sum())
+
+
+def check(name, first, second, tolerance):
+    error, nan_mismatch = relative_error(first, second)
+    return {'check': name, 'count': len(first), 'max_relative_error': error, 'nan_mismatch': nan_mismatch,
+            'tolerance': tolerance, 'ok': error <= tolerance and nan_mismatch == 0}
+
+
+def cross_checks(size, rng, nangle_n, tolerance):
+    """Сверка площадей, посчитанных разными формулами и разными путями (одиночный класс / пакет)."""
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        angles, sides = generate('triangle', size, rng, nangle_n)
+        triangles = [Triangle._from_checked(3, tuple(a), tuple(s), "Треугольник")
+                     for a, s in zip(angles.tolist(), sides.tolist())]
+        heron = [shape.get_sq() for shape in triangles]
+        # Без третьей стороны Triangle.get_sq переходит к формуле 0.5 * a * b * sin(C)
+        two_sides = [Triangle._from_checked(3, shape.angles, shape.sides[:2] + (0,), "Треугольник").get_sq()
+                     for shape in triangles]
+        results.append(check('triangle: Герон / две стороны и угол', heron, two_sides, tolerance))
+        results.append(check('triangle: Triangle.get_sq / TriangleBatch.get_sq', heron,
+                             make_batch(3, angles, sides).get_sq(), tolerance))
+
+        angles, sides = generate_quadrangles(size, rng)
+        arbitrary = ~(angles == 90).all(axis=1)
+        angles, sides = angles[arbitrary], sides[arbitrary]
+        quadrangles = [Quadrangle(a, s) for a, s in zip(angles.tolist(), sides.tolist())]
+        diagonals = [shape.get_sq() for shape in quadrangles]
+        # Формула шнурования по тем же вершинам обхода, что и у диагоналей
+        x, y = build_vertices(angles, sides)
+        shoelace = np.abs(shoelace_area(x[:, :-1], y[:, :-1]))
+        results.append(check('quadrangle: диагонали / формула шнурования', diagonals, shoelace, tolerance))
+        results.append(check('quadrangle: Quadrangle.get_sq / QuadrangleBatch.get_sq', diagonals,
+                             make_batch(4, angles, sides).get_sq(), tolerance))
+
+        angles, sides = generate('nangle', size, rng, nangle_n)
+        batch = make_batch(nangle_n, angles, sides)
+        x, y = polygon_vertices(angles, sides)
+        results.append(check('nangle: правильный многоугольник / формула шнурования', batch.get_sq(),
+                             np.abs(shoelace_area(x, y)), tolerance))
+        scalar = [Nangle(nangle_n, a, s).get_sq() for a, s in zip(angles[:1000].tolist(), sides[:1000].tolist())]
+        results.append(check('nangle: Nangle.get_sq / NangleBatch.get_sq', scalar, batch.get_sq()[:1000], tolerance))
+
+        for kind in IRREGULAR_KINDS:
+            angles, sides, area = generate_polygons(size, nangle_n, rng, concave=kind == 'nangle_concave')
+            batch = make_batch(nangle_n, angles, sides)
+            results.append(check(f'{kind}: площадь по сторонам и углам / по исходным вершинам',
+                                 batch.get_sq(), area, tolerance))
+            scalar = [Nangle(nangle_n, a, s).get_sq() for a, s in zip(angles[:1000].tolist(), sides[:1000].tolist())]
+            results.append(check(f'{kind}: Nangle.get_sq / NangleBatch.get_sq', scalar, batch.get_sq()[:1000],
+                                 tolerance))
+    return results
+
+
+def run_benchmarks(sizes, scalar_limit, nangle_n, seed):
+    results = []
+    for kind in KINDS:
+        n_angles = n_angles_of(kind, nangle_n)
+        for size in sizes:
+            rng = np.random.default_rng(seed)
+            angles, sides = generate(kind, size, rng, nangle_n)
+            bad_angles, bad_sides = spoil(kind, angles, sides, rng)
+            paths = {'batch': run_batch(kind, n_angles, angles, sides, bad_angles, bad_sides)}
+            if size <= scalar_limit:
+                paths['scalar'] = run_scalar(kind, n_angles, angles, sides, bad_angles, bad_sides)
+            for path, ops in paths.items():
+                result = {'kind': kind, 'path': path, 'size': size, 'ops': ops}
+                print(f"{case_id(result)}")
+                for name, op in ops.items():
+                    print(f"    {name:<20} {op['seconds']:>10.4f} с  {op['per_second'] or 0:>14.0f} фигур/с")
+                results.append(result)
+    return results
+
+
+def case_id(result):
+    return f"{result['kind']}/{result['path']}/n={result['size']}"
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'matplotlib': matplotlib.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Сравнивает время операций с базовым прогоном.
+    Возвращает список регрессий: операции, ставшие медленнее более чем на threshold.
+    """
+    base = {case_id(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = base.get(case_id(result))
+        if old is None:
+            continue
+        for name in result['ops']:
+            new_seconds = result['ops'][name]['seconds']
+            old_seconds = old['ops'].get(name, {}).get('seconds')
+            if not old_seconds:
+                continue
+            ratio = new_seconds / old_seconds
+            print(f"{case_id(result)} {name:<20} {old_seconds:>9.4f} -> {new_seconds:>9.4f} с (x{ratio:.2f})")
+            if ratio > 1 + threshold:
+                regressions.append({'case': case_id(result), 'operation': name,
+                                    'baseline': old_seconds, 'current': new_seconds, 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк и сверка формул GeometricShapesLibrary")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000], help="число фигур")
+    parser.add_argument('--scalar-limit', type=int, default=100000,
+                        help="наибольший размер, для которого замеряются одиночные классы")
+    parser.add_argument('--nangle', type=int, default=8, help="число углов для Nangle")
+    parser.add_argument('--check-size', type=int, default=10000, help="число фигур в сверке формул")
+    parser.add_argument('--polygon-vertices', type=int, nargs='*', default=[1000, 100000],
+                        help="число вершин отдельных больших невыпуклых многоугольников")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.scalar_limit, args.nangle, args.seed)
+    results += run_large_polygons(args.polygon_vertices, np.random.default_rng(args.seed))
+    checks = cross_checks(args.check_size, np.random.default_rng(args.seed), args.nangle, args.tolerance)
+    for item in checks:
+        print(f"{'OK ' if item['ok'] else 'ОШИБКА'} {item['check']}: {item['max_relative_error']:.3g}")
+    report = {'environment': environment(), 'results': results, 'checks': checks}
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            report['regressions'] = compare(results, json.load(f), args.threshold)
+        for regression in report['regressions']:
+            print(f"РЕГРЕССИЯ: {regression['case']} {regression['operation']} x{regression['ratio']}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+    if report.get('regressions') or not all(item['ok'] for item in checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,95 @@
 from abc import ABC, abstractmethod
-from math import sqrt, sin, radians, pi, cos, acos, tan, degrees
+import copy
+from itertools import chain
+import json
+import os
+from multiprocessing import get_context, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from math import sqrt, sin, radians, pi, cos, acos, tan, degrees, fsum
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import EllipseCollection, PolyCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
 import numpy as np
 
 class InvalidShapeError(Exception):
     """Исключение для неверных параметров фигуры"""
     pass
 
+_UNSET = object()  # Признак ещё не вычисленного значения в кэше фигуры
+
+# Коды результата пакетной проверки (ShapeBatch.error_codes)
+VALID = 0
+ANGLE_RANGE_ERROR = 1
+ANGLE_SUM_ERROR = 2
+SIDE_ERROR = 3
+TRIANGLE_INEQUALITY_ERROR = 4
+VALIDATION_MESSAGES = {
+    VALID: "Фигура корректна",
+    ANGLE_RANGE_ERROR: "Каждый угол должен быть положительным и меньше 360 градусов",
+    ANGLE_SUM_ERROR: "Сумма углов не соответствует количеству углов",
+    SIDE_ERROR: "Длины сторон должны быть положительными",
+    TRIANGLE_INEQUALITY_ERROR: "Стороны не удовлетворяют неравенству треугольника",
+}
+
+# Коды вычисления площади (get_result, ShapeBatch.get_results); HERON_FAILED - только предупреждение
+AREA_NOT_CLOSED = 5
+AREA_INSUFFICIENT_DATA = 6
+AREA_UNDEFINED = 7
+HERON_FAILED = 8
+ERROR_MESSAGES = {
+    **VALIDATION_MESSAGES,
+    AREA_NOT_CLOSED: "Стороны и углы не образуют замкнутый многоугольник, площадь не вычислима",
+    AREA_INSUFFICIENT_DATA: "Не удалось вычислить площадь треугольника по имеющимся данным.",
+    AREA_UNDEFINED: "Не удалось вычислить площадь произвольного четырёхугольника",
+    HERON_FAILED: "Не удалось вычислить площадь по формуле Герона.",
+}
+
 class Shapes(ABC):
     """
     Абстрактный базовый класс для геометрических фигур
 
     Атрибуты:
         n_angles - Количество углов у фигуры
-        angles - Список значений углов в градусах
-        sides - Список длин сторон
+        angles - Кортеж значений углов в градусах
+        sides - Кортеж длин сторон
+
+    Фигуры хранятся в __slots__ без __dict__, а углы и стороны - в неизменяемых кортежах,
+    поэтому площадь, периметр, вершины и диагонали вычисляются один раз и кэшируются
+    до следующего set_angles/set_sides.
+
+    Методы вычислений ничего не печатают: причины, по которым площадь не вычислена,
+    сохраняются кодами (см. ERROR_MESSAGES) и возвращаются get_result. Текст формирует
+    только format_info, а печатает - get_info.
     """
+    __slots__ = ('_n_angles', '_angles', '_sides', 'name', '_sq', '_perimetr', '_vertices', '_diagonals',
+                 '_sq_codes')
+
     def __init__(self, n_angles, angles, sides):
         # _ перед переменной означает условный private
         self._n_angles = n_angles
+        self._clear_cache()
         self.angles = angles
         self.sides = sides
 
+    def _clear_cache(self):
+        self._sq = self._perimetr = self._vertices = self._diagonals = _UNSET
+        self._sq_codes = ()
+
+    def _report(self, code):
+        """Запоминает код предупреждения или ошибки вычисления площади вместо печати сообщения."""
+        self._sq_codes += (code,)
+
+    def _assign_angles(self, angles):
+        """Прямое присваивание углов без проверок (проверка уже выполнена вызывающим кодом)."""
+        self._angles = tuple(angles)
+        self._clear_cache()
+
+    def _assign_sides(self, sides):
+        self._sides = tuple(sides)
+        self._clear_cache()
+
     @property
     def n_angles(self):
         return self._n_angles
@@ -43,18 +111,78 @@ class Shapes(ABC):
         for angle in angles:
             if not (0 < angle < 360):
                 raise InvalidShapeError("Каждый угол должен быть положительным и меньше 360 градусов")
-        self._angles = angles
+        self._assign_angles(angles)
+
+    @classmethod
+    def _from_checked(cls, n_angles, angles, sides, name):
+        """Фигура из уже проверенных углов и сторон - без сеттеров, проверок и исключений."""
+        shape = cls.__new__(cls)
+        shape._n_angles = n_angles
+        shape._angles = angles
+        shape._sides = sides
+        shape._clear_cache()
+        shape.name = name
+        return shape
 
     def get_perimetr(self):
-        if self.n_angles == 0:
-            return 2 * pi * self.sides[0]  # длина окружности
-        return sum(self.sides)
+        if self._perimetr is _UNSET:
+            if self.n_angles == 0:
+                self._perimetr = 2 * pi * self.sides[0]  # длина окружности
+            else:
+                self._perimetr = sum(self.sides)
+        return self._perimetr
+
+    def get_sq(self):
+        """Площадь фигуры; вычисляется при первом обращении после изменения углов или сторон."""
+        if self._sq is _UNSET:
+            self._sq = self._compute_sq()
+        return self._sq
+
+    @abstractmethod
+    def _compute_sq(self):
+        pass
+
+    def get_result(self):
+        """
+        Результат вычислений в виде словаря, без форматирования и вывода:
+        code - VALID или код причины, по которой площадь не вычислена; codes - все коды
+        предупреждений и ошибок вычисления площади (тексты - в ERROR_MESSAGES).
+        """
+        area = self.get_sq()
+        codes = self._sq_codes
+        return {'name': self.name, 'n_angles': self.n_angles, 'angles': self.angles, 'sides': self.sides,
+                'perimetr': self.get_perimetr(), 'area': area,
+                'code': VALID if area is not None else (codes[-1] if codes else AREA_INSUFFICIENT_DATA),
+                'codes': codes}
+
+    def get_vertices(self):
+        """
+        Координаты вершин (x, y) обхода сторон, как в draw: из точки (0, 0) i-я сторона
+        идёт под углом sum(angles[:i+1]). Возвращает кортежи x и y из n_angles + 1 точек.
+        """
+        if self._vertices is _UNSET:
+            x = [0]
+            y = [0]
+            heading = 0
+            for side, angle in zip(self.sides, self.angles):
+                heading += angle
+                x.append(x[-1] + side * cos(radians(heading)))
+                y.append(y[-1] + side * sin(radians(heading)))
+            self._vertices = (tuple(x), tuple(y))
+        return self._vertices
     
     @abstractmethod
-    def get_info(self):
-        info = f"Углы: {self.angles}\n"
-        info += f"Стороны: {self.sides}\n"
+    def format_info(self):
+        info = f"Углы: {list(self.angles)}\n"
+        info += f"Стороны: {list(self.sides)}\n"
         info += f"Периметр: {self.get_perimetr():.2f}\n"
+        return info
+
+    def get_info(self):
+        """Печатает описание фигуры и сообщения о проблемах при вычислении площади."""
+        info = self.format_info()
+        for code in self._sq_codes:
+            print(ERROR_MESSAGES[code])
         print(info)
 
     @property
@@ -64,13 +192,13 @@ class Shapes(ABC):
     @sides.setter
     def sides(self, sides):
         """
-        - Стороны должны быть в виде списка
+        - Стороны должны быть в виде списка (или кортежа)
         - Для круга (n_angles == 0) должна быть только одна сторона (радиус)
         - Для других фигур количество сторон должно соответствовать n_angles
         - Длины сторон должны быть положительными
         """
         try:
-            if not isinstance(sides, list):
+            if not isinstance(sides, (list, tuple)):
                 raise InvalidShapeError("Стороны должны быть в виде списка")
             if self.n_angles == 0:
                 if len(sides) != 1:
@@ -81,7 +209,7 @@ class Shapes(ABC):
             for side in sides:
                 if side <= 0:
                     raise InvalidShapeError("Длины сторон должны быть положительными")
-            self._sides = sides
+            self._assign_sides(sides)
         except InvalidShapeError as e:
             print(f"Ошибка при установке сторон: {e}")
 
@@ -91,6 +219,8 @@ class Circle(Shapes):
         Атрибуты:
             radius (float): Радиус круга
     """
+    __slots__ = ()
+
     def __init__(self, radius):
         super().__init__(0, [], [radius]) # конструктор базового класса
         if radius <= 0: 
@@ -98,7 +228,7 @@ class Circle(Shapes):
         self.name = 'круг'
     
     # площадь
-    def get_sq(self):
+    def _compute_sq(self):
         radius = self.sides[0]
         return pi * radius ** 2
     
@@ -108,19 +238,19 @@ class Circle(Shapes):
             raise InvalidShapeError("У круга должна быть только одна сторона (радиус)")
         if sides[0] <= 0:   
             raise InvalidShapeError("Радиус должен быть положительным")
-        self._sides = sides  # Прямое присваивание, так как сеттер уже проверял
+        self._assign_sides(sides)  # Прямое присваивание, так как сеттер уже проверял
 
     def set_angles(self, angles):
         # Пытаться установить углы для круга приведёт к ошибке, так как у круга нет углов
         if angles:
             raise InvalidShapeError("У круга нет углов")
     
-    def get_info(self): # overdrive
+    def format_info(self): # overdrive
         info = f"Название: {self.name}\n"
         info += f"Радиус: {self.sides[0]}\n"
         info += f"Периметр (длина окружности): {self.get_perimetr():.2f}\n"
         info += f"Площадь: {self.get_sq():.2f}\n"
-        print(info)
+        return info
         
         
 class Triangle(Shapes):
@@ -129,6 +259,8 @@ class Triangle(Shapes):
         angles (list): Список из трех углов в градусах
         sides (list): Список из трех длин сторон
     """
+    __slots__ = ()
+
     def __init__(self, angles, sides):
         super().__init__(3, angles, sides)  # вызов конструктора базового класса
         self.angles = angles  # Установка углов через сеттер
@@ -149,9 +281,9 @@ class Triangle(Shapes):
             # Восстанавливаем недостающий угол
             missing = 180 - sum(angle for angle in self.angles if angle > 0)
             if 0 < missing < 180:
-                missing_index = self.angles.index(0)
-                self._angles = self.angles.copy()
-                self._angles[missing_index] = missing
+                angles = list(self.angles)
+                angles[angles.index(0)] = missing
+                self._assign_angles(angles)
                 return True
         return False
 
@@ -161,7 +293,7 @@ class Triangle(Shapes):
         return a + b > c and a + c > b and b + c > a
     
     # Модифицированный метод get_sq с тремя формулами
-    def get_sq(self):
+    def _compute_sq(self):
         # Проверяем, какие данные у нас есть для выбора подходящей формулы
         a, b, c = self.sides
         A, B, C = self.angles
@@ -173,7 +305,7 @@ class Triangle(Shapes):
                 area = sqrt(s * (s - a) * (s - b) * (s - c))
                 return area
             except ValueError:
-                print("Не удалось вычислить площадь по формуле Герона.")
+                self._report(HERON_FAILED)
         
         # 2. Площадь через две стороны и угол между ними
         if a > 0 and b > 0 and C > 0:
@@ -193,7 +325,7 @@ class Triangle(Shapes):
             area = 0.5 * a * h
             return area
         
-        print("Не удалось вычислить площадь треугольника по имеющимся данным.")
+        self._report(AREA_INSUFFICIENT_DATA)
         return None
 
     def set_angles(self, angles):
@@ -204,7 +336,7 @@ class Triangle(Shapes):
                 raise InvalidShapeError("Каждый угол треугольника должен быть положительным и меньше 180 градусов")
         if abs(sum(angles) - 180) > 1e-5:
             raise InvalidShapeError("Сумма углов треугольника должна быть 180 градусов")
-        self._angles = angles  # Прямое присваивание, так как сеттер уже проверял
+        self._assign_angles(angles)  # Прямое присваивание, так как сеттер уже проверял
         
     
     def set_sides(self, sides):
@@ -213,30 +345,23 @@ class Triangle(Shapes):
         a, b, c = sides
         if a + b <= c or a + c <= b or b + c <= a:
             raise InvalidShapeError("Стороны не удовлетворяют неравенству треугольника.")
-        self._sides = sides  
+        self._assign_sides(sides)
     
-    def get_info(self): #override
+    def format_info(self): #override
         info = f"Название: {self.name}\n"
-        info += f"Углы (градусы): {self.angles}\n"
-        info += f"Стороны: {self.sides}\n"
+        info += f"Углы (градусы): {list(self.angles)}\n"
+        info += f"Стороны: {list(self.sides)}\n"
         info += f"Периметр: {self.get_perimetr():.2f}\n"
         area = self.get_sq()
         if area is not None:
             info += f"Площадь: {area:.2f}\n"
         else:
             info += "Площадь: Не вычислима\n"
-        print(info)
+        return info
 
     def draw(self):
-        x = [0]
-        y = [0]
-        for i in range(3):
-            angle_sum = sum(self.angles[:i+1])
-            x.append(x[-1] + self.sides[i] * cos(radians(angle_sum)))
-            y.append(y[-1] + self.sides[i] * sin(radians(angle_sum)))
-        x.append(0)
-        y.append(0)
-        plt.plot(x, y, marker='o')
+        x, y = self.get_vertices()
+        plt.plot(x + (0,), y + (0,), marker='o')
         plt.title(self.name)
         plt.gca().set_aspect('equal', adjustable='box')
         plt.show()
@@ -248,10 +373,12 @@ class Quadrangle(Shapes):
         angles (list): Список из четырёх углов в градусах
         sides (list): Список из четырёх длин сторон
     """
+    __slots__ = ()
+
     def __init__(self, angles, sides):
         super().__init__(4, angles, sides)
-        self._sides = sides 
-        self._angles = angles
+        self._assign_sides(sides)
+        self._assign_angles(angles)
         if not self._validate_angles():
             raise InvalidShapeError("Сумма углов четырёхугольника должна быть 360 градусов")
         if not self._validate_sides():
@@ -266,9 +393,9 @@ class Quadrangle(Shapes):
             # Восстанавливаем недостающий угол
             missing = 360 - sum(angle for angle in self.angles if angle > 0)
             if 0 < missing < 360:
-                missing_index = self.angles.index(0)
-                self._angles = self.angles.copy()
-                self._angles[missing_index] = missing
+                angles = list(self.angles)
+                angles[angles.index(0)] = missing
+                self._assign_angles(angles)
                 return True
         return False
 
@@ -276,7 +403,7 @@ class Quadrangle(Shapes):
         return all(side > 0 for side in self.sides)
     
 
-    def get_sq(self):
+    def _compute_sq(self):
         angles = self.angles
         sides = self.sides
         a, b, c, d = sides
@@ -316,7 +443,7 @@ class Quadrangle(Shapes):
             area = 0.5 * d1 * d2 * sin(radians(angle_between_diagonals))
             return area
         except:
-            print("Не удалось вычислить площадь произвольного четырёхугольника")
+            self._report(AREA_UNDEFINED)
             return None
 
     # Метод для проверки, является ли четырёхугольник трапецией
@@ -333,11 +460,12 @@ class Quadrangle(Shapes):
         return h
 
     def get_diagonals_and_angle(self):
-        x = [0]
-        y = [0]
-        for i in range(4):
-            x.append(x[-1] + self.sides[i] * cos(radians(sum(self.angles[:i + 1]))))
-            y.append(y[-1] + self.sides[i] * sin(radians(sum(self.angles[:i + 1]))))
+        if self._diagonals is _UNSET:
+            self._diagonals = self._compute_diagonals_and_angle()
+        return self._diagonals
+
+    def _compute_diagonals_and_angle(self):
+        x, y = self.get_vertices()
         # Вычисляем длины диагоналей
         d1 = sqrt((x[2] - x[0])**2 + (y[2] - y[0])**2)
         d2 = sqrt((x[3] - x[1])**2 + (y[3] - y[1])**2)
@@ -357,15 +485,15 @@ class Quadrangle(Shapes):
         if len(positive_angles) == 4:
             if abs(sum(angles) - 360) > 1e-5:
                 raise InvalidShapeError("Сумма углов четырёхугольника должна быть 360 градусов")
-            self._angles = angles
+            self._assign_angles(angles)
         elif len(positive_angles) == 3:
             missing = 360 - sum(positive_angles)
             if not (0 < missing < 360):
                 raise InvalidShapeError("Недостающий угол некорректен")
-            angles = angles.copy()
+            angles = list(angles)
             missing_index = angles.index(0)
             angles[missing_index] = missing
-            self._angles = angles
+            self._assign_angles(angles)
         else:
             raise InvalidShapeError("Четырёхугольник должен иметь 3 или 4 заданных угла")
 
@@ -374,34 +502,206 @@ class Quadrangle(Shapes):
             raise InvalidShapeError("Четырёхугольник должен иметь 4 стороны")
         if not all(side > 0 for side in sides):
             raise InvalidShapeError("Длины сторон должны быть положительными")
-        self._sides = sides
+        self._assign_sides(sides)
     
     def draw(self):
-        x = [0]
-        y = [0]
-        for i in range(4):
-            x.append(x[-1] + self.sides[i] * cos(radians(sum(self.angles[:i + 1]))))
-            y.append(y[-1] + self.sides[i] * sin(radians(sum(self.angles[:i + 1]))))
-        x.append(0)
-        y.append(0)
-        plt.plot(x, y, marker='o')
+        x, y = self.get_vertices()
+        plt.plot(x + (0,), y + (0,), marker='o')
         plt.title(self.name)
         plt.gca().set_aspect('equal', adjustable='box')
         plt.show()
 
-    def get_info(self):
+    def format_info(self):
         info = f"Название: {self.name}\n"
-        info += f"Углы (градусы): {self.angles}\n"
-        info += f"Стороны: {self.sides}\n"
+        info += f"Углы (градусы): {list(self.angles)}\n"
+        info += f"Стороны: {list(self.sides)}\n"
         info += f"Периметр: {self.get_perimetr():.2f}\n"
         area = self.get_sq()
         if area is not None:
             info += f"Площадь: {area:.2f}\n"
         else:
             info += "Площадь: Не вычислима\n"
-        print(info)
+        return info
+
+
+
+CLOSURE_TOLERANCE = 1e-6  # Допустимый разрыв обхода сторон относительно периметра
 
 
+def polygon_vertices(angles, sides):
+    """
+    Вершины многоугольников по внутренним углам и сторонам через внешние углы поворота:
+    сторона 0 идёт из (0, 0) вдоль оси x, в вершине i направление поворачивает на 180 - angles[i].
+    angles, sides - массивы (N, n). Возвращает x, y формы (N, n); разрыв между концом
+    последней стороны и началом обхода даёт closure_gap.
+    """
+    turns = 180 - np.asarray(angles, dtype=np.float64)
+    turns[:, 0] = 0
+    headings = np.radians(np.cumsum(turns, axis=1))
+    sides = np.asarray(sides, dtype=np.float64)
+    dx = sides * np.cos(headings)
+    dy = sides * np.sin(headings)
+    x = np.cumsum(dx, axis=1) - dx
+    y = np.cumsum(dy, axis=1) - dy
+    return x, y
+
+
+def closure_gap(x, y, angles, sides):
+    """Расстояние от конца последней стороны до начала обхода (0 для замкнутого многоугольника)."""
+    turns = 180 - np.asarray(angles, dtype=np.float64)
+    heading = np.radians(turns[:, 1:].sum(axis=1))
+    end_x = x[:, -1] + sides[:, -1] * np.cos(heading)
+    end_y = y[:, -1] + sides[:, -1] * np.sin(heading)
+    return np.hypot(end_x, end_y)
+
+
+def shoelace_area(x, y):
+    """Ориентированная площадь многоугольников (формула шнурования), массивы (N, n) -> (N,)."""
+    x_next = np.roll(x, -1, axis=1)
+    y_next = np.roll(y, -1, axis=1)
+    return 0.5 * (x * y_next - x_next * y).sum(axis=1)
+
+
+def polygon_centroid(x, y):
+    """Центры масс многоугольников; для вырожденных (нулевая площадь) - NaN."""
+    x_next = np.roll(x, -1, axis=1)
+    y_next = np.roll(y, -1, axis=1)
+    cross = x * y_next - x_next * y
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factor = 1 / (3 * cross.sum(axis=1))
+        return factor * ((x + x_next) * cross).sum(axis=1), factor * ((y + y_next) * cross).sum(axis=1)
+
+
+def polygon_is_convex(x, y):
+    """Все повороты обхода в одну сторону и полный поворот равен 360 градусам (без самопересечений)."""
+    ex = np.roll(x, -1, axis=1) - x
+    ey = np.roll(y, -1, axis=1) - y
+    cross = ex * np.roll(ey, -1, axis=1) - ey * np.roll(ex, -1, axis=1)
+    scale = np.abs(cross).max(axis=1, keepdims=True) * 1e-12
+    same_side = (cross >= -scale).all(axis=1) | (cross <= scale).all(axis=1)
+    dot = ex * np.roll(ex, -1, axis=1) + ey * np.roll(ey, -1, axis=1)
+    winding = np.abs(np.arctan2(cross, dot).sum(axis=1))
+    return same_side & (np.abs(winding - 2 * pi) < 1e-6)
+
+
+POLYGON_MAX_CELLS = 16  # Стороны, задевающие больше ячеек сетки, проверяются перебором
+
+
+def polygon_is_simple(x, y):
+    """
+    Проверка одного многоугольника (массивы x, y длины n) на отсутствие самопересечений.
+    Отрезки раскладываются по ячейкам равномерной сетки размером порядка средней длины стороны,
+    и точная проверка пересечения выполняется векторно только для пар из общей ячейки,
+    поэтому для обычных многоугольников время почти линейно по n. Длинные стороны, задевающие
+    больше POLYGON_MAX_CELLS ячеек, в сетку не попадают (иначе память росла бы квадратично)
+    и сравниваются со всеми сторонами перебором с отбором по ограничивающим прямоугольникам.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n < 4:
+        return True
+    x0, y0 = x, y
+    x1, y1 = np.roll(x, -1), np.roll(y, -1)
+    xmin, ymin = np.minimum(x0, x1), np.minimum(y0, y1)
+    xmax, ymax = np.maximum(x0, x1), np.maximum(y0, y1)
+    lengths = np.hypot(x1 - x0, y1 - y0)
+    cell = max(lengths.mean(), np.ptp(x) / n, np.ptp(y) / n, 1e-300)
+    origin_x, origin_y = x.min(), y.min()
+    span_x = np.floor((xmax - origin_x) / cell) - np.floor((xmin - origin_x) / cell) + 1
+    span_y = np.floor((ymax - origin_y) / cell) - np.floor((ymin - origin_y) / cell) + 1
+    large = span_x * span_y > POLYGON_MAX_CELLS
+    small = np.flatnonzero(~large)
+    segment, cells_x, cells_y = _grid_cells(xmin[small], ymin[small], xmax[small], ymax[small],
+                                            origin_x, origin_y, cell)
+    pairs = chain(_iter_same_cell_pairs(cells_y * (int(cells_x.max(initial=0)) + 1) + cells_x, small[segment]),
+                  _iter_bbox_pairs(np.flatnonzero(large), xmin, ymin, xmax, ymax))
+    # Пары проверяются порциями, чтобы память не зависела от их общего числа
+    for i, j in pairs:
+        # Соседние стороны имеют общую вершину и пересечением не считаются (как и сторона сама с собой)
+        distance = np.abs(i - j)
+        keep = (distance > 1) & (distance != n - 1)
+        i, j = i[keep], j[keep]
+        if _segments_intersect(x0[i], y0[i], x1[i], y1[i], x0[j], y0[j], x1[j], y1[j]).any():
+            return False
+    return True
+
+
+def _iter_bbox_pairs(items, xmin, ymin, xmax, ymax):
+    """Пары (items[k], j) с пересекающимися ограничивающими прямоугольниками, порциями по EDGE_CHUNK."""
+    block = max(EDGE_CHUNK // max(len(xmin), 1), 1)
+    for start in range(0, len(items), block):
+        part = items[start:start + block, None]
+        overlap = (xmin[part] <= xmax) & (xmin <= xmax[part]) & (ymin[part] <= ymax) & (ymin <= ymax[part])
+        row, other = np.nonzero(overlap)
+        yield part[row, 0], other
+
+
+def _expand_ranges(counts):
+    """Для длин групп counts: номер группы и номер внутри группы для каждого элемента всех групп."""
+    counts = np.asarray(counts, dtype=np.int64)
+    group = np.repeat(np.arange(len(counts)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return group, local
+
+
+def _grid_cells(xmin, ymin, xmax, ymax, origin_x, origin_y, cell):
+    """
+    Раскладывает прямоугольники по ячейкам равномерной сетки с началом (origin_x, origin_y):
+    каждый прямоугольник попадает во все ячейки, которые он задевает.
+    Возвращает номер прямоугольника и координаты ячейки (ix, iy) для каждого попадания.
+    """
+    cx0 = np.floor((xmin - origin_x) / cell).astype(np.int64)
+    cx1 = np.floor((xmax - origin_x) / cell).astype(np.int64)
+    cy0 = np.floor((ymin - origin_y) / cell).astype(np.int64)
+    cy1 = np.floor((ymax - origin_y) / cell).astype(np.int64)
+    counts_x = cx1 - cx0 + 1
+    item, local = _expand_ranges(counts_x * (cy1 - cy0 + 1))
+    return item, cx0[item] + local % counts_x[item], cy0[item] + local // counts_x[item]
+
+
+def _iter_same_cell_pairs(cell_id, item):
+    """
+    Пары (i, j) элементов, попавших в одну ячейку, порциями: для каждого сдвига offset в порядке
+    сортировки по ячейкам - не больше len(item) пар (пара может повториться для разных ячеек).
+    """
+    order = np.lexsort((item, cell_id))
+    cell_id, item = cell_id[order], item[order]
+    for offset in range(1, len(item)):
+        same = cell_id[offset:] == cell_id[:-offset]
+        if not same.any():
+            # Элементы одной ячейки идут подряд: если нет пар на расстоянии offset, дальше их тоже нет
+            break
+        yield item[:-offset][same], item[offset:][same]
+
+
+def _same_cell_pairs(cell_id, item):
+    """Все пары (i, j) элементов, попавших в одну ячейку (пара может повториться для разных ячеек)."""
+    pairs = [np.empty((2, 0), dtype=np.int64)]
+    pairs.extend(np.stack(pair) for pair in _iter_same_cell_pairs(cell_id, item))
+    return np.concatenate(pairs, axis=1)
+
+
+def _segments_intersect(ax, ay, bx, by, cx, cy, dx, dy):
+    """Векторная проверка пересечения (включая касание) отрезков AB и CD."""
+    def orient(px, py, qx, qy, rx, ry):
+        return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+    def on_segment(px, py, qx, qy, rx, ry):
+        return ((np.minimum(px, qx) <= rx) & (rx <= np.maximum(px, qx))
+                & (np.minimum(py, qy) <= ry) & (ry <= np.maximum(py, qy)))
+
+    o1 = orient(ax, ay, bx, by, cx, cy)
+    o2 = orient(ax, ay, bx, by, dx, dy)
+    o3 = orient(cx, cy, dx, dy, ax, ay)
+    o4 = orient(cx, cy, dx, dy, bx, by)
+    proper = (o1 * o2 < 0) & (o3 * o4 < 0)
+    touching = (((o1 == 0) & on_segment(ax, ay, bx, by, cx, cy))
+                | ((o2 == 0) & on_segment(ax, ay, bx, by, dx, dy))
+                | ((o3 == 0) & on_segment(cx, cy, dx, dy, ax, ay))
+                | ((o4 == 0) & on_segment(cx, cy, dx, dy, bx, by)))
+    return proper | touching
+
 
 class Nangle(Shapes):
     """
@@ -411,6 +711,8 @@ class Nangle(Shapes):
         angles (list): Список углов (должен быть полностью задан или полностью стороны)
         sides (list): Список длин сторон (должен быть полностью задан или полностью углы)
     """
+    __slots__ = ()
+
     def __init__(self, n, angles=None, sides=None):
         if n < 5:
             raise InvalidShapeError("Используйте специализированные классы для фигур с количеством углов меньше 5")
@@ -428,7 +730,7 @@ class Nangle(Shapes):
         if angles and all(angle > 0 for angle in angles):
             if len(angles) != n:
                 raise InvalidShapeError(f"N-угольник должен иметь {n} углов")
-            if abs(sum(angles) - (n - 2) * 180) > 1e-5:
+            if abs(fsum(angles) - (n - 2) * 180) > 1e-5:
                 raise InvalidShapeError(f"Сумма углов {n}-угольника должна быть {(n - 2) * 180} градусов")
         
         if sides and all(side > 0 for side in sides):
@@ -440,27 +742,82 @@ class Nangle(Shapes):
         
         self.name = f"{n}-угольник"
 
-    def get_sq(self):
-        # Реализуем площадь для правильного многоугольника
+    def _compute_sq(self):
+        # Для правильного многоугольника - точная формула
         if all(side == self.sides[0] for side in self.sides) and all(angle == self.angles[0] for angle in self.angles):
             n = self.n_angles
             a = self.sides[0]
             area = (n * a ** 2) / (4 * tan(pi / n))
             return area
-        else:
-            print("Площадь для произвольного N-угольника не реализована")
+        # Для произвольного - формула шнурования по вершинам
+        if not self._is_closed():
+            self._report(AREA_NOT_CLOSED)
             return None
+        x, y = self.get_vertices()
+        return float(abs(shoelace_area(x[None, :-1], y[None, :-1])[0]))
+
+    def _has_geometry(self):
+        return all(angle > 0 for angle in self.angles) and all(side > 0 for side in self.sides)
+
+    def get_vertices(self):
+        """
+        Вершины многоугольника по сторонам и внешним углам поворота (см. polygon_vertices).
+        Возвращает массивы NumPy x, y из n + 1 точек: последняя - конец n-й стороны,
+        для замкнутого многоугольника она совпадает с первой.
+        """
+        if self._vertices is _UNSET:
+            if not self._has_geometry():
+                raise InvalidShapeError("Для построения вершин нужны все углы и все стороны")
+            angles = np.array([self.angles], dtype=np.float64)
+            sides = np.array([self.sides], dtype=np.float64)
+            x, y = polygon_vertices(angles, sides)
+            turns = 180 - angles[0]
+            heading = np.radians(turns[1:].sum())
+            end_x = x[0, -1] + sides[0, -1] * cos(heading)
+            end_y = y[0, -1] + sides[0, -1] * sin(heading)
+            self._vertices = (np.append(x[0], end_x), np.append(y[0], end_y))
+        return self._vertices
+
+    def get_closure_error(self):
+        """Разрыв между концом обхода сторон и его началом (0 для согласованных сторон и углов)."""
+        x, y = self.get_vertices()
+        return float(np.hypot(x[-1] - x[0], y[-1] - y[0]))
+
+    def _is_closed(self):
+        return self._has_geometry() and self.get_closure_error() <= CLOSURE_TOLERANCE * self.get_perimetr()
+
+    def get_centroid(self):
+        """Центр масс многоугольника в координатах get_vertices."""
+        x, y = self.get_vertices()
+        cx, cy = polygon_centroid(x[None, :-1], y[None, :-1])
+        return float(cx[0]), float(cy[0])
+
+    def is_convex(self):
+        x, y = self.get_vertices()
+        return self._is_closed() and bool(polygon_is_convex(x[None, :-1], y[None, :-1])[0])
+
+    def is_simple(self):
+        """Нет ли у замкнутого многоугольника самопересечений."""
+        x, y = self.get_vertices()
+        return self._is_closed() and polygon_is_simple(x[:-1], y[:-1])
+
+    def draw(self):
+        x, y = self.get_vertices()
+        plt.plot(x, y, marker='o' if self.n_angles <= 100 else None)
+        plt.title(self.name)
+        plt.gca().set_aspect('equal', adjustable='box')
+        plt.show()
 
     def set_angles(self, angles):
         if self.n_angles != len(angles):
             raise InvalidShapeError(f"N-угольник должен иметь {self.n_angles} углов")
-        if abs(sum(angles) - (self.n_angles - 2) * 180) > 1e-5:
+        if abs(fsum(angles) - (self.n_angles - 2) * 180) > 1e-5:
             raise InvalidShapeError(f"Сумма углов должна быть {(self.n_angles - 2) * 180} градусов")
         for angle in angles:
             if not (0 < angle < 360):
                 raise InvalidShapeError("Каждый угол должен быть положительным и меньше 360 градусов")
-        self._angles = angles
-        self._sides = [0]*self.n_angles  # Удаляем стороны, если были
+        self._assign_angles(angles)
+        self._assign_sides((0,) * self.n_angles)  # Удаляем стороны, если были
 
     def set_sides(self, sides):
         if self.n_angles != len(sides):
@@ -468,22 +825,1135 @@ class Nangle(Shapes):
         for side in sides:
             if side <= 0:
                 raise InvalidShapeError("Длины сторон должны быть положительными")
-        self._sides = sides
-        self._angles = [0]*self.n_angles 
+        self._assign_sides(sides)
+        self._assign_angles((0,) * self.n_angles)
 
-    def get_info(self):
+    def format_info(self):
         info = f"Название: {self.name}\n"
         if self.angles and all(angle > 0 for angle in self.angles):
-            info += f"Углы (градусы): {self.angles}\n"
+            info += f"Углы (градусы): {list(self.angles)}\n"
         if self.sides and all(side > 0 for side in self.sides):
-            info += f"Стороны: {self.sides}\n"
+            info += f"Стороны: {list(self.sides)}\n"
             info += f"Периметр: {self.get_perimetr():.2f}\n"
         area = self.get_sq()
         if area is not None:
             info += f"Площадь: {area:.2f}\n"
         else:
             info += "Площадь: Не вычислима\n"
-        print(info)
+        return info
+
+
+ANGLE_TOLERANCE = 1e-5  # Допуск при проверке суммы углов, как в _validate_angles
+CIRCLE_SEGMENTS = 64  # Число сторон многоугольника, которым рисуется круг
+# Запись результата ShapeBatch.get_results: периметр, площадь, код (ERROR_MESSAGES), номер класса (CLASSES)
+RESULT_DTYPE = np.dtype([('perimetr', np.float64), ('area', np.float64), ('code', np.int8), ('kind', np.int8)])
+
+
+def build_vertices(angles, sides):
+    """
+    Вершины фигур пакета так же, как в draw: i-я сторона идёт под углом sum(angles[:i+1]).
+    angles, sides - массивы (N, n) в градусах и длинах.
+    Возвращает x, y формы (N, n + 1): первая точка (0, 0), последняя - конец n-й стороны.
+    """
+    headings = np.radians(np.cumsum(angles, axis=1))
+    zeros = np.zeros((len(sides), 1))
+    x = np.concatenate([zeros, np.cumsum(sides * np.cos(headings), axis=1)], axis=1)
+    y = np.concatenate([zeros, np.cumsum(sides * np.sin(headings), axis=1)], axis=1)
+    return x, y
+
+
+class ShapeBatch(ABC):
+    """
+    Пакет однотипных фигур, хранящийся в массивах NumPy.
+    Все методы считают результат сразу для всех фигур пакета; там, где одиночный
+    класс вернул бы None (площадь не вычислима), в массиве стоит NaN.
+
+    Атрибуты:
+        n_angles - Количество углов у фигур пакета
+        angles - Массив углов (N, n_angles) в градусах
+        sides - Массив длин сторон (N, количество сторон)
+        CLASSES - Названия классов фигур для classify()
+        ANGLE_REPAIR_LIMIT - Верхняя граница восстановленного угла (None - углы не восстанавливаются)
+        AREA_ERROR - Код для корректных фигур, площадь которых не вычислима (NaN в get_sq)
+    """
+    n_angles = None
+    name = None
+    shape_class = None  # Соответствующий одиночный класс
+    CLASSES = ()
+    ANGLE_REPAIR_LIMIT = None
+    AREA_ERROR = AREA_INSUFFICIENT_DATA
+
+    def __init__(self, angles, sides):
+        self.sides = np.asarray(sides, dtype=np.float64).reshape(-1, max(self.n_angles, 1))
+        angles = np.asarray(angles, dtype=np.float64)
+        if angles.size != len(self.sides) * self.n_angles:
+            raise InvalidShapeError("Количество наборов углов и сторон должно совпадать")
+        self.angles = angles.reshape(len(self.sides), self.n_angles)
+
+    @classmethod
+    def from_shapes(cls, shapes):
+        """Пакет из списка одиночных фигур одного типа."""
+        shapes = list(shapes)
+        return cls([shape.angles for shape in shapes], [shape.sides for shape in shapes])
+
+    def with_arrays(self, angles, sides):
+        """Пакет того же типа с другими массивами углов и сторон."""
+        batch = copy.copy(self)
+        batch.angles = angles
+        batch.sides = sides
+        return batch
+
+    def __getitem__(self, index):
+        """Подмножество пакета по маске, срезу или массиву индексов."""
+        return self.with_arrays(self.angles[index], self.sides[index])
+
+    def __len__(self):
+        return len(self.sides)
+
+    def get_perimetr(self):
+        return self.sides.sum(axis=1)
+
+    @abstractmethod
+    def get_sq(self):
+        pass
+
+    def valid_mask(self):
+        """Булева маска фигур, которые принял бы конструктор одиночного класса."""
+        return self.error_codes() == VALID
+
+    def _error_conditions(self):
+        """Пары (код ошибки, маска нарушивших проверку фигур) в порядке проверок конструктора."""
+        return [(ANGLE_RANGE_ERROR, ~self._angles_in_range()),
+                (ANGLE_SUM_ERROR, ~self._angle_sum_is((self.n_angles - 2) * 180)),
+                (SIDE_ERROR, ~self._sides_positive())]
+
+    def error_codes(self):
+        """Код первой нарушенной проверки для каждой фигуры (VALID для корректных), см. VALIDATION_MESSAGES."""
+        conditions = self._error_conditions()
+        return np.select([failed for _, failed in conditions], [code for code, _ in conditions],
+                         default=VALID).astype(np.int8)
+
+    def repair_angles(self):
+        """
+        Восстановление недостающего угла, как в _validate_angles: если сумма углов неверна,
+        а ровно один угол равен 0, он заменяется недостающим до суммы значением, когда
+        оно лежит в (0, ANGLE_REPAIR_LIMIT). Возвращает новый массив углов и маску восстановленных строк.
+        """
+        angles = self.angles.copy()
+        if self.ANGLE_REPAIR_LIMIT is None:
+            return angles, np.zeros(len(self), dtype=bool)
+        total = (self.n_angles - 2) * 180
+        zero = angles == 0
+        missing = total - np.where(angles > 0, angles, 0).sum(axis=1)
+        repaired = ((zero.sum(axis=1) == 1) & ~self._angle_sum_is(total)
+                    & (missing > 0) & (missing < self.ANGLE_REPAIR_LIMIT))
+        rows = np.flatnonzero(repaired)
+        angles[rows, zero[rows].argmax(axis=1)] = missing[rows]
+        return angles, repaired
+
+    def validate(self):
+        """
+        Пакетная проверка без исключений и вывода: восстанавливает недостающие углы
+        и возвращает коды ошибок и пакет с восстановленными углами.
+        """
+        angles, _ = self.repair_angles()
+        repaired = self.with_arrays(angles, self.sides)
+        return repaired.error_codes(), repaired
+
+    def build_shapes(self):
+        """
+        Одиночные фигуры только для корректных (после восстановления углов) строк пакета.
+        Фигуры создаются без повторной проверки через сеттеры.
+        Возвращает список фигур, номера строк, из которых они построены, и коды ошибок всех строк.
+        """
+        codes, repaired = self.validate()
+        rows = np.flatnonzero(codes == VALID)
+        make = self.shape_class._from_checked
+        shapes = [make(self.n_angles, tuple(angles), tuple(sides), self.name)
+                  for angles, sides in zip(repaired.angles[rows].tolist(), repaired.sides[rows].tolist())]
+        return shapes, rows, codes
+
+    @abstractmethod
+    def classify(self):
+        """Номер класса каждой фигуры (индекс в CLASSES)."""
+        pass
+
+    def class_names(self):
+        return np.array(self.CLASSES)[self.classify()]
+
+    def get_results(self):
+        """
+        Результаты всех фигур одной записью NumPy (RESULT_DTYPE), без строк и вывода.
+        Для некорректных фигур code - код ошибки проверки, а площадь - NaN.
+        """
+        result = np.empty(len(self), dtype=RESULT_DTYPE)
+        codes = self.error_codes()
+        area = np.where(codes == VALID, self.get_sq(), np.nan)
+        result['perimetr'] = self.get_perimetr()
+        result['area'] = area
+        result['code'] = np.where(codes != VALID, codes, np.where(np.isnan(area), self.AREA_ERROR, VALID))
+        result['kind'] = self.classify()
+        return result
+
+    def closed_mask(self):
+        """Фигуры, у которых заданы все углы и стороны и обход сторон замыкается."""
+        x, y = polygon_vertices(self.angles, self.sides)
+        gap = closure_gap(x, y, self.angles, self.sides)
+        return (self._angles_in_range() & self._sides_positive()
+                & (gap <= CLOSURE_TOLERANCE * self.get_perimetr()))
+
+    def outline(self):
+        """
+        Контур фигур в собственных координатах: вершины (N, k) по внешним углам поворота
+        (см. polygon_vertices), без замыкающей точки. Для фигур без замкнутого контура - NaN.
+        """
+        x, y = polygon_vertices(self.angles, self.sides)
+        closed = self.closed_mask()
+        return np.where(closed[:, None], x, np.nan), np.where(closed[:, None], y, np.nan)
+
+    def _angles_in_range(self, upper=360):
+        return ((self.angles > 0) & (self.angles < upper)).all(axis=1)
+
+    def _angle_sum_is(self, total):
+        return np.abs(self.angles.sum(axis=1) - total) < ANGLE_TOLERANCE
+
+    def _sides_positive(self):
+        return (self.sides > 0).all(axis=1)
+
+
+class CircleBatch(ShapeBatch):
+    n_angles = 0
+    name = 'круг'
+    shape_class = Circle
+    CLASSES = ('круг',)
+
+    def __init__(self, radius):
+        radius = np.asarray(radius, dtype=np.float64).reshape(-1)
+        super().__init__(np.empty((len(radius), 0)), radius)
+
+    @classmethod
+    def from_shapes(cls, shapes):
+        return cls([shape.sides[0] for shape in shapes])
+
+    def get_perimetr(self):
+        return 2 * pi * self.sides[:, 0]
+
+    def get_sq(self):
+        return pi * self.sides[:, 0] ** 2
+
+    def _error_conditions(self):
+        return [(SIDE_ERROR, ~(self.sides[:, 0] > 0))]
+
+    def classify(self):
+        return np.zeros(len(self), dtype=np.int8)
+
+    def outline(self):
+        """Правильный CIRCLE_SEGMENTS-угольник, вписанный в окружность с центром (0, 0)."""
+        phi = np.linspace(0, 2 * pi, CIRCLE_SEGMENTS, endpoint=False)
+        radius = np.where(self.valid_mask(), self.sides[:, 0], np.nan)[:, None]
+        return radius * np.cos(phi), radius * np.sin(phi)
+
+
+class TriangleBatch(ShapeBatch):
+    n_angles = 3
+    name = 'Треугольник'
+    shape_class = Triangle
+    CLASSES = ('равносторонний', 'равнобедренный', 'разносторонний')
+    ANGLE_REPAIR_LIMIT = 180
+
+    def _error_conditions(self):
+        a, b, c = self.sides.T
+        return super()._error_conditions() + [
+            (TRIANGLE_INEQUALITY_ERROR, ~((a + b > c) & (a + c > b) & (b + c > a)))]
+
+    def get_sq(self):
+        """Те же формулы и тот же порядок их выбора, что в Triangle.get_sq."""
+        a, b, c = self.sides.T
+        A, B, C = self.angles.T
+        with np.errstate(invalid='ignore'):
+            s = (a + b + c) / 2
+            heron = np.sqrt(s * (s - a) * (s - b) * (s - c))
+        area = np.full(len(self), np.nan)
+        # 1. Формула Герона (если известны все стороны и выражение под корнем неотрицательно)
+        use = (self.sides != 0).all(axis=1) & ~np.isnan(heron)
+        area[use] = heron[use]
+        # 2. Две стороны и угол между ними
+        for x, y, angle in ((a, b, C), (a, c, B), (b, c, A)):
+            use = np.isnan(area) & (x > 0) & (y > 0) & (angle > 0)
+            area[use] = 0.5 * x[use] * y[use] * np.sin(np.radians(angle[use]))
+        # 3. Основание a и высота b*sin(A)
+        use = np.isnan(area) & (a > 0) & (B > 0) & (C > 0)
+        area[use] = 0.5 * a[use] * b[use] * np.sin(np.radians(A[use]))
+        return area
+
+    def classify(self):
+        a, b, c = self.sides.T
+        equal_pairs = (a == b).astype(np.int8) + (b == c) + (a == c)
+        return np.where(equal_pairs == 3, 0, np.where(equal_pairs > 0, 1, 2)).astype(np.int8)
+
+    def outline(self):
+        """
+        Треугольник по трём сторонам: сторона a от (0, 0) вдоль оси x, третья вершина -
+        по теореме косинусов. Для сторон, не образующих треугольник, - NaN.
+        """
+        a, b, c = self.sides.T
+        valid = self._sides_positive() & (a + b > c) & (a + c > b) & (b + c > a)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x2 = (a ** 2 + c ** 2 - b ** 2) / (2 * a)
+            y2 = np.sqrt(c ** 2 - x2 ** 2)
+        x = np.stack([np.zeros_like(a), a, x2], axis=1)
+        y = np.stack([np.zeros_like(a), np.zeros_like(a), y2], axis=1)
+        return np.where(valid[:, None], x, np.nan), np.where(valid[:, None], y, np.nan)
+
+
+class QuadrangleBatch(ShapeBatch):
+    n_angles = 4
+    name = 'Четырёхугольник'
+    shape_class = Quadrangle
+    CLASSES = ('квадрат', 'прямоугольник', 'ромб', 'параллелограмм', 'трапеция', 'произвольный')
+    ANGLE_REPAIR_LIMIT = 360
+    AREA_ERROR = AREA_UNDEFINED
+
+    def classify(self):
+        """Та же цепочка проверок, что в Quadrangle.get_sq: класс задаёт первая подошедшая."""
+        angles, sides = self.angles, self.sides
+        right = (angles == 90).all(axis=1)
+        equal_sides = (sides == sides[:, :1]).all(axis=1)
+        opposite_sides = (sides[:, 0] == sides[:, 2]) & (sides[:, 1] == sides[:, 3])
+        two_angle_values = (np.diff(np.sort(angles, axis=1), axis=1) != 0).sum(axis=1) == 1
+        opposite_angles = (angles[:, 0] == angles[:, 2]) & (angles[:, 1] == angles[:, 3])
+        trapezoid = (angles[:, 0] == angles[:, 2]) | (angles[:, 1] == angles[:, 3])
+        conditions = [right & equal_sides, right & opposite_sides, equal_sides & two_angle_values,
+                      opposite_angles & opposite_sides, trapezoid]
+        return np.select(conditions, range(len(conditions)), default=len(conditions)).astype(np.int8)
+
+    def get_diagonals_and_angle(self):
+        """Диагонали и угол между ними (в градусах) для всех фигур; NaN, где угол не определён."""
+        x, y = build_vertices(self.angles, self.sides)
+        v1 = np.stack([x[:, 2] - x[:, 0], y[:, 2] - y[:, 0]])
+        v2 = np.stack([x[:, 3] - x[:, 1], y[:, 3] - y[:, 1]])
+        d1 = np.hypot(*v1)
+        d2 = np.hypot(*v2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cosine = (v1 * v2).sum(axis=0) / (d1 * d2)
+            # Как и math.acos, вне [-1, 1] угол не определён
+            angle = np.degrees(np.arccos(np.where(np.abs(cosine) <= 1, cosine, np.nan)))
+        return d1, d2, angle
+
+    def get_sq(self):
+        angles, sides = self.angles, self.sides
+        kind = self.classify()
+        sin = np.sin(np.radians(angles))
+        area = np.select(
+            [kind == 0, kind == 1, kind == 2, kind == 3, kind == 4],
+            [sides[:, 0] ** 2,
+             sides[:, 0] * sides[:, 1],
+             sides[:, 0] ** 2 * sin[:, 0],
+             sides[:, 0] * sides[:, 1] * sin[:, 1],
+             0.5 * (sides[:, 0] + sides[:, 2]) * sides[:, 1] * sin[:, 1]],
+            default=np.nan)
+        # Произвольные - через диагонали и угол между ними, только для тех, кому это нужно
+        arbitrary = kind == 5
+        if arbitrary.any():
+            d1, d2, angle = self[arbitrary].get_diagonals_and_angle()
+            area[arbitrary] = 0.5 * d1 * d2 * np.sin(np.radians(angle))
+        return area
+
+
+class NangleBatch(ShapeBatch):
+    """
+    Пакет N-угольников с одинаковым n (n >= 5).
+    """
+    shape_class = Nangle
+    CLASSES = ('правильный', 'произвольный')
+    AREA_ERROR = AREA_NOT_CLOSED
+
+    def __init__(self, n, angles, sides):
+        if n < 5:
+            raise InvalidShapeError("Используйте специализированные пакеты для фигур с количеством углов меньше 5")
+        self.n_angles = n
+        self.name = f"{n}-угольник"
+        super().__init__(angles, sides)
+
+    @classmethod
+    def from_shapes(cls, shapes):
+        shapes = list(shapes)
+        return cls(shapes[0].n_angles, [shape.angles for shape in shapes], [shape.sides for shape in shapes])
+
+    def classify(self):
+        regular = ((self.sides == self.sides[:, :1]).all(axis=1)
+                   & (self.angles == self.angles[:, :1]).all(axis=1))
+        return np.where(regular, 0, 1).astype(np.int8)
+
+    def get_vertices(self):
+        """Вершины (N, n) по внешним углам поворота, как в Nangle.get_vertices (без замыкающей точки)."""
+        return polygon_vertices(self.angles, self.sides)
+
+    def get_sq(self):
+        """Как Nangle.get_sq: формула для правильных, формула шнурования для остальных замкнутых, иначе NaN."""
+        n = self.n_angles
+        regular = self.classify() == 0
+        x, y = self.get_vertices()
+        area = np.where(self.closed_mask(), np.abs(shoelace_area(x, y)), np.nan)
+        return np.where(regular, n * self.sides[:, 0] ** 2 / (4 * tan(pi / n)), area)
+
+    def get_centroid(self):
+        """Центры масс (NaN для незамкнутых многоугольников)."""
+        closed = self.closed_mask()
+        cx, cy = polygon_centroid(*self.get_vertices())
+        return np.where(closed, cx, np.nan), np.where(closed, cy, np.nan)
+
+    def convex_mask(self):
+        return self.closed_mask() & polygon_is_convex(*self.get_vertices())
+
+
+def make_batch(n_angles, angles, sides):
+    """Пакет фигур с n_angles углами из массивов углов (N, n_angles) и сторон (для кругов - радиусов)."""
+    if n_angles == 0:
+        return CircleBatch(sides)
+    if n_angles in (3, 4):
+        return batch_class(n_angles)(angles, sides)
+    return NangleBatch(n_angles, angles, sides)
+
+
+def validate_shapes(n_angles, angles, sides):
+    """
+    Проверка массива кандидатов без создания объектов и исключений.
+    Возвращает коды ошибок (N,) и углы с восстановленным недостающим углом (N, n_angles).
+    """
+    codes, repaired = make_batch(n_angles, angles, sides).validate()
+    return codes, repaired.angles
+
+
+def build_valid_shapes(n_angles, angles, sides):
+    """Создаёт фигуры только из корректных строк; возвращает (фигуры, номера строк, коды ошибок)."""
+    return make_batch(n_angles, angles, sides).build_shapes()
+
+
+def batch_class(n_angles):
+    """Класс пакета для фигур с n_angles углами."""
+    if n_angles == 0:
+        return CircleBatch
+    if n_angles == 3:
+        return TriangleBatch
+    if n_angles == 4:
+        return QuadrangleBatch
+    return NangleBatch
+
+
+class ShapeCollection:
+    """
+    Набор фигур разных типов: по одному пакету на тип, ключ - количество углов
+    (0 - круги, 3 - треугольники, 4 - четырёхугольники, n >= 5 - n-угольники).
+    """
+    def __init__(self, batches=()):
+        self.batches = {}
+        for batch in batches:
+            self.add(batch)
+
+    def add(self, batch):
+        """Добавляет пакет; пакет того же типа дописывается в конец существующего."""
+        existing = self.batches.get(batch.n_angles)
+        if existing is not None:
+            batch = existing.with_arrays(np.concatenate([existing.angles, batch.angles]),
+                                         np.concatenate([existing.sides, batch.sides]))
+        self.batches[batch.n_angles] = batch
+
+    @classmethod
+    def from_shapes(cls, shapes):
+        """Группирует одиночные фигуры по типу и строит из каждой группы пакет."""
+        groups = {}
+        for shape in shapes:
+            groups.setdefault(shape.n_angles, []).append(shape)
+        return cls(batch_class(n).from_shapes(group) for n, group in groups.items())
+
+    def __len__(self):
+        return sum(len(batch) for batch in self.batches.values())
+
+    def get_sq(self):
+        return {n: batch.get_sq() for n, batch in self.batches.items()}
+
+    def get_perimetr(self):
+        return {n: batch.get_perimetr() for n, batch in self.batches.items()}
+
+    def valid_mask(self):
+        return {n: batch.valid_mask() for n, batch in self.batches.items()}
+
+    def class_names(self):
+        return {n: batch.class_names() for n, batch in self.batches.items()}
+
+    def get_results(self):
+        return {n: batch.get_results() for n, batch in self.batches.items()}
+
+    def total_area(self):
+        """Суммарная площадь всех фигур, для которых она вычислима."""
+        return float(sum(np.nansum(area) for area in self.get_sq().values()))
+
+
+
+PARALLEL_CHUNK = 250000  # Число фигур в одной задаче процесса
+
+
+def _shared_array(shm, shape, dtype):
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _parallel_worker(task):
+    """Выполняется в дочернем процессе: метод пакета для строк start:stop, результат - в общую память."""
+    template, method, args, inputs, outputs, start, stop = task
+    blocks = [SharedMemory(name=name) for name, _, _ in inputs + outputs]
+    try:
+        angles, sides, *results = [_shared_array(block, shape, dtype)
+                                   for block, (_, shape, dtype) in zip(blocks, inputs + outputs)]
+        values = getattr(template.with_arrays(angles[start:stop], sides[start:stop]), method)(*args)
+        for result, value in zip(results, values if isinstance(values, tuple) else (values,)):
+            result[start:stop] = value
+        del angles, sides, results
+    finally:
+        for block in blocks:
+            block.close()
+
+
+class ParallelEvaluator:
+    """
+    Вычисление методов пакетов фигур в пуле процессов.
+    Углы, стороны и результаты лежат в общей памяти (multiprocessing.shared_memory):
+    процессам передаются только имена блоков и границы строк, массивы не сериализуются.
+    Пул создаётся один раз и переиспользуется; удобно использовать как контекстный менеджер:
+
+        with ParallelEvaluator(workers=8) as evaluator:
+            area = evaluator.evaluate(batch, 'get_sq')
+    """
+    def __init__(self, workers=None, chunk_size=PARALLEL_CHUNK):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        # Общий для всех процессов трекер: иначе каждый процесс пула заводит свой
+        # и при завершении пытается удалить блоки общей памяти, которые ему не принадлежат
+        resource_tracker.ensure_running()
+        self.pool = get_context().Pool(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def evaluate(self, batch, method, *args):
+        """
+        batch.method(*args), посчитанный по частям в процессах пула.
+        Метод должен возвращать массив длины len(batch) или кортеж таких массивов
+        (get_sq, get_perimetr, get_diagonals_and_angle, get_centroid, error_codes и т.д.).
+        """
+        n = len(batch)
+        # Форма и тип результата - по первой фигуре, вычисленной здесь же
+        sample = getattr(batch[:1], method)(*args)
+        is_tuple = isinstance(sample, tuple)
+        samples = sample if is_tuple else (sample,)
+        if n == 0:
+            return sample
+        blocks = []
+        try:
+            specs = []
+            for array in (np.ascontiguousarray(batch.angles), np.ascontiguousarray(batch.sides)):
+                block = SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(block)
+                _shared_array(block, array.shape, array.dtype)[...] = array
+                specs.append((block.name, array.shape, array.dtype.str))
+            outputs = []
+            for value in samples:
+                value = np.asarray(value)
+                shape = (n,) + value.shape[1:]
+                block = SharedMemory(create=True, size=max(int(np.prod(shape)) * value.itemsize, 1))
+                blocks.append(block)
+                outputs.append((block.name, shape, value.dtype.str))
+            chunk = max(1, min(self.chunk_size, -(-n // self.workers)))
+            template = batch[:0]
+            tasks = [(template, method, args, specs, outputs, start, min(start + chunk, n))
+                     for start in range(0, n, chunk)]
+            self.pool.map(_parallel_worker, tasks)
+            results = tuple(_shared_array(block, shape, dtype).copy()
+                            for block, (_, shape, dtype) in zip(blocks[2:], outputs))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return results if is_tuple else results[0]
+
+    def evaluate_collection(self, collection, method, *args):
+        """Метод для каждого пакета коллекции: словарь {количество углов: результат}."""
+        return {n: self.evaluate(batch, method, *args) for n, batch in collection.batches.items()}
+
+
+def parallel_evaluate(batch, method, *args, workers=None):
+    """Однократное вычисление batch.method(*args) в новом пуле процессов (см. ParallelEvaluator)."""
+    with ParallelEvaluator(workers) as evaluator:
+        return evaluator.evaluate(batch, method, *args)
+
+
+STORAGE_VERSION = 1  # Версия формата каталога с коллекцией (index.json)
+JSONL_CHUNK = 100000  # Число строк JSONL, из которых собирается одна порция пакетов
+
+
+def _kind_name(n_angles):
+    return 'circle' if n_angles == 0 else f"n{n_angles}"
+
+
+def save_collection(collection, path):
+    """
+    Сохраняет ShapeCollection в столбцовом виде: по два массива (углы и стороны) на каждый тип фигур.
+    Если path оканчивается на .npz - один архив NumPy, иначе - каталог с файлами .npy
+    и описанием index.json; каталог можно загружать отображением в память (load_collection).
+    """
+    if path.endswith('.npz'):
+        arrays = {}
+        for n, batch in collection.batches.items():
+            arrays[f"{_kind_name(n)}_angles"] = batch.angles
+            arrays[f"{_kind_name(n)}_sides"] = batch.sides
+        np.savez(path, **arrays)
+        return
+    os.makedirs(path, exist_ok=True)
+    kinds = []
+    for n, batch in sorted(collection.batches.items()):
+        name = _kind_name(n)
+        np.save(os.path.join(path, f"{name}_angles.npy"), np.ascontiguousarray(batch.angles))
+        np.save(os.path.join(path, f"{name}_sides.npy"), np.ascontiguousarray(batch.sides))
+        kinds.append({'n_angles': n, 'count': len(batch),
+                      'angles': f"{name}_angles.npy", 'sides': f"{name}_sides.npy"})
+    with open(os.path.join(path, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': STORAGE_VERSION, 'kinds': kinds}, f, ensure_ascii=False, indent=2)
+
+
+def load_collection(path, mmap=True):
+    """
+    Загружает коллекцию, сохранённую save_collection. Из каталога при mmap=True массивы
+    отображаются в память только для чтения и читаются с диска по мере обращения.
+    Архив .npz отображать в память нельзя: каждый массив читается целиком при загрузке.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as archive:
+            names = {key[:-len('_angles')] for key in archive.files if key.endswith('_angles')}
+            return ShapeCollection(make_batch(0 if name == 'circle' else int(name[1:]),
+                                              archive[f"{name}_angles"], archive[f"{name}_sides"])
+                                   for name in sorted(names))
+    with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('version') != STORAGE_VERSION:
+        raise InvalidShapeError(f"Неподдерживаемая версия формата: {index.get('version')}")
+    mode = 'r' if mmap else None
+    batches = []
+    for kind in index['kinds']:
+        angles = np.load(os.path.join(path, kind['angles']), mmap_mode=mode)
+        sides = np.load(os.path.join(path, kind['sides']), mmap_mode=mode)
+        batches.append(make_batch(kind['n_angles'], angles, sides))
+    return ShapeCollection(batches)
+
+
+def write_jsonl(collection, filename, chunk_size=JSONL_CHUNK):
+    """
+    Записывает коллекцию в JSON Lines: одна фигура на строку, {"n_angles", "angles", "sides"}.
+    Массивы переводятся в списки порциями по chunk_size строк, так что память не зависит от размера коллекции.
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        for n, batch in collection.batches.items():
+            for start in range(0, len(batch), chunk_size):
+                angles = batch.angles[start:start + chunk_size].tolist()
+                sides = batch.sides[start:start + chunk_size].tolist()
+                f.writelines(json.dumps({'n_angles': n, 'angles': a, 'sides': s}) + '\n'
+                             for a, s in zip(angles, sides))
+
+
+def iter_jsonl(filename, chunk_size=JSONL_CHUNK):
+    """
+    Потоковое чтение JSON Lines, записанного write_jsonl: каждые chunk_size строк собираются
+    в ShapeCollection из пакетов NumPy; объекты фигур не создаются (см. ShapeBatch.build_shapes).
+    """
+    groups = {}
+    count = 0
+    with open(filename, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                group = groups.setdefault(int(row['n_angles']), ([], []))
+                group[0].append(row['angles'])
+                group[1].append(row['sides'])
+            except (ValueError, KeyError, TypeError) as e:
+                raise InvalidShapeError(f"Ошибка в строке {line_number} файла {filename}: {e}") from e
+            count += 1
+            if count == chunk_size:
+                yield _collection_from_groups(groups)
+                groups, count = {}, 0
+    if count:
+        yield _collection_from_groups(groups)
+
+
+def _collection_from_groups(groups):
+    return ShapeCollection(make_batch(n, np.array(angles, dtype=np.float64).reshape(len(sides), n), sides)
+                           for n, (angles, sides) in groups.items())
+
+
+def read_jsonl(filename, chunk_size=JSONL_CHUNK):
+    """Вся коллекция из файла JSON Lines (порции iter_jsonl объединяются по типам фигур)."""
+    parts = {}
+    for part in iter_jsonl(filename, chunk_size):
+        for n, batch in part.batches.items():
+            parts.setdefault(n, []).append(batch)
+    # Один concatenate на тип вместо дописывания порций по одной
+    return ShapeCollection(batches[0].with_arrays(np.concatenate([batch.angles for batch in batches]),
+                                                  np.concatenate([batch.sides for batch in batches]))
+                           for batches in parts.values())
+
+
+GRID_MAX_CELLS = 4096  # Фигуры, задевающие больше ячеек сетки, проверяются перебором
+EDGE_CHUNK = 1 << 22  # Число пар (точка, сторона) или (сторона, сторона), обрабатываемых за раз
+
+
+def _place(x, y, origin_x, origin_y, rotation):
+    """Поворот контуров (N, k) на rotation градусов вокруг (0, 0) и перенос в (origin_x, origin_y)."""
+    phi = np.radians(np.asarray(rotation, dtype=np.float64))[..., None]
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+    return (np.asarray(origin_x, dtype=np.float64)[..., None] + x * cos_phi - y * sin_phi,
+            np.asarray(origin_y, dtype=np.float64)[..., None] + x * sin_phi + y * cos_phi)
+
+
+def _chunks(counts, limit=EDGE_CHUNK):
+    """Срезы подряд идущих групп, суммарная длина которых не больше limit (но не меньше одной группы)."""
+    total = np.cumsum(counts)
+    start = 0
+    while start < len(total):
+        before = total[start - 1] if start else 0
+        end = max(int(np.searchsorted(total, before + limit, side='right')), start + 1)
+        yield slice(start, end)
+        start = end
+
+
+class PlacedShape:
+    """
+    Фигура, размещённая на плоскости: начало её контура (для круга - центр) переносится
+    в точку (x, y), а сам контур поворачивается на rotation градусов.
+    """
+    __slots__ = ('shape', 'x', 'y', 'rotation')
+
+    def __init__(self, shape, x=0, y=0, rotation=0):
+        self.shape = shape
+        self.x = x
+        self.y = y
+        self.rotation = rotation
+
+    def get_vertices(self):
+        """Вершины контура в координатах плоскости (см. ShapeBatch.outline); круг - CIRCLE_SEGMENTS-угольник."""
+        x, y = batch_class(self.shape.n_angles).from_shapes([self.shape]).outline()
+        x, y = _place(x, y, [self.x], [self.y], [self.rotation])
+        return x[0], y[0]
+
+    def get_bbox(self):
+        """Ограничивающий прямоугольник (xmin, ymin, xmax, ymax)."""
+        placed = PlacedShapes.from_shapes([self])
+        if not len(placed):
+            raise InvalidShapeError("У фигуры нет замкнутого контура")
+        return tuple(float(bound[0]) for bound in placed.get_bbox())
+
+    def contains_point(self, px, py):
+        placed = PlacedShapes.from_shapes([self])
+        return bool(len(placed)) and bool(placed.contains_points([px], [py], [0])[0])
+
+
+class PlacedShapes:
+    """
+    Множество размещённых фигур в плоских массивах NumPy.
+
+    Атрибуты:
+        x_vertices, y_vertices - Вершины контуров всех фигур подряд
+        offsets - Контур фигуры i - вершины offsets[i]:offsets[i + 1] (у кругов контура нет)
+        center_x, center_y - Точка размещения фигуры (для круга - центр)
+        radius - Радиус для кругов, NaN для многоугольников
+        n_angles - Количество углов каждой фигуры
+        source_index - Номер фигуры в исходном пакете или списке
+    Фигуры без замкнутого контура (несогласованные углы и стороны) в множество не попадают.
+    """
+    def __init__(self, x_vertices, y_vertices, offsets, center_x, center_y, radius, n_angles, source_index):
+        self.x_vertices = x_vertices
+        self.y_vertices = y_vertices
+        self.offsets = offsets
+        self.center_x = center_x
+        self.center_y = center_y
+        self.radius = radius
+        self.n_angles = n_angles
+        self.source_index = source_index
+        # Следующая вершина контура для каждой вершины: стороны - пары (v, next_vertex[v])
+        self.next_vertex = np.arange(1, len(x_vertices) + 1)
+        nonempty = offsets[1:] > offsets[:-1]
+        self.next_vertex[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+        self._compute_bbox()
+
+    def _compute_bbox(self):
+        circle = ~np.isnan(self.radius)
+        self.xmin = np.where(circle, self.center_x - self.radius, np.inf)
+        self.xmax = np.where(circle, self.center_x + self.radius, -np.inf)
+        self.ymin = np.where(circle, self.center_y - self.radius, np.inf)
+        self.ymax = np.where(circle, self.center_y + self.radius, -np.inf)
+        polygons = np.flatnonzero(~circle)
+        if len(polygons):
+            starts = self.offsets[polygons]
+            self.xmin[polygons] = np.minimum.reduceat(self.x_vertices, starts)
+            self.xmax[polygons] = np.maximum.reduceat(self.x_vertices, starts)
+            self.ymin[polygons] = np.minimum.reduceat(self.y_vertices, starts)
+            self.ymax[polygons] = np.maximum.reduceat(self.y_vertices, starts)
+
+    @classmethod
+    def from_batch(cls, batch, x=0, y=0, rotation=0):
+        """
+        Размещает все фигуры пакета: x, y, rotation - числа или массивы длины len(batch).
+        source_index - номер фигуры в пакете.
+        """
+        n = len(batch)
+        x = np.broadcast_to(np.asarray(x, dtype=np.float64), n)
+        y = np.broadcast_to(np.asarray(y, dtype=np.float64), n)
+        rotation = np.broadcast_to(np.asarray(rotation, dtype=np.float64), n)
+        if batch.n_angles == 0:
+            keep = np.flatnonzero(batch.valid_mask())
+            return cls(np.empty(0), np.empty(0), np.zeros(len(keep) + 1, dtype=np.int64), x[keep], y[keep],
+                       batch.sides[keep, 0], np.zeros(len(keep), dtype=np.int64), keep)
+        local_x, local_y = batch.outline()
+        keep = np.flatnonzero(np.isfinite(local_x).all(axis=1) & np.isfinite(local_y).all(axis=1))
+        world_x, world_y = _place(local_x[keep], local_y[keep], x[keep], y[keep], rotation[keep])
+        k = local_x.shape[1]
+        return cls(world_x.ravel(), world_y.ravel(), np.arange(len(keep) + 1, dtype=np.int64) * k,
+                   x[keep], y[keep], np.full(len(keep), np.nan), np.full(len(keep), batch.n_angles), keep)
+
+    @classmethod
+    def from_shapes(cls, placed_shapes):
+        """Множество из списка PlacedShape; source_index - номер фигуры в списке."""
+        placed_shapes = list(placed_shapes)
+        groups = {}
+        for i, placed in enumerate(placed_shapes):
+            groups.setdefault(placed.shape.n_angles, []).append(i)
+        parts = []
+        for n, indices in groups.items():
+            group = [placed_shapes[i] for i in indices]
+            part = cls.from_batch(batch_class(n).from_shapes([placed.shape for placed in group]),
+                                  [placed.x for placed in group], [placed.y for placed in group],
+                                  [placed.rotation for placed in group])
+            part.source_index = np.asarray(indices, dtype=np.int64)[part.source_index]
+            parts.append(part)
+        return cls.concatenate(parts)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Объединение нескольких множеств; номера фигур идут подряд в порядке parts."""
+        parts = list(parts)
+        if not parts:
+            return cls(np.empty(0), np.empty(0), np.zeros(1, dtype=np.int64), np.empty(0), np.empty(0),
+                       np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        shift = np.cumsum([0] + [len(part.x_vertices) for part in parts[:-1]])
+        offsets = np.concatenate([parts[0].offsets[:1]] + [part.offsets[1:] + d for part, d in zip(parts, shift)])
+        fields = ('x_vertices', 'y_vertices')
+        columns = ('center_x', 'center_y', 'radius', 'n_angles', 'source_index')
+        return cls(*[np.concatenate([getattr(part, name) for part in parts]) for name in fields], offsets,
+                   *[np.concatenate([getattr(part, name) for part in parts]) for name in columns])
+
+    def __len__(self):
+        return len(self.center_x)
+
+    def get_bbox(self):
+        return self.xmin, self.ymin, self.xmax, self.ymax
+
+    def get_vertices(self, i):
+        """Вершины контура фигуры i (для круга - CIRCLE_SEGMENTS-угольник)."""
+        if not np.isnan(self.radius[i]):
+            x, y = CircleBatch([self.radius[i]]).outline()
+            return x[0] + self.center_x[i], y[0] + self.center_y[i]
+        part = slice(self.offsets[i], self.offsets[i + 1])
+        return self.x_vertices[part], self.y_vertices[part]
+
+    def _edge_counts(self, shape):
+        return self.offsets[shape + 1] - self.offsets[shape]
+
+    def contains_points(self, px, py, shape):
+        """
+        Для пар (точка, фигура) - лежит ли точка px[i], py[i] внутри фигуры shape[i].
+        Круги проверяются точно, многоугольники - векторным подсчётом пересечений луча со сторонами.
+        """
+        px, py, shape = (np.asarray(a) for a in np.broadcast_arrays(px, py, shape))
+        shape = shape.astype(np.int64)
+        inside = np.zeros(len(shape), dtype=bool)
+        circle = ~np.isnan(self.radius[shape])
+        inside[circle] = (np.hypot(px[circle] - self.center_x[shape[circle]], py[circle] - self.center_y[shape[circle]])
+                          <= self.radius[shape[circle]])
+        polygons = np.flatnonzero(~circle)
+        counts = self._edge_counts(shape[polygons])
+        for part in _chunks(counts):
+            pairs = polygons[part]
+            pair, local = _expand_ranges(counts[part])
+            v = self.offsets[shape[pairs]][pair] + local
+            w = self.next_vertex[v]
+            x0, y0 = self.x_vertices[v], self.y_vertices[v]
+            x1, y1 = self.x_vertices[w], self.y_vertices[w]
+            qx, qy = px[pairs][pair], py[pairs][pair]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                crossing = ((y0 > qy) != (y1 > qy)) & (qx < (x1 - x0) * (qy - y0) / (y1 - y0) + x0)
+            inside[pairs] = np.bincount(pair, weights=crossing, minlength=len(pairs)) % 2 == 1
+        return inside
+
+    def _near_edges(self, px, py, distance, shape):
+        """Для пар (точка, многоугольник) - есть ли сторона не дальше distance от точки."""
+        near = np.zeros(len(shape), dtype=bool)
+        counts = self._edge_counts(shape)
+        for part in _chunks(counts):
+            pair, local = _expand_ranges(counts[part])
+            pairs = np.arange(part.start, part.stop)[pair]
+            v = self.offsets[shape[pairs]] + local
+            w = self.next_vertex[v]
+            x0, y0 = self.x_vertices[v], self.y_vertices[v]
+            ex, ey = self.x_vertices[w] - x0, self.y_vertices[w] - y0
+            qx, qy = px[pairs] - x0, py[pairs] - y0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                t = np.clip(np.nan_to_num((qx * ex + qy * ey) / (ex ** 2 + ey ** 2)), 0, 1)
+            close = np.hypot(qx - t * ex, qy - t * ey) <= distance[pairs]
+            near[part] = np.bincount(pair, weights=close, minlength=part.stop - part.start) > 0
+        return near
+
+    def _edges_cross(self, first, second):
+        """Для пар многоугольников - пересекается (или касается) ли хотя бы одна пара их сторон."""
+        cross = np.zeros(len(first), dtype=bool)
+        k1, k2 = self._edge_counts(first), self._edge_counts(second)
+        for part in _chunks(k1 * k2):
+            pair, local = _expand_ranges(k1[part] * k2[part])
+            pairs = np.arange(part.start, part.stop)[pair]
+            a = self.offsets[first[pairs]] + local // k2[pairs]
+            b = self.offsets[second[pairs]] + local % k2[pairs]
+            na, nb = self.next_vertex[a], self.next_vertex[b]
+            hit = _segments_intersect(self.x_vertices[a], self.y_vertices[a], self.x_vertices[na], self.y_vertices[na],
+                                      self.x_vertices[b], self.y_vertices[b], self.x_vertices[nb], self.y_vertices[nb])
+            cross[part] = np.bincount(pair, weights=hit, minlength=part.stop - part.start) > 0
+        return cross
+
+    def intersects(self, first, second):
+        """
+        Для пар фигур (first[i], second[i]) - пересекаются ли они (касание и вложенность
+        тоже считаются пересечением). Пары со смешанными типами разбираются отдельно:
+        круг-круг по расстоянию центров, круг-многоугольник по расстоянию до сторон,
+        многоугольник-многоугольник по пересечению сторон.
+        """
+        first = np.asarray(first, dtype=np.int64)
+        second = np.asarray(second, dtype=np.int64)
+        result = np.zeros(len(first), dtype=bool)
+        # Пересекающиеся фигуры обязательно пересекаются ограничивающими прямоугольниками
+        candidate = np.flatnonzero((self.xmin[first] <= self.xmax[second]) & (self.xmin[second] <= self.xmax[first])
+                                   & (self.ymin[first] <= self.ymax[second]) & (self.ymin[second] <= self.ymax[first]))
+        first, second = first[candidate], second[candidate]
+        circle1 = ~np.isnan(self.radius[first])
+        circle2 = ~np.isnan(self.radius[second])
+
+        both = np.flatnonzero(circle1 & circle2)
+        result[candidate[both]] = (np.hypot(self.center_x[first[both]] - self.center_x[second[both]],
+                                            self.center_y[first[both]] - self.center_y[second[both]])
+                                   <= self.radius[first[both]] + self.radius[second[both]])
+
+        mixed = np.flatnonzero(circle1 != circle2)
+        circle = np.where(circle1[mixed], first[mixed], second[mixed])
+        polygon = np.where(circle1[mixed], second[mixed], first[mixed])
+        cx, cy = self.center_x[circle], self.center_y[circle]
+        result[candidate[mixed]] = (self.contains_points(cx, cy, polygon)
+                                    | self._near_edges(cx, cy, self.radius[circle], polygon))
+
+        polygons = np.flatnonzero(~circle1 & ~circle2)
+        a, b = first[polygons], second[polygons]
+        hit = self._edges_cross(a, b)
+        # Без пересечения сторон фигуры пересекаются, только если одна целиком внутри другой
+        rest = np.flatnonzero(~hit)
+        a_start, b_start = self.offsets[a[rest]], self.offsets[b[rest]]
+        hit[rest] = (self.contains_points(self.x_vertices[a_start], self.y_vertices[a_start], b[rest])
+                     | self.contains_points(self.x_vertices[b_start], self.y_vertices[b_start], a[rest]))
+        result[candidate[polygons]] = hit
+        return result
+
+
+class GridIndex:
+    """
+    Пространственный индекс над PlacedShapes - равномерная сетка.
+    Каждая фигура записывается во все ячейки, которые задевает её ограничивающий прямоугольник;
+    ячейки хранятся в сжатом виде (отсортированные номера ячеек, начала и номера фигур),
+    поэтому индекс строится и опрашивается векторно для миллионов фигур.
+    Фигуры, задевающие больше GRID_MAX_CELLS ячеек, хранятся отдельно и проверяются перебором.
+    """
+    def __init__(self, placed, cell_size=None):
+        self.placed = placed
+        xmin, ymin, xmax, ymax = placed.get_bbox()
+        if cell_size is None:
+            # Типичная фигура задевает порядка четырёх ячеек
+            sizes = np.maximum(xmax - xmin, ymax - ymin)
+            cell_size = float(np.median(sizes)) if len(sizes) else 1.0
+        if not cell_size > 0:
+            cell_size = 1.0
+        self.cell_size = cell_size
+        self.origin_x = float(xmin.min()) if len(placed) else 0.0
+        self.origin_y = float(ymin.min()) if len(placed) else 0.0
+        span_x = np.floor((xmax - self.origin_x) / cell_size) - np.floor((xmin - self.origin_x) / cell_size) + 1
+        span_y = np.floor((ymax - self.origin_y) / cell_size) - np.floor((ymin - self.origin_y) / cell_size) + 1
+        large = span_x * span_y > GRID_MAX_CELLS
+        self.large = np.flatnonzero(large)
+        small = np.flatnonzero(~large)
+        item, ix, iy = _grid_cells(xmin[small], ymin[small], xmax[small], ymax[small],
+                                   self.origin_x, self.origin_y, cell_size)
+        self.cell_items = small[item]
+        keys = self._cell_key(ix, iy)
+        order = np.argsort(keys, kind='stable')
+        keys, self.cell_items = keys[order], self.cell_items[order]
+        self.cell_keys, self.cell_starts = np.unique(keys, return_index=True)
+        self.cell_starts = np.append(self.cell_starts, len(keys))
+
+    @staticmethod
+    def _cell_key(ix, iy):
+        """Номер ячейки: координаты упаковываются в одно 64-битное число."""
+        return (iy << 32) + ix
+
+    def _cells_of(self, px, py):
+        """Для точек - номер ячейки в cell_keys (или -1, если ячейка пуста)."""
+        ix = np.floor((px - self.origin_x) / self.cell_size).astype(np.int64)
+        iy = np.floor((py - self.origin_y) / self.cell_size).astype(np.int64)
+        keys = self._cell_key(ix, iy)
+        if not len(self.cell_keys):
+            return np.full(len(keys), -1)
+        cell = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        return np.where(self.cell_keys[cell] == keys, cell, -1)
+
+    def query_bbox(self, xmin, ymin, xmax, ymax):
+        """Номера фигур, чей ограничивающий прямоугольник пересекается с заданным (по возрастанию)."""
+        placed = self.placed
+        nx = np.floor((xmax - self.origin_x) / self.cell_size) - np.floor((xmin - self.origin_x) / self.cell_size) + 1
+        ny = np.floor((ymax - self.origin_y) / self.cell_size) - np.floor((ymin - self.origin_y) / self.cell_size) + 1
+        if nx * ny > len(self.cell_keys):
+            # Запрос шире всей сетки - быстрее просмотреть все фигуры
+            candidates = np.arange(len(placed))
+        else:
+            _, ix, iy = _grid_cells(np.array([xmin]), np.array([ymin]), np.array([xmax]), np.array([ymax]),
+                                    self.origin_x, self.origin_y, self.cell_size)
+            keys = self._cell_key(ix, iy)
+            cell = np.searchsorted(self.cell_keys, keys)
+            cell = cell[cell < len(self.cell_keys)]
+            cell = cell[np.isin(self.cell_keys[cell], keys)]
+            group, local = _expand_ranges(self.cell_starts[cell + 1] - self.cell_starts[cell])
+            candidates = np.concatenate([self.cell_items[self.cell_starts[cell][group] + local], self.large])
+        candidates = np.unique(candidates)
+        hit = ((placed.xmin[candidates] <= xmax) & (placed.xmax[candidates] >= xmin)
+               & (placed.ymin[candidates] <= ymax) & (placed.ymax[candidates] >= ymin))
+        return candidates[hit]
+
+    def query_points(self, px, py):
+        """
+        Какие фигуры содержат точки: возвращает массивы (номер точки, номер фигуры)
+        для всех пар, где точка px[i], py[i] лежит внутри фигуры.
+        """
+        px = np.atleast_1d(np.asarray(px, dtype=np.float64))
+        py = np.atleast_1d(np.asarray(py, dtype=np.float64))
+        cell = self._cells_of(px, py)
+        points = np.flatnonzero(cell >= 0)
+        cell = cell[points]
+        group, local = _expand_ranges(self.cell_starts[cell + 1] - self.cell_starts[cell])
+        point = points[group]
+        shape = self.cell_items[self.cell_starts[cell][group] + local]
+        if len(self.large):
+            point = np.concatenate([point, np.repeat(np.arange(len(px)), len(self.large))])
+            shape = np.concatenate([shape, np.tile(self.large, len(px))])
+        placed = self.placed
+        inside = ((placed.xmin[shape] <= px[point]) & (px[point] <= placed.xmax[shape])
+                  & (placed.ymin[shape] <= py[point]) & (py[point] <= placed.ymax[shape]))
+        point, shape = point[inside], shape[inside]
+        inside = placed.contains_points(px[point], py[point], shape)
+        point, shape = point[inside], shape[inside]
+        order = np.lexsort((shape, point))
+        return point[order], shape[order]
+
+    def query_point(self, px, py):
+        """Номера фигур, содержащих точку (px, py)."""
+        return self.query_points([px], [py])[1]
+
+    def intersecting_pairs(self):
+        """
+        Все пары пересекающихся фигур (i < j): кандидаты - фигуры из общей ячейки сетки,
+        затем точная проверка PlacedShapes.intersects.
+        """
+        first, second = _same_cell_pairs(self._cell_key_of_items(), self.cell_items)
+        n = len(self.placed)
+        if len(self.large):
+            # Большие фигуры проверяются со всеми остальными
+            big = np.repeat(self.large, n)
+            other = np.tile(np.arange(n), len(self.large))
+            keep = big != other
+            first = np.concatenate([first, np.minimum(big, other)[keep]])
+            second = np.concatenate([second, np.maximum(big, other)[keep]])
+        # Пара, задевающая несколько общих ячеек, встречается несколько раз
+        pair_id = np.unique(first * n + second)
+        first, second = pair_id // n, pair_id % n
+        hit = self.placed.intersects(first, second)
+        return first[hit], second[hit]
+
+    def _cell_key_of_items(self):
+        return np.repeat(self.cell_keys, np.diff(self.cell_starts))
+
+
+SCENE_COLORS = {0: 'tab:blue', 3: 'tab:orange', 4: 'tab:green'}  # Цвета по типу фигуры; остальные - tab:purple
+
+
+def _scene_colors(placed, facecolors):
+    """Цвет заливки RGBA (M, 4) для каждой фигуры."""
+    if facecolors is None:
+        kinds, inverse = np.unique(placed.n_angles, return_inverse=True)
+        palette = to_rgba_array([SCENE_COLORS.get(int(n), 'tab:purple') for n in kinds]).reshape(-1, 4)
+        return palette[inverse]
+    colors = to_rgba_array(facecolors)
+    return np.broadcast_to(colors, (len(placed), 4)) if len(colors) == 1 else colors
+
+
+def draw_scene(ax, placed, facecolors=None, edgecolor='black', linewidth=0.3, alpha=0.6, rasterized=False):
+    """
+    Добавляет все фигуры PlacedShapes на оси ax одной пачкой: многоугольники с одинаковым числом
+    вершин - одной PolyCollection из массива (m, k, 2), круги - одной EllipseCollection.
+    facecolors - None (цвет по типу фигуры, SCENE_COLORS), один цвет или цвета всех фигур.
+    """
+    colors = _scene_colors(placed, facecolors)
+    style = dict(edgecolors=edgecolor, linewidths=linewidth, alpha=alpha, rasterized=rasterized)
+    counts = np.diff(placed.offsets)
+    circle = ~np.isnan(placed.radius)
+    for k in np.unique(counts[~circle]):
+        shapes = np.flatnonzero((counts == k) & ~circle)
+        vertex = placed.offsets[shapes][:, None] + np.arange(k)
+        verts = np.stack([placed.x_vertices[vertex], placed.y_vertices[vertex]], axis=-1)
+        ax.add_collection(PolyCollection(verts, facecolors=colors[shapes], closed=True, **style))
+    circles = np.flatnonzero(circle)
+    if len(circles):
+        diameter = 2 * placed.radius[circles]
+        ax.add_collection(EllipseCollection(diameter, diameter, 0, units='xy', facecolors=colors[circles],
+                                            offsets=np.column_stack([placed.center_x[circles], placed.center_y[circles]]),
+                                            offset_transform=ax.transData, **style))
+    if len(placed):
+        xmin, ymin, xmax, ymax = placed.get_bbox()
+        margin = 0.02 * max(xmax.max() - xmin.min(), ymax.max() - ymin.min(), 1e-12)
+        ax.set_xlim(xmin.min() - margin, xmax.max() + margin)
+        ax.set_ylim(ymin.min() - margin, ymax.max() + margin)
+    ax.set_aspect('equal', adjustable='box')
+
+
+def render_scene(placed, filename, title=None, figsize=(8, 8), dpi=150, **style):
+    """
+    Рисует сцену из PlacedShapes без окна (холст Agg, без pyplot и plt.show) и сохраняет её в файл;
+    формат (png, svg, pdf) определяется по расширению filename. style передаётся в draw_scene;
+    для SVG с сотнями тысяч фигур удобно rasterized=True. Возвращает Figure.
+    """
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    draw_scene(ax, placed, **style)
+    if title:
+        ax.set_title(title)
+    fig.savefig(filename)
+    return fig
 
 if __name__ == "__main__":
     # Создание круга
@@ -0,0 +1,277 @@
+"""
+Бенчмарк операций FileDatabase на синтетических таблицах.
+
+Для каждого сочетания (строки, столбцы, ширина ключа, хранилище) в отдельном процессе
+генерируется таблица, замеряются load, save, add, search, edit, delete (по полю),
+import и export, а также пиковый RSS процесса. Результаты пишутся в JSON и могут
+сравниваться с предыдущим прогоном:
+
+    python benchmark.py --rows 10000 100000 --output new.json --compare old.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import multiprocessing
+import numpy as np
+import pandas as pd
+import openpyxl
+
+from index import FileDatabase, STORAGE_MODES, write_records
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+OPERATIONS = ('load', 'save', 'add', 'search', 'edit', 'delete', 'import', 'export')
+FORMATS = ('xlsx', 'csv')
+CATEGORIES = 50  # Число различных значений в строковых столбцах
+DEFAULT_THRESHOLD = 0.2  # Допустимое замедление при сравнении (20%)
+EDITED_VALUES = {'str': "edited", 'int': -1, 'float': -1.0}  # Значение для edit по типу столбца
+
+
+def make_fields(columns, key_width):
+    """Ключевые поля k0..k{w-1} и обычные поля c0..; всего columns столбцов."""
+    key_fields = [f"k{i}" for i in range(key_width)]
+    return key_fields, key_fields + [f"c{i}" for i in range(max(columns - key_width, 0))]
+
+
+def make_record(i, fields, key_width):
+    """
+    Синтетическая запись номер i. Уникальность ключа обеспечивает k0; остальные ключевые
+    поля лишь делают ключ шире. Обычные столбцы по кругу: целые, дробные, категории.
+    """
+    record = {}
+    for n, field in enumerate(fields):
+        if n == 0:
+            record[field] = i
+        elif n < key_width:
+            record[field] = f"p{i % 97}"
+        elif n % 3 == 0:
+            record[field] = i * 7 % 1000
+        elif n % 3 == 1:
+            record[field] = round(i * 0.37 % 100, 2)
+        else:
+            record[field] = f"cat{i % CATEGORIES}"
+    return record
+
+
+def generate_sheet(filename, rows, fields, key_width, start=0):
+    """Потоково записывает таблицу из rows синтетических записей, не держа её в памяти."""
+    records = (make_record(i, fields, key_width) for i in range(start, start + rows))
+    write_records(filename, fields, records, rows)
+
+
+def peak_rss_mb():
+    """Пиковый RSS процесса в МБ (None, если модуль resource недоступен)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в КБ, в macOS - в байтах
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Timer:
+    """Замер времени операции и, опционально, пика памяти Python через tracemalloc."""
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+
+    def measure(self, func, count=1):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - started
+        result = {'seconds': round(seconds, 6), 'count': count,
+                  'per_second': round(count / seconds, 1) if seconds > 0 else None}
+        if self.trace_memory:
+            result['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            tracemalloc.stop()
+        return result
+
+
+def run_case(case, workdir, sample, trace_memory, seed):
+    """Выполняет все операции одного сочетания параметров. Запускается в отдельном процессе."""
+    rng = random.Random(seed)
+    rows, key_width = case['rows'], case['key_width']
+    key_fields, fields = make_fields(case['columns'], key_width)
+    ext = case['format']
+    db_file = os.path.join(workdir, f"db.{ext}")
+    import_file = os.path.join(workdir, f"import.{ext}")
+    export_file = os.path.join(workdir, f"export.{ext}")
+
+    generate_sheet(db_file, rows, fields, key_width)
+    # Половина импорта пересекается с базой, половина - новые записи
+    import_rows = min(sample * 10, rows)
+    generate_sheet(import_file, import_rows, fields, key_width, start=rows - import_rows // 2)
+
+    timer = Timer(trace_memory)
+    ops = {}
+    holder = {}
+
+    def load():
+        holder['db'] = FileDatabase(db_file, key_fields, storage=case['storage'])
+    ops['load'] = timer.measure(load, rows)
+    db = holder['db']
+
+    new_records = [make_record(i, fields, key_width) for i in range(rows + import_rows, rows + import_rows + sample)]
+
+    def add():
+        for record in new_records:
+            db.add_record(record)
+    ops['add'] = timer.measure(add, sample)
+
+    keys = [db._generate_key(make_record(rng.randrange(rows), fields, key_width)) for _ in range(sample)]
+
+    def search():
+        for key in keys:
+            db.search_records(key)
+    ops['search'] = timer.measure(search, sample)
+
+    # Новое значение должно подходить к типу столбца по схеме базы
+    edit_field = fields[-1]
+    edit_value = EDITED_VALUES[db.column_type(edit_field)]
+    # Ключ берётся до изменения: при нескольких ключевых полях редактируемое может быть ключевым
+    edited = []
+    for i in rng.sample(range(rows), min(sample, rows)):
+        record = make_record(i, fields, key_width)
+        edited.append((db._generate_key(record), {**record, edit_field: edit_value}))
+
+    def edit():
+        for key, record in edited:
+            db.edit_record(key, record)
+    ops['edit'] = timer.measure(edit, len(edited))
+
+    # Удаление по значению неключевого поля: затрагивает примерно rows / CATEGORIES записей
+    delete_field = next((f for n, f in enumerate(fields) if n >= key_width and n % 3 == 2), edit_field)
+    delete_value = edit_value if delete_field == edit_field else "cat0"
+    deleted = []
+
+    def delete():
+        deleted.extend(db.delete_records(field=delete_field, value=delete_value))
+    ops['delete'] = timer.measure(delete)
+    ops['delete']['count'] = len(deleted)
+
+    summary = {}
+
+    def import_():
+        summary.update(db.import_from_xlsx(import_file, on_conflict='overwrite'))
+    ops['import'] = timer.measure(import_, import_rows)
+    ops['import']['summary'] = summary
+
+    ops['export'] = timer.measure(lambda: db.export_to_xlsx(export_file), len(db.hash_table))
+    ops['save'] = timer.measure(lambda: db.save(), len(db.hash_table))
+
+    db.close()
+    return dict(case, ops=ops, peak_rss_mb=peak_rss_mb(),
+                file_mb=round(os.path.getsize(db_file) / (1024 * 1024), 2))
+
+
+def _case_worker(args):
+    case, sample, trace_memory, seed = args
+    workdir = tempfile.mkdtemp(prefix="personal_excel_bench_")
+    try:
+        return run_case(case, workdir, sample, trace_memory, seed)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def case_id(case):
+    return f"{case['format']}/{case['storage']}/rows={case['rows']}/cols={case['columns']}/key={case['key_width']}"
+
+
+def run_benchmarks(cases, sample, trace_memory, seed):
+    """Каждое сочетание - в новом процессе, чтобы пиковый RSS не накапливался между замерами."""
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for case in cases:
+        print(f"{case_id(case)} ...", flush=True)
+        with ctx.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(_case_worker, ((case, sample, trace_memory, seed),))
+        for name in OPERATIONS:
+            print(f"    {name:<7} {result['ops'][name]['seconds']:>10.4f} с")
+        print(f"    пиковый RSS: {result['peak_rss_mb']} МБ")
+        results.append(result)
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'openpyxl': openpyxl.__version__,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Сравнивает время операций с базовым прогоном.
+    Возвращает список регрессий: операции, ставшие медленнее более чем на threshold.
+    """
+    base = {case_id(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = base.get(case_id(result))
+        if old is None:
+            continue
+        for name in OPERATIONS:
+            new_seconds = result['ops'][name]['seconds']
+            old_seconds = old['ops'].get(name, {}).get('seconds')
+            if not old_seconds:
+                continue
+            ratio = new_seconds / old_seconds
+            print(f"{case_id(result)} {name:<7} {old_seconds:>9.4f} -> {new_seconds:>9.4f} с (x{ratio:.2f})")
+            if ratio > 1 + threshold:
+                regressions.append({'case': case_id(result), 'operation': name,
+                                    'baseline': old_seconds, 'current': new_seconds, 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк операций FileDatabase")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help="число строк (до 5 000 000; для больших таблиц удобнее --format csv)")
+    parser.add_argument('--columns', type=int, nargs='+', default=[10])
+    parser.add_argument('--key-width', type=int, nargs='+', default=[1, 2], help="число ключевых полей")
+    parser.add_argument('--storage', nargs='+', choices=STORAGE_MODES, default=list(STORAGE_MODES))
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['xlsx'])
+    parser.add_argument('--sample', type=int, default=1000, help="число операций add/search/edit")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="замерять пик памяти Python каждой операции (tracemalloc, заметно медленнее)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    cases = [{'format': fmt, 'storage': storage, 'rows': rows, 'columns': max(columns, key_width), 'key_width': key_width}
+             for fmt in args.format for storage in args.storage for rows in args.rows
+             for columns in args.columns for key_width in args.key_width]
+    results = run_benchmarks(cases, args.sample, args.trace_memory, args.seed)
+    report = {'environment': environment(), 'sample': args.sample, 'results': results}
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            report['regressions'] = compare(results, json.load(f), args.threshold)
+        for regression in report['regressions']:
+            print(f"РЕГРЕССИЯ: {regression['case']} {regression['operation']} x{regression['ratio']}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,1276 @@
 import os
+import csv
+import json
+import math
+import zlib
+import time
+import datetime
+import argparse
+import contextlib
 import shutil
+import numpy as np
 import pandas as pd
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-from openpyxl import load_workbook
+from tkinter import filedialog, messagebox, simpledialog, ttk
+from openpyxl import load_workbook, Workbook
 import hashlib
 import shutil
-from collections import defaultdict
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from collections import defaultdict, deque
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from multiprocessing.connection import Listener, Client
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+PROGRESS_STEP = 1000  # Как часто (в строках) фоновые операции сообщают о прогрессе
+IMPORT_CHUNK_SIZE = 10000  # Сколько строк импорта держится в памяти одновременно
+EXPORT_ROW_GROUP_SIZE = 10000  # Размер группы строк при потоковой записи Parquet
+CONFLICT_POLICIES = ('skip', 'overwrite', 'merge')
+STORAGE_MODES = ('dict', 'columnar')
+ACCESS_MODES = ('rw', 'r', 'w')
+COLUMN_TYPES = ('str', 'int', 'float', 'datetime')  # Типы столбцов схемы базы
+DATE_FORMATS = ('%d.%m.%Y', '%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S')  # Помимо ISO 8601
+
+
+class JobCancelled(Exception):
+    """Фоновая операция отменена пользователем."""
+    pass
+
+
+class ConcurrentModificationError(Exception):
+    """Файл базы изменён другим процессом после загрузки."""
+    pass
+
+
+class FileLock:
+    """
+    Рекомендательная (advisory) блокировка файла для согласования нескольких процессов.
+
+    Блокируется отдельный файл <имя>.lock, а не сама книга: сохранение заменяет книгу
+    через os.replace, и блокировка на её inode потерялась бы. shared=True - разделяемая
+    блокировка для чтения (на Windows, где её нет, используется исключительная).
+    """
+    POLL_INTERVAL = 0.05  # с
+
+    def __init__(self, path, shared=False, timeout=None):
+        self.path = path
+        self.shared = shared
+        self.timeout = timeout  # None - ждать сколько угодно, 0 - не ждать
+        self.file = None
+
+    def acquire(self):
+        self.file = open(self.path, 'a+b')
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            try:
+                self._lock()
+                return self
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.file.close()
+                    self.file = None
+                    raise TimeoutError(f"Не удалось заблокировать {self.path}: файл занят другим процессом.")
+                time.sleep(self.POLL_INTERVAL)
+
+    def _lock(self):
+        if fcntl is not None:
+            fcntl.flock(self.file, (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        else:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def release(self):
+        if self.file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        # Блокировку, уже захваченную через acquire(), with только освобождает по выходу
+        return self if self.file is not None else self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def file_version(filename):
+    """Версия файла для оптимистичной проверки: меняется при каждом сохранении через os.replace."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def report_progress(progress, cancel_event, done, total=None):
+    """Сообщает о прогрессе фоновой операции и прерывает её, если запрошена отмена."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled("Операция отменена.")
+    if progress is not None:
+        progress(done, total)
+
+
+def iter_row_chunks(filename, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Потоково читает XLSX (openpyxl в режиме read_only) или CSV (чанками pandas).
+    Первым элементом выдаёт (заголовки, число строк или None), затем списки строк-кортежей.
+    В памяти одновременно находится не больше chunk_size строк.
+    """
+    if filename.lower().endswith('.csv'):
+        header_sent = False
+        # Значения читаются как строки без вывода типов ('007' не превращается в 7), пустые ячейки -
+        # NaN; к типам столбцов их приводит схема базы (coerce_value)
+        with pd.read_csv(filename, chunksize=chunk_size, encoding='utf-8-sig', dtype=str,
+                         keep_default_na=False, na_values=['']) as reader:
+            for chunk in reader:
+                if not header_sent:
+                    yield chunk.columns.tolist(), None
+                    header_sent = True
+                # Пустые ячейки приводятся к None, как при чтении XLSX
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                yield list(chunk.itertuples(index=False, name=None))
+        if not header_sent:
+            yield read_csv_headers(filename), None
+        return
+
+    wb = load_workbook(filename, read_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        yield list(next(rows, ())), max((ws.max_row or 1) - 1, 0)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        wb.close()
+
+
+def read_csv_headers(filename):
+    return pd.read_csv(filename, nrows=0, encoding='utf-8-sig').columns.tolist()
+
+
+def is_empty_value(value):
+    return value is None or value == '' or (isinstance(value, float) and math.isnan(value))
+
+
+def coerce_value(value, column_type):
+    """
+    Приводит значение к типу столбца схемы: пустые значения -> None, строки из GUI и CSV
+    разбираются в числа и даты, целые дробные числа в int-столбце становятся int.
+    Так одно и то же значение всегда хранится и хешируется одинаково.
+    Выбрасывает ValueError, если значение нельзя привести к типу.
+    """
+    if is_empty_value(value):
+        return None
+    if column_type == 'str':
+        if isinstance(value, str):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+    if column_type == 'int':
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        number = _parse_number(value)
+        if not float(number).is_integer():
+            raise ValueError(f"'{value}' не является целым числом.")
+        return int(number)
+    if column_type == 'float':
+        return float(_parse_number(value))
+    if column_type == 'datetime':
+        return _parse_datetime(value)
+    raise ValueError(f"Неизвестный тип столбца: {column_type}")
+
+
+def _parse_number(value):
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return value
+    if isinstance(value, str):
+        text = value.strip().replace('\u00a0', '').replace(' ', '')
+        try:
+            return int(text)
+        except ValueError:
+            pass
+        try:
+            return float(text.replace(',', '.'))  # Допускается десятичная запятая
+        except ValueError:
+            pass
+    raise ValueError(f"'{value}' не является числом.")
+
+
+def _parse_datetime(value):
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return datetime.datetime.fromisoformat(text)
+        except ValueError:
+            pass
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(text, date_format)
+            except ValueError:
+                pass
+    raise ValueError(f"'{value}' не является датой.")
+
+
+def value_kind(value):
+    """Вид значения из файла для вывода типа столбца (None для пустых)."""
+    if is_empty_value(value):
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return 'str'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    if isinstance(value, (datetime.date, pd.Timestamp)):
+        return 'datetime'
+    return 'str'
+
+
+def infer_column_type(kinds):
+    """Тип столбца по видам его значений: int, float (int и float), datetime или str (всё остальное)."""
+    kinds = set(kinds) - {None}
+    if kinds == {'int'}:
+        return 'int'
+    if kinds and kinds <= {'int', 'float'}:
+        return 'float'
+    if kinds == {'datetime'}:
+        return 'datetime'
+    return 'str'
+
+
+def schema_filename(filename):
+    return f"{filename}.schema.json"
+
+
+def read_schema(filename):
+    """Схема столбцов {поле: тип} из файла рядом с базой или None, если его нет."""
+    path = schema_filename(filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        schema = json.load(f)
+    unknown = {t for t in schema.values() if t not in COLUMN_TYPES}
+    if unknown:
+        raise ValueError(f"Неизвестные типы столбцов в {path}: {', '.join(sorted(unknown))}")
+    return schema
+
+
+def write_schema(filename, schema):
+    path = schema_filename(filename)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_headers(filename):
+    """Читает только первую строку листа (заголовки), не загружая остальные данные."""
+    wb = load_workbook(filename, read_only=True)
+    try:
+        ws = wb.worksheets[0]
+        first_row = next(ws.iter_rows(max_row=1, values_only=True), ())
+        return list(first_row)
+    finally:
+        wb.close()
+
+
+def write_records(filename, fields, records, total=None, progress=None, cancel_event=None, schema=None):
+    """
+    Потоково записывает записи в XLSX (openpyxl write_only), CSV или Parquet (группами строк).
+    Записи не собираются в DataFrame, поэтому пиковая память не растёт с числом строк.
+    schema - типы столбцов {поле: тип из COLUMN_TYPES} для Parquet; не указанные поля пишутся строками.
+    Данные пишутся во временный файл, который заменяет целевой только после успешной записи,
+    поэтому при ошибке или отмене старый файл остаётся нетронутым. Возвращает число строк.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        writer = _write_csv
+    elif extension == '.parquet':
+        def writer(*args):
+            return _write_parquet(*args, schema=schema)
+    else:
+        writer = _write_xlsx
+    tmp_filename = f"{filename}.tmp"
+    try:
+        count = writer(tmp_filename, fields, records, total, progress, cancel_event)
+        os.replace(tmp_filename, filename)
+        return count
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+def _rows(fields, records, total, progress, cancel_event):
+    """Превращает записи в строки значений по списку полей, сообщая о прогрессе."""
+    done = 0
+    for record in records:
+        # NaN (пустые ячейки pandas) записываются как пустые значения
+        yield [None if isinstance(value, float) and math.isnan(value) else value
+               for value in map(record.get, fields)]
+        done += 1
+        if done % PROGRESS_STEP == 0:
+            report_progress(progress, cancel_event, done, total)
+
+
+def _write_xlsx(filename, fields, records, total, progress, cancel_event):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(fields)
+    count = 0
+    try:
+        for row in _rows(fields, records, total, progress, cancel_event):
+            ws.append(row)
+            count += 1
+    except BaseException:
+        ws.close()  # Завершаем поток записи листа, иначе openpyxl пишет в уже закрытый файл
+        raise
+    wb.save(filename)
+    return count
+
+
+def _write_csv(filename, fields, records, total, progress, cancel_event):
+    count = 0
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for row in _rows(fields, records, total, progress, cancel_event):
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+PARQUET_TYPES = {'str': 'string', 'int': 'int64', 'float': 'float64', 'datetime': 'timestamp[us]'}
+
+
+def _write_parquet(filename, fields, records, total, progress, cancel_event, schema=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Для экспорта в Parquet необходимо установить пакет pyarrow.")
+    # Схема Parquet задаётся по типам столбцов заранее: по первой группе строк её вывести нельзя,
+    # столбец может быть пустым или числовым в ней и строковым дальше
+    types = [(schema or {}).get(field, 'str') for field in fields]
+    arrow_schema = pa.schema([(str(field), pa.type_for_alias(PARQUET_TYPES[column_type]))
+                              for field, column_type in zip(fields, types)])
+    writer = pq.ParquetWriter(filename, arrow_schema)
+    count = 0
+    rows = _rows(fields, records, total, progress, cancel_event)
+    try:
+        while True:
+            group = list(islice(rows, EXPORT_ROW_GROUP_SIZE))
+            if not group:
+                break
+            columns = [[coerce_value(row[i], column_type) for row in group] for i, column_type in enumerate(types)]
+            writer.write_table(pa.table(columns, schema=arrow_schema))
+            count += len(group)
+    finally:
+        writer.close()
+    return count
+
+
+def _narrowest(dtypes, low, high):
+    """Самый узкий целый тип из dtypes, вмещающий диапазон [low, high]."""
+    for dtype in dtypes:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    raise OverflowError(f"Диапазон [{low}, {high}] не помещается в {np.dtype(dtypes[-1])}")
+
+
+class _Column:
+    """
+    Один столбец колоночного хранилища.
+    kind: 'empty' - значений ещё не было, 'int' - самый узкий подходящий целый тип с маской пропусков,
+    'float' - float64 (пропуск = NaN), 'category' - коды словаря уникальных значений
+    int8/int16/int32 (пропуск = -1), 'text' - строки, почти не повторяющиеся: байты UTF-8 подряд
+    в одном буфере, а у строки таблицы - смещение starts и длина data (пропуск = -1).
+    """
+    __slots__ = ('kind', 'data', 'missing', 'values', 'lookup', 'strings', 'starts', 'buffer', 'waste')
+    INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+    CODE_DTYPES = (np.int8, np.int16, np.int32)
+    BOUNDS = {np.dtype(dtype): (np.iinfo(dtype).min, np.iinfo(dtype).max) for dtype in INT_DTYPES}
+    # Строковый словарь переходит в буфер 'text', когда в нём не меньше TEXT_MIN_VALUES значений
+    # и уникальна хотя бы половина строк: тогда словарь только удваивает расход памяти
+    TEXT_MIN_VALUES = 4096
+    REPACK_WASTE = 1 << 20  # Байт перезаписанных строк, после которых буфер 'text' уплотняется
+
+    def __init__(self, capacity):
+        self.kind = 'empty'
+        self.data = np.zeros(capacity, dtype=np.int8)
+        self.missing = None
+        self.values = []
+        self.lookup = {}
+        self.strings = True  # В словаре пока только строки - его можно перевести в 'text'
+        self.starts = None
+        self.buffer = None
+        self.waste = 0  # Байт буфера, занятых уже перезаписанными строками
+
+    def grow(self, capacity):
+        self.data = self._resized(self.data, capacity, self._fill())
+        if self.missing is not None:
+            self.missing = self._resized(self.missing, capacity, True)
+        if self.starts is not None:
+            self.starts = self._resized(self.starts, capacity, 0)
+
+    @staticmethod
+    def _resized(array, capacity, fill):
+        resized = np.full(capacity, fill, dtype=array.dtype)
+        resized[:len(array)] = array[:capacity]
+        return resized
+
+    def _fill(self):
+        return {'int': 0, 'float': np.nan, 'category': -1, 'text': -1}.get(self.kind, 0)
+
+    @staticmethod
+    def _kind_of(value):
+        # bool - подкласс int, но хранится как категория, чтобы не превратиться в 0/1
+        if isinstance(value, (bool, np.bool_)):
+            return 'category'
+        if isinstance(value, (int, np.integer)):
+            return 'int' if -2**63 <= value < 2**63 else 'category'
+        if isinstance(value, (float, np.floating)):
+            return 'float'
+        return 'category'
+
+    def _widen(self, value, dtypes):
+        """Расширяет целый тип data, если value в него не помещается."""
+        low, high = self.BOUNDS[self.data.dtype]
+        if not low <= value <= high:
+            self.data = self.data.astype(_narrowest(dtypes, min(value, low), max(value, high)))
+
+    def set(self, row, value):
+        if value is None or (isinstance(value, (float, np.floating)) and np.isnan(value)):
+            self._set_missing(row)
+            return
+        if self.kind == 'text':
+            if isinstance(value, str):
+                self._set_text(row, value)
+                return
+            # Не строка в текстовом столбце - возвращаемся к словарю, в нём хранится что угодно
+            self._promote('category')
+        kind = self._kind_of(value)
+        if kind != self.kind:
+            self._promote(kind)
+        if self.kind == 'int':
+            self._widen(value, self.INT_DTYPES)
+            self.data[row] = value
+            self.missing[row] = False
+        elif self.kind == 'float':
+            self.data[row] = value
+        else:
+            code = self.lookup.get(value)
+            if code is None:
+                code = len(self.values)
+                self.values.append(value)
+                self.lookup[value] = code
+                self.strings = self.strings and isinstance(value, str)
+                self._widen(code, self.CODE_DTYPES)
+                self.data[row] = code
+                if self.strings and code >= self.TEXT_MIN_VALUES and 2 * code > row:
+                    self._to_text()
+                return
+            self.data[row] = code
+
+    def _set_missing(self, row):
+        if self.kind == 'int':
+            self.missing[row] = True
+        elif self.kind == 'float':
+            self.data[row] = np.nan
+        elif self.kind == 'category':
+            self.data[row] = -1
+        elif self.kind == 'text':
+            self.waste += max(int(self.data[row]), 0)
+            self.data[row] = -1
+
+    def _set_text(self, row, value):
+        encoded = value.encode()
+        start, old = int(self.starts[row]), int(self.data[row])
+        if len(encoded) <= old:
+            # Новое значение помещается на место старого
+            self.buffer[start:start + len(encoded)] = encoded
+            self.waste += old - len(encoded)
+        else:
+            self.waste += max(old, 0)
+            self.starts[row] = len(self.buffer)
+            self.buffer += encoded
+        self.data[row] = len(encoded)
+        if self.waste > max(len(self.buffer) // 2, self.REPACK_WASTE):
+            self._pack(self.starts, self.data)
+
+    def _to_text(self):
+        """Переводит строковый словарь в буфер UTF-8."""
+        encoded = [value.encode() for value in self.values]
+        lengths = np.array([len(item) for item in encoded] + [-1], dtype=np.int32)
+        offsets = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        # Код пропуска -1 попадает на последние элементы: длину -1 и смещение конца буфера
+        self.starts = offsets[self.data]
+        self.data = lengths[self.data]
+        self.buffer = bytearray(b''.join(encoded))
+        self.waste = 0
+        self.values, self.lookup, self.kind = [], {}, 'text'
+
+    def _pack(self, starts, lengths):
+        """Собирает новый буфер только из строк с данными смещениями и длинами."""
+        sizes = np.maximum(lengths, 0).astype(np.int64)
+        view = memoryview(self.buffer)
+        buffer = bytearray(b''.join(view[start:start + size]
+                                    for start, size in zip(starts.tolist(), sizes.tolist())))
+        view.release()
+        self.starts = np.zeros(len(sizes), dtype=np.int64)
+        np.cumsum(sizes[:-1], out=self.starts[1:])
+        self.buffer = buffer
+        self.waste = 0
+
+    def _promote(self, kind):
+        """Расширяет тип столбца: empty -> int -> float -> category; text -> category."""
+        order = ['empty', 'int', 'float', 'text', 'category']
+        if order.index(kind) < order.index(self.kind):
+            # Целые в дробном столбце хранятся как float, а в категориальном - как категории
+            return
+        capacity = len(self.data)
+        if self.kind == 'empty':
+            self.kind = kind
+            if kind == 'int':
+                self.data = np.zeros(capacity, dtype=np.int8)
+                self.missing = np.ones(capacity, dtype=bool)
+            elif kind == 'float':
+                self.data = np.full(capacity, np.nan)
+            else:
+                self.data = np.full(capacity, -1, dtype=np.int8)
+            return
+        if kind == 'float':
+            data = self.data.astype(np.float64)
+            data[self.missing] = np.nan
+            self.data, self.missing, self.kind = data, None, 'float'
+            return
+        # Перевод числового или текстового столбца в словарное кодирование
+        old = [self.get(row) for row in range(capacity)]
+        # Словарь, в который попадёт не строка, обратно в 'text' не переводится
+        self.strings = self.kind != 'text'
+        self.kind = 'category'
+        self.data = np.full(capacity, -1, dtype=np.int8)
+        self.missing = self.starts = self.buffer = None
+        for row, value in enumerate(old):
+            if value is not None:
+                self.set(row, value)
+
+    def get(self, row):
+        if self.kind == 'int':
+            return None if self.missing[row] else int(self.data[row])
+        if self.kind == 'float':
+            value = float(self.data[row])
+            return None if np.isnan(value) else value
+        if self.kind == 'category':
+            code = self.data[row]
+            return None if code < 0 else self.values[code]
+        if self.kind == 'text':
+            size = self.data[row]
+            if size < 0:
+                return None
+            start = self.starts[row]
+            return self.buffer[start:start + size].decode()
+        return None
+
+    def objects(self, rows):
+        """Значения строк rows массивом объектов (пропуск = None) для словаря и текста."""
+        if self.kind == 'category':
+            values = np.array(self.values + [None], dtype=object)
+            return values[self.data[rows]]
+        result = np.full(len(rows), None, dtype=object)
+        for n, (start, size) in enumerate(zip(self.starts[rows].tolist(), self.data[rows].tolist())):
+            if size >= 0:
+                result[n] = self.buffer[start:start + size].decode()
+        return result
+
+    def matches(self, value, size):
+        """Булева маска строк [0, size), в которых значение столбца равно value."""
+        if self.kind == 'category':
+            code = self.lookup.get(value) if self._hashable(value) else None
+            if code is None:
+                return np.zeros(size, dtype=bool)
+            return self.data[:size] == code
+        if self.kind == 'text':
+            if not isinstance(value, str):
+                return np.zeros(size, dtype=bool)
+            encoded = np.frombuffer(value.encode(), dtype=np.uint8)
+            mask = self.data[:size] == len(encoded)
+            rows = np.flatnonzero(mask)
+            if len(encoded) and len(rows):
+                # Сравниваем байты кандидатов нужной длины порциями, чтобы не раздувать память
+                buffer = np.frombuffer(self.buffer, dtype=np.uint8)
+                step = max(1, (1 << 22) // len(encoded))
+                offsets = np.arange(len(encoded))
+                for begin in range(0, len(rows), step):
+                    part = rows[begin:begin + step]
+                    mask[part] = (buffer[self.starts[part, None] + offsets] == encoded).all(axis=1)
+            return mask
+        if self.kind in ('int', 'float') and self._kind_of(value) in ('int', 'float'):
+            mask = self.data[:size] == value
+            if self.missing is not None:
+                mask &= ~self.missing[:size]
+            return mask
+        return np.zeros(size, dtype=bool)
+
+    @staticmethod
+    def _hashable(value):
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        return True
+
+    def take(self, rows):
+        """Оставляет только строки rows (уплотнение), удаляя неиспользуемые значения словаря и байты текста."""
+        self.data = self.data[rows]
+        if self.missing is not None:
+            self.missing = self.missing[rows]
+        if self.kind == 'text':
+            self._pack(self.starts[rows], self.data)
+        elif self.kind == 'category':
+            used = np.unique(self.data[self.data >= 0])
+            remap = np.full(len(self.values) + 1, -1, dtype=np.int32)
+            remap[used] = np.arange(len(used), dtype=np.int32)
+            # Код -1 попадает на последний элемент remap (-1)
+            self.data = remap[self.data].astype(_narrowest(self.CODE_DTYPES, -1, len(used)))
+            self.values = [self.values[code] for code in used]
+            self.lookup = {value: code for code, value in enumerate(self.values)}
+
+    def nbytes(self):
+        return (self.data.nbytes + (self.missing.nbytes if self.missing is not None else 0)
+                + (self.starts.nbytes + len(self.buffer) if self.kind == 'text' else 0))
+
+
+class ColumnarTable(MutableMapping):
+    """
+    Компактное колоночное хранилище записей с интерфейсом словаря ключ -> запись.
+
+    Значения каждого поля лежат в одном типизированном массиве NumPy вместо отдельного
+    dict на каждую запись. Удалённые строки помечаются в маске tombstone и физически
+    убираются при уплотнении. Запись собирается в dict только при обращении к ней,
+    поэтому изменять полученный dict бесполезно - изменённую запись нужно присвоить обратно.
+
+    Ключ отдельно не хранится: он собирается из ключевых полей key_fields строки, поэтому
+    присваиваемая запись должна содержать в этих полях значения своего ключа. Индекс ключей -
+    хеш-таблица с открытой адресацией на массивах: slots хранит номера строк, hashes - хеши
+    их ключей, так что на строку не приходится ни одного объекта Python.
+    """
+    INITIAL_CAPACITY = 1024
+    EMPTY = -1  # Свободный слот индекса
+    DELETED = -2  # Слот удалённого ключа: поиск идёт дальше, вставка может его занять
+
+    def __init__(self, key_fields):
+        self.key_fields = tuple(key_fields)
+        self.columns = {}  # поле -> _Column
+        self.capacity = self.INITIAL_CAPACITY
+        self.size = 0  # Занятых строк, включая удалённые
+        self.count = 0  # Живых записей
+        self.alive = np.zeros(self.capacity, dtype=bool)  # False - строка удалена (tombstone)
+        self.hashes = np.zeros(self.capacity, dtype=np.int64)
+        self.slots = np.full(2 * self.capacity, self.EMPTY, dtype=np.int32)  # Заполнены не больше чем наполовину
+
+    def _key(self, row):
+        return tuple(self.columns[field].get(row) for field in self.key_fields)
+
+    def _record(self, row):
+        return {field: column.get(row) for field, column in self.columns.items()}
+
+    def _rows(self):
+        return np.flatnonzero(self.alive[:self.size]).tolist()
+
+    def _find(self, key, key_hash):
+        """(слот, строка) ключа; если ключа нет - (слот для вставки, None)."""
+        mask = len(self.slots) - 1
+        slot = key_hash & mask
+        free = None
+        while True:
+            row = int(self.slots[slot])
+            if row == self.EMPTY:
+                return (slot if free is None else free), None
+            if row == self.DELETED:
+                if free is None:
+                    free = slot
+            elif self.hashes[row] == key_hash and self._key(row) == key:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, key):
+        row = self._find(key, hash(key))[1]
+        if row is None:
+            raise KeyError(key)
+        return self._record(row)
+
+    def __setitem__(self, key, record):
+        key_hash = hash(key)
+        slot, row = self._find(key, key_hash)
+        if row is None:
+            if self.size == self.capacity:
+                self._grow(self.capacity * 2)
+                slot = self._find(key, key_hash)[0]
+            row = self.size
+            self.size += 1
+            self.count += 1
+            self.slots[slot] = row
+            self.hashes[row] = key_hash
+            self.alive[row] = True
+        for field in record:
+            if field not in self.columns:
+                self.columns[field] = _Column(self.capacity)
+        for field, column in self.columns.items():
+            column.set(row, record.get(field))
+
+    def __delitem__(self, key):
+        slot, row = self._find(key, hash(key))
+        if row is None:
+            raise KeyError(key)
+        self.slots[slot] = self.DELETED
+        self.alive[row] = False
+        self.count -= 1
+        # Уплотняем, когда удалённых строк становится больше половины
+        if self.size > self.INITIAL_CAPACITY and self.count < self.size // 2:
+            self.compact()
+
+    def __contains__(self, key):
+        return self._find(key, hash(key))[1] is not None
+
+    def __iter__(self):
+        for row in self._rows():
+            yield self._key(row)
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        return _ColumnarItems(self)
+
+    def values(self):
+        return _ColumnarValues(self)
+
+    def clear(self):
+        self.__init__(self.key_fields)
+
+    def keys_where(self, field, value):
+        """Ключи записей, у которых поле field равно value (векторное сравнение столбца)."""
+        column = self.columns.get(field)
+        if column is None:
+            return []
+        mask = column.matches(value, self.size) & self.alive[:self.size]
+        return [self._key(row) for row in np.flatnonzero(mask).tolist()]
+
+    def compact(self):
+        """Физически удаляет строки, помеченные как удалённые."""
+        rows = np.flatnonzero(self.alive[:self.size])
+        for column in self.columns.values():
+            column.take(rows)
+        hashes = self.hashes[rows]
+        self.size = self.count = len(rows)
+        self.capacity = max(self.INITIAL_CAPACITY, self.size)
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.alive[:self.size] = True
+        self.hashes = np.zeros(self.capacity, dtype=np.int64)
+        self.hashes[:self.size] = hashes
+        for column in self.columns.values():
+            column.grow(self.capacity)
+        self._rehash()
+
+    def _grow(self, capacity):
+        for column in self.columns.values():
+            column.grow(capacity)
+        self.alive = _Column._resized(self.alive, capacity, False)
+        self.hashes = _Column._resized(self.hashes, capacity, 0)
+        self.capacity = capacity
+        self._rehash()
+
+    def _rehash(self):
+        """Заново раскладывает живые строки по индексу: слотов - степень двойки не меньше 2 * capacity."""
+        slots = [self.EMPTY] * (1 << (2 * self.capacity - 1).bit_length())
+        mask = len(slots) - 1
+        hashes = self.hashes.tolist()
+        for row in np.flatnonzero(self.alive[:self.size]).tolist():
+            slot = hashes[row] & mask
+            while slots[slot] != self.EMPTY:
+                slot = (slot + 1) & mask
+            slots[slot] = row
+        self.slots = np.array(slots, dtype=np.int32)
+
+    def to_dataframe(self, fields):
+        """DataFrame напрямую из столбцов, без промежуточных dict записей."""
+        rows = np.flatnonzero(self.alive[:self.size])
+        data = {}
+        for field in fields:
+            column = self.columns.get(field)
+            if column is None or column.kind == 'empty':
+                data[field] = [None] * len(rows)
+            elif column.kind in ('category', 'text'):
+                data[field] = column.objects(rows)
+            elif column.kind == 'int' and column.missing[rows].any():
+                values = column.data[rows].astype(object)
+                values[column.missing[rows]] = None
+                data[field] = values
+            elif column.kind == 'int':
+                data[field] = column.data[rows].astype(np.int64)
+            else:
+                data[field] = column.data[rows]
+        return pd.DataFrame(data, columns=fields)
+
+    def nbytes(self):
+        """Объём массивов столбцов, текстовых буферов и индекса (без словарей категорий)."""
+        return (sum(column.nbytes() for column in self.columns.values())
+                + self.alive.nbytes + self.hashes.nbytes + self.slots.nbytes)
+
+
+class _ColumnarItems(ItemsView):
+    """Пары (ключ, запись) ColumnarTable подряд по строкам, без повторного поиска ключа в индексе."""
+
+    def __iter__(self):
+        table = self._mapping
+        for row in table._rows():
+            yield table._key(row), table._record(row)
+
+
+class _ColumnarValues(ValuesView):
+    """Записи ColumnarTable подряд по строкам, без сборки и поиска ключей."""
+
+    def __iter__(self):
+        table = self._mapping
+        for row in table._rows():
+            yield table._record(row)
+
+
+def _json_default(value):
+    """Сериализация значений ячеек, которые json не умеет записывать сам."""
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'$time': value.isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+_JSON_DECODERS = {
+    '$datetime': datetime.datetime.fromisoformat,
+    '$date': datetime.date.fromisoformat,
+    '$time': datetime.time.fromisoformat,
+}
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag in _JSON_DECODERS:
+            return _JSON_DECODERS[tag](value)
+    return obj
+
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_json_object_hook)
+
+
+class BackupStore:
+    """
+    Инкрементные резервные копии с дедупликацией.
+
+    Записи базы делятся на чанки по границам, которые зависят только от ключей
+    (контентно-определяемое разбиение), поэтому добавление, правка или удаление
+    записи меняет лишь соседний чанк. Чанк сжимается zlib и хранится один раз
+    под именем своего SHA-256 в objects/. Точка восстановления - небольшой
+    JSON-манифест в snapshots/ со списком хешей чанков.
+    """
+    CHUNK_AVERAGE = 256  # Среднее число записей в чанке
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, 'objects')
+        self.snapshots_dir = os.path.join(directory, 'snapshots')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+
+    def _chunks(self, db, progress=None, cancel_event=None):
+        """Разбивает записи базы на чанки: выдаёт (хеш, данные чанка, ключи записей чанка)."""
+        header = _dumps(db.fields).encode('utf-8') + b'\n'
+        lines, keys = [], []
+        total = len(db.hash_table)
+        for done, (key, record) in enumerate(db.hash_table.items(), 1):
+            lines.append(_dumps([record.get(field) for field in db.fields]).encode('utf-8'))
+            keys.append(key)
+            if zlib.crc32(_dumps(list(key)).encode('utf-8')) % self.CHUNK_AVERAGE == 0:
+                yield self._chunk(header, lines, keys)
+                lines, keys = [], []
+            if done % PROGRESS_STEP == 0:
+                report_progress(progress, cancel_event, done, total)
+        if lines:
+            yield self._chunk(header, lines, keys)
+
+    @staticmethod
+    def _chunk(header, lines, keys):
+        # Заголовок с полями входит в хеш: одинаковые значения при других полях - другой чанк
+        data = header + b'\n'.join(lines)
+        return hashlib.sha256(data).hexdigest(), data, keys
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _write_object(self, digest, data):
+        """Записывает чанк, если его ещё нет в хранилище. Возвращает True для нового чанка."""
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data))
+        os.replace(tmp_path, path)
+        return True
+
+    def _read_object(self, digest):
+        """Читает чанк и возвращает (поля, список строк значений)."""
+        with open(self._object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        header, *lines = data.split(b'\n')
+        return _loads(header), [_loads(line) for line in lines]
+
+    def create(self, db, progress=None, cancel_event=None):
+        """Создаёт точку восстановления. Записываются только чанки, которых ещё нет в хранилище."""
+        digests = []
+        new_chunks = 0
+        for digest, data, _ in self._chunks(db, progress, cancel_event):
+            digests.append(digest)
+            new_chunks += self._write_object(digest, data)
+        created = datetime.datetime.now()
+        manifest = {
+            'id': created.strftime('%Y%m%d-%H%M%S-%f'),
+            'created': created.isoformat(timespec='seconds'),
+            'source': os.path.basename(db.filename),
+            'fields': db.fields,
+            'key_fields': db.key_fields,
+            'records': len(db.hash_table),
+            'chunks': digests,
+            'new_chunks': new_chunks,
+        }
+        path = os.path.join(self.snapshots_dir, f"{manifest['id']}.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(_dumps(manifest))
+        os.replace(f"{path}.tmp", path)
+        return manifest
+
+    def list(self):
+        """Список точек восстановления от старых к новым."""
+        manifests = []
+        for name in sorted(os.listdir(self.snapshots_dir)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.snapshots_dir, name), encoding='utf-8') as f:
+                    manifests.append(_loads(f.read()))
+        return manifests
+
+    def load(self, snapshot_id):
+        path = os.path.join(self.snapshots_dir, f"{snapshot_id}.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Точка восстановления не найдена: {snapshot_id}")
+        with open(path, encoding='utf-8') as f:
+            return _loads(f.read())
+
+    def restore(self, db, snapshot_id, progress=None, cancel_event=None):
+        """
+        Восстанавливает состояние базы на момент точки snapshot_id.
+        Текущее состояние разбивается на чанки тем же способом: совпадающие чанки
+        не трогаются, записи исчезнувших чанков удаляются, и читаются только чанки,
+        которых нет в текущем состоянии. Возвращает статистику восстановления.
+        """
+        manifest = self.load(snapshot_id)
+        if not set(db.key_fields).issubset(manifest['fields']):
+            raise ValueError("Ключевые поля базы отсутствуют в точке восстановления.")
+        target = set(manifest['chunks'])
+        current = {}
+        stale_keys = []
+        if db.fields == manifest['fields']:
+            for digest, _, keys in self._chunks(db):
+                if digest in target:
+                    current[digest] = keys
+                else:
+                    stale_keys.extend(keys)
+        else:
+            # Поля изменились - ни один чанк не совпадёт, восстанавливаем всё
+            stale_keys = list(db.hash_table)
+
+        # Сначала читаем недостающие чанки, и только потом меняем базу, чтобы отмена не оставила её наполовину восстановленной
+        records = []
+        missing = [digest for digest in manifest['chunks'] if digest not in current]
+        for done, digest in enumerate(missing, 1):
+            fields, rows = self._read_object(digest)
+            records.extend(dict(zip(fields, row)) for row in rows)
+            report_progress(progress, cancel_event, done, len(missing))
+
+        for key in stale_keys:
+            del db.hash_table[key]
+        db.fields = manifest['fields']
+        for record in records:
+            db.hash_table[db._generate_key(record)] = record
+        db.save()
+        return {'removed': len(stale_keys), 'added': len(records),
+                'chunks_read': len(missing), 'chunks_kept': len(current)}
+
+    def prune(self, keep):
+        """Оставляет keep последних точек восстановления и удаляет чанки, на которые они не ссылаются."""
+        manifests = self.list()
+        for manifest in manifests[:-keep] if keep else manifests:
+            os.remove(os.path.join(self.snapshots_dir, f"{manifest['id']}.json"))
+        referenced = {digest for manifest in self.list() for digest in manifest['chunks']}
+        removed = 0
+        for root, _, names in os.walk(self.objects_dir):
+            for name in names:
+                if name not in referenced:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+        return removed
+
+
+class Transaction:
+    """
+    Контекст группы изменений FileDatabase (см. FileDatabase.transaction).
+
+    Пока транзакция открыта, база запоминает в дельте состояние каждой затронутой записи
+    до первого изменения. При исключении дельта откатывается, при успешном выходе
+    становится одним шагом истории отмены, а changes - сводкой изменённых ключей.
+    """
+    def __init__(self, db):
+        self.db = db
+        self.nested = False
+        self.changes = {'added': [], 'removed': [], 'updated': []}
+
+    def __enter__(self):
+        if self.db._delta is not None:
+            # Вложенная транзакция становится частью внешней
+            self.nested = True
+        else:
+            self.db._delta = {}
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.nested:
+            return False
+        delta, self.db._delta = self.db._delta, None
+        if exc_type is not None:
+            self.db._apply_delta({key: (before, None) for key, before in delta.items()}, undo=True)
+            return False
+        self.changes = self.db._commit_delta(delta)
+        return False
+
 
 class FileDatabase:
-    def __init__(self, filename, key_fields):
+    LOCK_TIMEOUT = 30  # с, сколько ждать блокировку файла другим процессом
+    UNDO_HISTORY = 100  # Сколько последних операций можно отменить
+
+    def __init__(self, filename, key_fields, progress=None, cancel_event=None, storage='dict', access='rw'):
+        """
+        storage - способ хранения записей в памяти:
+            'dict' - словарь ключ -> dict записи
+            'columnar' - компактное колоночное хранилище ColumnarTable
+        access - режим совместного доступа нескольких процессов к файлу:
+            'rw' - чтение и запись; сохранение проверяет, что файл не изменили с момента загрузки
+            'r' - только чтение; изменения запрещены, свежие данные подхватывает reload_if_changed()
+            'w' - единственный писатель: пока база открыта, другой процесс не откроет её в режиме 'w'
+                  и не сохранит в режиме 'rw'
+        """
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Неизвестный режим хранения: {storage}")
+        if access not in ACCESS_MODES:
+            raise ValueError(f"Неизвестный режим доступа: {access}")
         self.filename = filename
         self.key_fields = key_fields
+        self.storage = storage
+        self.access = access
+        self.version = None  # Версия файла на момент последней загрузки или сохранения
+        self.writer_lock = None
+        if access == 'w':
+            try:
+                self.writer_lock = self._writer_lock().acquire()
+            except TimeoutError:
+                raise PermissionError(f"База данных {filename} уже открыта на запись другим процессом.")
         self.fields = []
-        self.hash_table = {}  # Хранение записей в хеш-таблице
-        self.load_or_create_db()
+        self.schema = {}  # поле -> тип из COLUMN_TYPES; не указанные поля считаются строковыми
+        self.hash_table = self._new_table()  # Хранение записей в хеш-таблице
+        self._delta = None  # ключ -> запись до изменения в открытой транзакции (None - записи не было)
+        self.undo_stack = deque(maxlen=self.UNDO_HISTORY)
+        self.redo_stack = []
+        try:
+            self.load_or_create_db(progress, cancel_event)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        """Освобождает блокировку единственного писателя."""
+        if self.writer_lock is not None:
+            self.writer_lock.release()
+            self.writer_lock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _lock(self, shared=False):
+        return FileLock(f"{self.filename}.lock", shared=shared, timeout=self.LOCK_TIMEOUT)
+
+    def _writer_lock(self):
+        return FileLock(f"{self.filename}.writer.lock", timeout=0)
+
+    def _exclusive_write(self):
+        """
+        Блокировка единственного писателя на время записи файла: в режиме 'w' она уже захвачена,
+        в режиме 'rw' запись невозможна, пока базу держит процесс в режиме 'w'.
+        """
+        if self.writer_lock is not None:
+            return contextlib.nullcontext()
+        try:
+            return self._writer_lock().acquire()
+        except TimeoutError:
+            raise PermissionError(f"База данных {self.filename} открыта на запись другим процессом.")
+
+    def _check_writable(self):
+        if self.access == 'r':
+            raise PermissionError("База данных открыта только для чтения.")
 
-    def load_or_create_db(self):
-        """Загрузка базы данных из файла или создание новой."""
+    def delete(self):
+        """Удаляет файл базы вместе с файлом схемы и файлами блокировок и закрывает базу."""
+        self._check_writable()
+        with self._exclusive_write(), self._lock():
+            os.remove(self.filename)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(schema_filename(self.filename))
+        self.close()
+        for path in (f"{self.filename}.lock", f"{self.filename}.writer.lock"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    def reload_if_changed(self, progress=None, cancel_event=None):
+        """Перечитывает базу, если файл сохранил другой процесс. Возвращает True при перезагрузке."""
+        if file_version(self.filename) == self.version:
+            return False
+        self.load_or_create_db(progress, cancel_event)
+        return True
+
+    def _new_table(self):
+        return ColumnarTable(self.key_fields) if self.storage == 'columnar' else {}
+
+    def load_or_create_db(self, progress=None, cancel_event=None):
+        """
+        Загрузка базы данных из файла или создание новой.
+        Строки читаются потоково; progress(done, total) получает прогресс,
+        установленный cancel_event прерывает загрузку с JobCancelled.
+        """
         if os.path.exists(self.filename):
             try:
-                df = pd.read_excel(self.filename, engine='openpyxl')
-                self.fields = df.columns.tolist()
-                if not set(self.key_fields).issubset(self.fields):
-                    raise ValueError("Ключевые поля отсутствуют в заголовках базы данных.")
-                # Загрузка данных в хеш-таблицу
-                for _, row in df.iterrows():
-                    key = self._generate_key(row)
-                    self.hash_table[key] = row.to_dict()
+                # Разделяемая блокировка: читатели не мешают друг другу, но не увидят файл посреди записи
+                with self._lock(shared=True):
+                    version = file_version(self.filename)
+                    chunks = iter_row_chunks(self.filename, PROGRESS_STEP)
+                    fields, total = next(chunks)
+                    if not set(self.key_fields).issubset(fields):
+                        chunks.close()
+                        raise ValueError("Ключевые поля отсутствуют в заголовках базы данных.")
+                    # Типы из файла схемы приводятся при чтении, остальные выводятся по значениям
+                    declared = read_schema(self.filename) or {}
+                    schema = {field: declared[field] for field in fields if field in declared}
+                    typed = list(schema.items())
+                    kinds = {field: set() for field in fields if field not in schema}
+                    # Загрузка данных в хеш-таблицу
+                    hash_table = self._new_table()
+                    done = 0
+                    for chunk in chunks:
+                        for row in chunk:
+                            if all(value is None for value in row):
+                                continue
+                            # read_only не возвращает пустые ячейки в конце строки - дополняем до всех полей
+                            record = dict.fromkeys(fields)
+                            record.update(zip(fields, row))
+                            self._coerce_fields(record, typed)
+                            for field, field_kinds in kinds.items():
+                                field_kinds.add(value_kind(record[field]))
+                            hash_table[self._generate_key(record)] = record
+                        done += len(chunk)
+                        report_progress(progress, cancel_event, done, total)
+                for field, field_kinds in kinds.items():
+                    schema[field] = infer_column_type(field_kinds)
+                # Столбцы со смешанными значениями (например, 42 и '42') приводятся к строкам
+                mixed = [(field, 'str') for field, field_kinds in kinds.items()
+                         if schema[field] == 'str' and field_kinds - {None, 'str'}]
+                if mixed:
+                    retyped = self._new_table()
+                    for record in hash_table.values():
+                        self._coerce_fields(record, mixed)
+                        retyped[self._generate_key(record)] = record
+                    hash_table = retyped
+                self.fields = fields
+                self.schema = schema
+                self.hash_table = hash_table
+                self.version = version
+                self._reset_history()
+            except JobCancelled:
+                raise
             except Exception as e:
                 raise ValueError(f"Не удалось загрузить базу данных: {e}")
         else:
             self.fields = self.key_fields.copy()
-            self.hash_table = {}
-
-    def save(self):
-        """Сохранение базы данных в файл."""
-        df = self.to_dataframe()
+            self.schema = {}
+            self.hash_table = self._new_table()
+            self.version = None
+            self._reset_history()
+
+    def save(self, progress=None, cancel_event=None, force=False):
+        """
+        Сохранение базы данных в файл. Записи пишутся потоково, без промежуточного DataFrame.
+        Если файл после загрузки сохранил другой процесс, выбрасывается ConcurrentModificationError,
+        чтобы не затереть чужие изменения; force=True сохраняет поверх них.
+        """
+        self._check_writable()
+        with self._exclusive_write():
+            self._save(progress, cancel_event, force)
+
+    def _save(self, progress, cancel_event, force):
         try:
-            df.to_excel(self.filename, index=False, engine='openpyxl')
+            with self._lock():
+                if not force and file_version(self.filename) != self.version:
+                    raise ConcurrentModificationError(
+                        f"Файл {self.filename} изменён другим процессом после загрузки. "
+                        "Перезагрузите базу или сохраните принудительно.")
+                write_records(self.filename, self.fields, self.hash_table.values(),
+                              len(self.hash_table), progress, cancel_event, self.schema)
+                write_schema(self.filename, {field: self.column_type(field) for field in self.fields})
+                self.version = file_version(self.filename)
+        except (JobCancelled, ConcurrentModificationError, TimeoutError):
+            raise
         except PermissionError:
             raise PermissionError(f"Ошибка доступа: невозможно сохранить файл {self.filename}.")
         except Exception as e:
@@ -48,69 +1280,270 @@ class FileDatabase:
         """Преобразует данные из хеш-таблицы в pandas DataFrame."""
         if not self.hash_table:
             return pd.DataFrame(columns=self.fields)
+        if isinstance(self.hash_table, ColumnarTable):
+            return self.hash_table.to_dataframe(self.fields)
         return pd.DataFrame(self.hash_table.values())
 
+    def _keys_where(self, field, value):
+        """Ключи записей, у которых поле равно значению (значение приводится к типу поля)."""
+        try:
+            value = coerce_value(value, self.column_type(field))
+        except ValueError:
+            return []  # Значение другого типа не может совпасть ни с одной записью
+        if isinstance(self.hash_table, ColumnarTable):
+            return self.hash_table.keys_where(field, value)
+        return [key for key, record in self.hash_table.items() if record.get(field) == value]
+
+    def iter_records(self, field=None, value=None, predicate=None):
+        """Потоково перебирает записи, отбирая по равенству поля значению и/или предикату."""
+        if field is not None:
+            records = map(self.hash_table.__getitem__, self._keys_where(field, value))
+        else:
+            records = self.hash_table.values()
+        for record in records:
+            if predicate is not None and not predicate(record):
+                continue
+            yield record
 
     def _generate_key(self, record):
-        """Генерирует уникальный ключ на основе ключевых полей."""
+        """Генерирует уникальный ключ на основе ключевых полей (запись уже приведена к схеме)."""
         return tuple(record[field] for field in self.key_fields)
 
+    def column_type(self, field):
+        return self.schema.get(field, 'str')
+
+    @staticmethod
+    def _coerce_fields(record, typed):
+        """Приводит поля записи к типам [(поле, тип), ...] на месте."""
+        for field, column_type in typed:
+            try:
+                record[field] = coerce_value(record[field], column_type)
+            except ValueError as e:
+                raise ValueError(f"Поле '{field}': {e}")
+
+    def _coerce_record(self, record):
+        """Новая запись со всеми полями базы, приведёнными к схеме."""
+        coerced = dict.fromkeys(self.fields)
+        coerced.update(record)
+        self._coerce_fields(coerced, [(field, self.column_type(field)) for field in coerced])
+        return coerced
+
+    def _coerce_key(self, key_values):
+        """Канонический ключ из значений ключевых полей, например введённых в GUI."""
+        key_values = tuple(key_values)
+        if len(key_values) != len(self.key_fields):
+            raise ValueError(f"Ключ должен состоять из {len(self.key_fields)} значений.")
+        record = dict(zip(self.key_fields, key_values))
+        self._coerce_fields(record, [(field, self.column_type(field)) for field in self.key_fields])
+        return self._generate_key(record)
+
+    def set_field_type(self, field, column_type):
+        """
+        Задаёт тип столбца и приводит к нему все значения. Если какое-то значение привести нельзя
+        или после приведения совпадут ключи записей, база не изменяется.
+        """
+        self._check_writable()
+        if column_type not in COLUMN_TYPES:
+            raise ValueError(f"Неизвестный тип столбца: {column_type}")
+        if field not in self.fields:
+            raise ValueError(f"Поле '{field}' отсутствует в базе данных.")
+        changed = []
+        for key, record in self.hash_table.items():
+            value = record.get(field)
+            try:
+                new_value = coerce_value(value, column_type)
+            except ValueError as e:
+                raise ValueError(f"Не удалось привести поле '{field}' записи {key}: {e}")
+            if type(new_value) is not type(value) or new_value != value:
+                changed.append((key, {**record, field: new_value}))
+        if field in self.key_fields:
+            keys = set(self.hash_table.keys())
+            for key, record in changed:
+                keys.discard(key)
+            for key, record in changed:
+                new_key = self._generate_key(record)
+                if new_key in keys:
+                    raise ValueError(f"После приведения поля '{field}' совпадут ключи записей: {new_key}")
+                keys.add(new_key)
+            for key, record in changed:
+                del self.hash_table[key]
+        for key, record in changed:
+            self.hash_table[self._generate_key(record)] = record
+        self.schema[field] = column_type
+        # Дельты истории хранят значения старого типа
+        self._reset_history()
+
+    def transaction(self):
+        """
+        Группа изменений как одна операция:
+
+            with db.transaction() as tx:
+                db.add_record(...)
+                db.delete_records(...)
+            gui.refresh_rows(...)  # по tx.changes
+
+        Исключение внутри блока откатывает все изменения группы. Транзакция - один шаг
+        undo(); в истории хранятся только изменённые записи, а не копия всей таблицы.
+        """
+        self._check_writable()
+        return Transaction(self)
+
+    def _remember(self, key):
+        """Запоминает запись до её первого изменения в открытой транзакции."""
+        if key not in self._delta:
+            self._delta[key] = self.hash_table.get(key)
+
+    def _put(self, key, record):
+        self._remember(key)
+        self.hash_table[key] = record
+
+    def _remove(self, key):
+        self._remember(key)
+        del self.hash_table[key]
+
+    def _commit_delta(self, delta):
+        """Превращает дельту транзакции в шаг истории {ключ: (до, после)}."""
+        step = {}
+        for key, before in delta.items():
+            after = self.hash_table.get(key)
+            if before != after:
+                step[key] = (before, after)
+        if step:
+            self.undo_stack.append(step)
+            self.redo_stack.clear()
+        return self._step_changes(step, undo=False)
+
+    def _apply_delta(self, delta, undo):
+        """Возвращает записи к состоянию до (undo=True) или после шага истории."""
+        for key, (before, after) in delta.items():
+            record = before if undo else after
+            if record is None:
+                self.hash_table.pop(key, None)
+            else:
+                self.hash_table[key] = record
+
+    @staticmethod
+    def _step_changes(step, undo):
+        changes = {'added': [], 'removed': [], 'updated': []}
+        for key, (before, after) in step.items():
+            if undo:
+                before, after = after, before
+            if before is None:
+                changes['added'].append(key)
+            elif after is None:
+                changes['removed'].append(key)
+            else:
+                changes['updated'].append(key)
+        return changes
+
+    def undo(self):
+        """Отменяет последнюю операцию или транзакцию. Возвращает сводку изменённых ключей."""
+        self._check_writable()
+        if not self.undo_stack:
+            raise ValueError("Нет операций для отмены.")
+        step = self.undo_stack.pop()
+        self._apply_delta(step, undo=True)
+        self.redo_stack.append(step)
+        return self._step_changes(step, undo=True)
+
+    def redo(self):
+        """Повторяет последнюю отменённую операцию. Возвращает сводку изменённых ключей."""
+        self._check_writable()
+        if not self.redo_stack:
+            raise ValueError("Нет операций для повтора.")
+        step = self.redo_stack.pop()
+        self._apply_delta(step, undo=False)
+        self.undo_stack.append(step)
+        return self._step_changes(step, undo=False)
+
+    def _reset_history(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
     def add_record(self, record):
-        """Добавление новой записи."""
+        """Добавление новой записи. Возвращает ключ записи."""
+        self._check_writable()
+        record = self._coerce_record(record)
         key = self._generate_key(record)
         if key in self.hash_table:
             raise ValueError("Запись с таким ключом уже существует.")
-        self.hash_table[key] = record
+        with self.transaction():
+            self._put(key, record)
+        return key
 
     def search_records(self, key_values):
         """Поиск записи по ключу."""
-        key = tuple(key_values)
+        try:
+            key = self._coerce_key(key_values)
+        except ValueError:
+            raise ValueError("Запись с таким ключом не найдена.")
         if key in self.hash_table:
             return self.hash_table[key]
         raise ValueError("Запись с таким ключом не найдена.")
 
     def delete_records(self, field=None, value=None, key_values=None):
-        """Удаление записи по ключу или по полю и значению."""
+        """Удаление записи по ключу или по полю и значению. Возвращает список удалённых ключей."""
+        self._check_writable()
         if key_values:
             # Удаление по ключу
-            key = tuple(key_values)
+            try:
+                key = self._coerce_key(key_values)
+            except ValueError:
+                raise ValueError("Запись с таким ключом не найдена.")
             if key in self.hash_table:
-                del self.hash_table[key]
+                with self.transaction():
+                    self._remove(key)
+                return [key]
             else:
                 raise ValueError("Запись с таким ключом не найдена.")
         elif field and value:
             # Удаление по полю и значению
-            to_delete = [key for key, record in self.hash_table.items() if record.get(field) == value]
+            to_delete = self._keys_where(field, value)
             if not to_delete:
                 raise ValueError(f"Нет записей для удаления по значению '{value}' в поле '{field}'.")
-            for key in to_delete:
-                del self.hash_table[key]
+            with self.transaction():
+                for key in to_delete:
+                    self._remove(key)
+            return to_delete
         else:
             raise ValueError("Недостаточно аргументов для удаления.")
 
 
     def edit_record(self, key_values, new_record):
-        """Редактирование существующей записи."""
-        key = tuple(key_values)
+        """Редактирование существующей записи. Возвращает новый ключ записи."""
+        self._check_writable()
+        try:
+            key = self._coerce_key(key_values)
+        except ValueError:
+            raise ValueError("Запись для редактирования не найдена.")
         if key not in self.hash_table:
             raise ValueError("Запись для редактирования не найдена.")
+        new_record = self._coerce_record(new_record)
         # Удаляем старую запись, если ключ изменяется
-        old_record = self.hash_table[key]
         new_key = self._generate_key(new_record)
         if new_key != key and new_key in self.hash_table:
             raise ValueError("Запись с новым ключом уже существует.")
-        del self.hash_table[key]
-        self.hash_table[new_key] = new_record
+        with self.transaction():
+            self._remove(key)
+            self._put(new_key, new_record)
+        return new_key
     
     def clear_database(self):
-        """Очистка базы данных."""
-        self.hash_table.clear()
-        self.save()
+        """Очистка базы данных. Отменяется через undo() как одна операция."""
+        self._check_writable()
+        with self.transaction():
+            for key in list(self.hash_table.keys()):
+                self._remember(key)
+            self.hash_table.clear()
+            self.save()
     
     def backup(self, backup_filename):
         """Создание backup-файла БД."""
         try:
-            shutil.copyfile(self.filename, backup_filename)
+            with self._lock(shared=True):
+                shutil.copyfile(self.filename, backup_filename)
+                if os.path.exists(schema_filename(self.filename)):
+                    shutil.copyfile(schema_filename(self.filename), schema_filename(backup_filename))
         except Exception as e:
             raise Exception(f"Не удалось создать backup: {e}")
 
@@ -118,43 +1551,695 @@ class FileDatabase:
         """Восстановление БД из backup-файла."""
         if not os.path.exists(backup_filename):
             raise FileNotFoundError(f"Файл backup не найден: {backup_filename}")
+        self._check_writable()
         try:
-            shutil.copyfile(backup_filename, self.filename)
+            with self._exclusive_write(), self._lock():
+                shutil.copyfile(backup_filename, self.filename)
+                if os.path.exists(schema_filename(backup_filename)):
+                    shutil.copyfile(schema_filename(backup_filename), schema_filename(self.filename))
             self.load_or_create_db()
         except Exception as e:
             raise Exception(f"Не удалось восстановить базу данных из backup: {e}")
+
+    def backup_store(self, directory=None):
+        """Хранилище инкрементных backup-ов, по умолчанию - каталог <файл БД>.backups рядом с базой."""
+        return BackupStore(directory or f"{self.filename}.backups")
+
+    def incremental_backup(self, directory=None, progress=None, cancel_event=None):
+        """Инкрементный backup: сохраняются только изменившиеся чанки записей."""
+        try:
+            return self.backup_store(directory).create(self, progress, cancel_event)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Не удалось создать backup: {e}")
+
+    def list_restore_points(self, directory=None):
+        return self.backup_store(directory).list()
+
+    def restore_point(self, snapshot_id, directory=None, progress=None, cancel_event=None):
+        """Восстановление на момент точки snapshot_id с чтением только изменившихся чанков."""
+        self._check_writable()
+        try:
+            summary = self.backup_store(directory).restore(self, snapshot_id, progress, cancel_event)
+            self._reset_history()
+            return summary
+        except JobCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Не удалось восстановить базу данных из backup: {e}")
     
-    def import_from_xlsx(self, import_filename):
-        """Импорт данных из файла XLSX в базу данных."""
+    def import_from_xlsx(self, import_filename, on_conflict='skip', chunk_size=IMPORT_CHUNK_SIZE,
+                         progress=None, cancel_event=None):
+        """
+        Потоковый импорт данных из файла XLSX или CSV чанками по chunk_size строк.
+        on_conflict - что делать, если ключ уже есть в базе (или повторяется в самом файле):
+            'skip' - оставить существующую запись
+            'overwrite' - заменить запись целиком
+            'merge' - дополнить существующую запись непустыми значениями из файла
+        Столбцы, которых нет в базе, игнорируются, значения приводятся к схеме базы.
+        При отмене или ошибке (например, значении не того типа) все изменения откатываются.
+        Возвращает словарь с количеством записей: {'inserted': ..., 'updated': ..., 'skipped': ...}.
+        """
+        self._check_writable()
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(f"Неизвестная политика конфликтов: {on_conflict}")
         if not os.path.exists(import_filename):
             raise FileNotFoundError(f"Файл для импорта не найден: {import_filename}")
+        summary = {'inserted': 0, 'updated': 0, 'skipped': 0}
         try:
-            df_import = pd.read_excel(import_filename, engine='openpyxl')
-            for _, row in df_import.iterrows():
-                record = row.to_dict()
-                try:
-                    self.add_record(record)
-                except ValueError:
-                    # Если запись с таким ключом уже существует, можно обновить или пропустить
-                    pass  # Здесь пропускаем дубликаты
-            self.save()
+            chunks = iter_row_chunks(import_filename, chunk_size)
+            import_fields, total = next(chunks)
+            missing = [field for field in self.key_fields if field not in import_fields]
+            if missing:
+                chunks.close()
+                raise ValueError(f"В файле импорта нет ключевых полей: {', '.join(map(str, missing))}")
+            columns = [(i, field) for i, field in enumerate(import_fields) if field in self.fields]
+            typed = [(field, self.column_type(field)) for field in self.fields]
+            done = 0
+            # Весь импорт - одна транзакция: откатывается целиком и отменяется одним undo()
+            with self.transaction():
+                for chunk in chunks:
+                    for row_number, row in enumerate(chunk, done + 2):
+                        if all(value is None for value in row):
+                            continue
+                        # read_only не возвращает пустые ячейки в конце строки - такие поля остаются None
+                        record = dict.fromkeys(self.fields)
+                        record.update((field, row[i]) for i, field in columns if i < len(row))
+                        try:
+                            self._coerce_fields(record, typed)
+                        except ValueError as e:
+                            raise ValueError(f"строка {row_number}: {e}")
+                        key = self._generate_key(record)
+                        existing = self.hash_table.get(key)
+                        if existing is None:
+                            summary['inserted'] += 1
+                        elif on_conflict == 'skip':
+                            summary['skipped'] += 1
+                            continue
+                        else:
+                            if on_conflict == 'merge':
+                                record = {**existing, **{field: value for field, value in record.items()
+                                                         if not is_empty_value(value)}}
+                            summary['updated'] += 1
+                        self._put(key, record)
+                    done += len(chunk)
+                    report_progress(progress, cancel_event, done, total)
+                self.save()
+            return summary
+        except JobCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Не удалось импортировать данные: {e}")
+
+    def export_to_xlsx(self, export_filename, records=None, progress=None, cancel_event=None):
+        """
+        Потоковый экспорт в XLSX, CSV или Parquet (формат определяется по расширению).
+        records - экспортируемое подмножество, например db.iter_records(field, value);
+        по умолчанию экспортируется вся база. Возвращает количество записанных строк.
+        """
+        total = None
+        if records is None:
+            records = self.hash_table.values()
+            total = len(self.hash_table)
+        try:
+            return write_records(export_filename, self.fields, records, total, progress, cancel_event,
+                                 {field: self.column_type(field) for field in self.fields})
+        except JobCancelled:
+            raise
         except Exception as e:
-            raise Exception(f"Не удалось импортировать данные из XLSX: {e}")
+            raise Exception(f"Не удалось экспортировать данные: {e}")
+
+class DatabaseServer:
+    """
+    Локальный сервер базы: один процесс держит загруженную базу, а несколько GUI
+    и скриптов работают с ней через RemoteDatabase без перезагрузки файла.
+
+    Изменения записываются в журнал с последовательными номерами, и клиенты
+    забирают только то, что изменилось с их последней синхронизации (changes_since).
+    Соединения защищены authkey модуля multiprocessing.connection.
+    """
+    CHANGELOG_SIZE = 100000
+    EXPOSED = ('snapshot', 'changes_since', 'search_records', 'add_record', 'edit_record', 'delete_records',
+               'import_from_xlsx', 'clear_database', 'restore_point', 'set_field_type', 'save',
+               'incremental_backup', 'list_restore_points')
+
+    def __init__(self, db, address, authkey):
+        self.db = db
+        self.lock = threading.RLock()
+        self.seq = 0  # Номер последнего изменения
+        self.changes = deque(maxlen=self.CHANGELOG_SIZE)  # (номер, операция, ключ, запись)
+        self.log_start = 0  # Изменения с номерами <= log_start в журнале уже не хранятся
+        self.listener = Listener(address, authkey=authkey)
+        self.running = False
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def serve_forever(self):
+        self.running = True
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                if not self.running:
+                    break
+                continue  # Например, клиент с неверным authkey
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def shutdown(self):
+        """
+        Останавливает сервер и сохраняет базу. Если файл тем временем сохранил другой процесс,
+        изменения сервера записываются в копию <база>.conflict-<время><расширение>, а конфликт
+        сообщается ConcurrentModificationError. Блокировка писателя освобождается в любом случае.
+        """
+        self.running = False
+        self.listener.close()
+        with self.lock:
+            try:
+                self.db.save()
+            except ConcurrentModificationError as e:
+                root, extension = os.path.splitext(self.db.filename)
+                conflict_copy = f"{root}.conflict-{time.strftime('%Y%m%d-%H%M%S')}{extension}"
+                self.db.export_to_xlsx(conflict_copy)
+                raise ConcurrentModificationError(f"{e} Изменения сервера сохранены в {conflict_copy}.")
+            finally:
+                self.db.close()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    name, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if name not in self.EXPOSED:
+                    conn.send(('error', AttributeError(f"Неизвестная операция: {name}")))
+                    continue
+                try:
+                    with self.lock:
+                        result = getattr(self, name)(*args, **kwargs)
+                    conn.send(('ok', result))
+                except Exception as e:
+                    conn.send(('error', e))
+
+    def _log(self, operation, key, record=None):
+        self.seq += 1
+        if len(self.changes) == self.changes.maxlen:
+            self.log_start = self.changes[0][0]
+        self.changes.append((self.seq, operation, key, record))
+
+    def _mutation(self, apply):
+        """Выполняет изменение и возвращает (результат, номер до, номер после) для синхронизации клиента."""
+        before = self.seq
+        result = apply()
+        return result, before, self.seq
+
+    def _bulk_mutation(self, apply):
+        """Массовое изменение: журнал сбрасывается, и клиенты с более старым номером перечитают базу целиком."""
+        def apply_and_reset():
+            result = apply()
+            self.seq += 1
+            self.changes.clear()
+            self.log_start = self.seq
+            return result
+        return self._mutation(apply_and_reset)
+
+    def snapshot(self):
+        return self.seq, self.db.fields, self.db.key_fields, self.db.schema, list(self.db.hash_table.items())
+
+    def changes_since(self, seq):
+        """Изменения после номера seq или None, если журнал их уже не хранит."""
+        if seq < self.log_start:
+            return self.seq, None
+        return self.seq, [change[1:] for change in self.changes if change[0] > seq]
+
+    def search_records(self, key_values):
+        return self.db.search_records(key_values)
+
+    def add_record(self, record):
+        def apply():
+            key = self.db.add_record(record)
+            self._log('put', key, self.db.hash_table[key])
+            return key
+        return self._mutation(apply)
+
+    def edit_record(self, key_values, new_record):
+        def apply():
+            key = self.db._coerce_key(key_values)
+            new_key = self.db.edit_record(key_values, new_record)
+            if new_key != key:
+                self._log('del', key)
+            self._log('put', new_key, self.db.hash_table[new_key])
+            return new_key
+        return self._mutation(apply)
+
+    def delete_records(self, **kwargs):
+        def apply():
+            keys = self.db.delete_records(**kwargs)
+            for key in keys:
+                self._log('del', key)
+            return keys
+        return self._mutation(apply)
+
+    def import_from_xlsx(self, import_filename, on_conflict='skip', chunk_size=IMPORT_CHUNK_SIZE):
+        return self._bulk_mutation(lambda: self.db.import_from_xlsx(import_filename, on_conflict, chunk_size))
+
+    def clear_database(self):
+        return self._bulk_mutation(self.db.clear_database)
+
+    def restore_point(self, snapshot_id):
+        return self._bulk_mutation(lambda: self.db.restore_point(snapshot_id))
+
+    def set_field_type(self, field, column_type):
+        return self._bulk_mutation(lambda: self.db.set_field_type(field, column_type))
+
+    def save(self):
+        self.db.save()
+
+    def incremental_backup(self):
+        return self.db.incremental_backup()
+
+    def list_restore_points(self):
+        return self.db.list_restore_points()
+
+
+class RemoteDatabase(FileDatabase):
+    """
+    Клиент DatabaseServer с тем же интерфейсом, что и FileDatabase.
+    Чтение идёт из локальной копии записей, изменения отправляются на сервер и сразу
+    применяются к копии; изменения других клиентов подтягивает sync().
+    """
+    def __init__(self, address, authkey, storage='dict'):
+        self.address = address
+        self.conn = Client(address, authkey=authkey)
+        self.conn_lock = threading.Lock()
+        self.seq = 0
+        super().__init__(f"{address[0]}:{address[1]}", [], storage=storage)
+
+    def _call(self, name, *args, **kwargs):
+        with self.conn_lock:
+            self.conn.send((name, args, kwargs))
+            status, result = self.conn.recv()
+        if status == 'error':
+            raise result
+        return result
+
+    def _mutate(self, name, *args, **kwargs):
+        result, before, after = self._call(name, *args, **kwargs)
+        if self.seq == before:
+            # Между нашей прошлой синхронизацией и этим изменением других изменений не было
+            self.seq = after
+        return result
+
+    def close(self):
+        self.conn.close()
+
+    def load_or_create_db(self, progress=None, cancel_event=None):
+        self.seq, self.fields, self.key_fields, self.schema, items = self._call('snapshot')
+        hash_table = self._new_table()
+        for done, (key, record) in enumerate(items, 1):
+            hash_table[key] = record
+            if done % PROGRESS_STEP == 0:
+                report_progress(progress, cancel_event, done, len(items))
+        self.hash_table = hash_table
+
+    def sync(self):
+        """Применяет изменения других клиентов. Возвращает True, если данные изменились."""
+        seq, changes = self._call('changes_since', self.seq)
+        if changes is None:
+            self.load_or_create_db()
+            return True
+        for operation, key, record in changes:
+            # Операции идемпотентны, поэтому повтор собственных изменений безопасен
+            if operation == 'put':
+                self.hash_table[key] = record
+            else:
+                self.hash_table.pop(key, None)
+        self.seq = seq
+        return bool(changes)
+
+    def reload_if_changed(self, progress=None, cancel_event=None):
+        return self.sync()
+
+    def save(self, progress=None, cancel_event=None, force=False):
+        self._call('save')
+
+    def add_record(self, record):
+        record = self._coerce_record(record)
+        key = self._mutate('add_record', record)
+        self.hash_table[key] = record
+        return key
+
+    def edit_record(self, key_values, new_record):
+        new_record = self._coerce_record(new_record)
+        new_key = self._mutate('edit_record', key_values, new_record)
+        self.hash_table.pop(self._coerce_key(key_values), None)
+        self.hash_table[new_key] = new_record
+        return new_key
+
+    def delete_records(self, field=None, value=None, key_values=None):
+        keys = self._mutate('delete_records', field=field, value=value, key_values=key_values)
+        for key in keys:
+            self.hash_table.pop(key, None)
+        return keys
+
+    def _bulk(self, name, *args, **kwargs):
+        result = self._mutate(name, *args, **kwargs)
+        self.load_or_create_db()
+        return result
+
+    def clear_database(self):
+        self._bulk('clear_database')
+
+    def import_from_xlsx(self, import_filename, on_conflict='skip', chunk_size=IMPORT_CHUNK_SIZE,
+                         progress=None, cancel_event=None):
+        """Импорт выполняет сервер, поэтому путь к файлу должен быть доступен его процессу."""
+        return self._bulk('import_from_xlsx', os.path.abspath(import_filename), on_conflict, chunk_size)
+
+    def incremental_backup(self, directory=None, progress=None, cancel_event=None):
+        return self._call('incremental_backup')
+
+    def list_restore_points(self, directory=None):
+        return self._call('list_restore_points')
+
+    def restore_point(self, snapshot_id, directory=None, progress=None, cancel_event=None):
+        return self._bulk('restore_point', snapshot_id)
+
+    def set_field_type(self, field, column_type):
+        return self._bulk('set_field_type', field, column_type)
+
+    def transaction(self):
+        raise PermissionError("Транзакции и отмена изменений недоступны при работе через сервер.")
+
+    def undo(self):
+        raise PermissionError("Транзакции и отмена изменений недоступны при работе через сервер.")
+
+    def redo(self):
+        raise PermissionError("Транзакции и отмена изменений недоступны при работе через сервер.")
+
+    def backup(self, backup_filename):
+        raise PermissionError("Полный backup файла выполняется на стороне сервера.")
+
+    def restore(self, backup_filename):
+        raise PermissionError("Восстановление из файла выполняется на стороне сервера.")
+
+
+class VirtualTreeview:
+    """
+    Виртуализированная таблица на основе ttk.Treeview.
+
+    В Treeview материализуются только строки видимого окна, остальные записи
+    существуют лишь в индексе ключей. Прокрутка сдвигает окно по индексу,
+    а изменения после добавления, редактирования и удаления применяются точечно.
+    """
+    DEFAULT_ROW_HEIGHT = 20
+    HEADER_HEIGHT = 25
+
+    def __init__(self, master):
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, show='headings', selectmode='browse')
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.fields = []
+        self.keys = []  # Индекс ключей в порядке отображения
+        self.get_record = None
+        self.offset = 0  # Позиция первой видимой строки в индексе
+        self.visible_rows = 1
+        self.selected_key = None
+
+        row_height = ttk.Style(master).lookup('Treeview', 'rowheight')
+        self.row_height = int(row_height) if row_height else self.DEFAULT_ROW_HEIGHT
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self._scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda event: self._scroll_units(3))
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        for sequence in ("<Up>", "<Down>", "<Prior>", "<Next>", "<Home>", "<End>"):
+            self.tree.bind(sequence, self._on_key)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_source(self, fields, keys, get_record):
+        """Задаёт столбцы, индекс ключей и функцию получения записи по ключу."""
+        if list(self.tree["columns"]) != list(fields):
+            self.tree["columns"] = fields
+            for col in fields:
+                self.tree.heading(col, text=col)
+                self.tree.column(col, width=100, anchor='center')
+        self.fields = list(fields)
+        self.keys = list(keys)
+        self.get_record = get_record
+        self.offset = self._clamp_offset(self.offset)
+        self._render()
+
+    def clear(self):
+        self.set_source([], [], None)
+
+    def apply_changes(self, added=(), removed=(), replaced=()):
+        """
+        Точечно обновляет индекс после изменения данных и перерисовывает только видимое окно.
+            added - ключи новых записей (добавляются в конец)
+            removed - ключи удалённых записей
+            replaced - пары (старый ключ, новый ключ) для отредактированных записей
+        """
+        if removed:
+            removed = set(removed)
+            if len(removed) == 1:
+                key = next(iter(removed))
+                if key in self.keys:
+                    self.keys.remove(key)
+            else:
+                self.keys = [key for key in self.keys if key not in removed]
+        for old_key, new_key in replaced:
+            try:
+                self.keys[self.keys.index(old_key)] = new_key
+            except ValueError:
+                self.keys.append(new_key)
+            if self.selected_key == old_key:
+                self.selected_key = new_key
+        self.keys.extend(added)
+        self.offset = self._clamp_offset(self.offset)
+        self._render()
+
+    def yview(self, *args):
+        """Обработчик полосы прокрутки: ('moveto', доля) или ('scroll', n, 'units'/'pages')."""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.keys)))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows
+            self.scroll_to(self.offset + amount)
+
+    def scroll_to(self, offset):
+        offset = self._clamp_offset(offset)
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _clamp_offset(self, offset):
+        return max(0, min(offset, len(self.keys) - self.visible_rows))
+
+    def _scroll_units(self, amount):
+        self.scroll_to(self.offset + amount)
+        return "break"
+
+    def _on_mousewheel(self, event):
+        return self._scroll_units(-3 if event.delta > 0 else 3)
+
+    def _on_configure(self, event):
+        visible_rows = max(1, (event.height - self.HEADER_HEIGHT) // self.row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.offset = self._clamp_offset(self.offset)
+            self._render()
+
+    def _on_select(self, event=None):
+        selection = self.tree.selection()
+        items = self.tree.get_children()
+        if selection and selection[0] in items:
+            self.selected_key = self.keys[self.offset + items.index(selection[0])]
+
+    def _on_key(self, event):
+        """Навигация клавиатурой по всему индексу, а не только по видимому окну."""
+        if not self.keys:
+            return "break"
+        selection = self.tree.selection()
+        items = self.tree.get_children()
+        if selection and selection[0] in items:
+            index = self.offset + items.index(selection[0])
+        else:
+            index = self.offset
+        steps = {'Up': -1, 'Down': 1, 'Prior': -self.visible_rows, 'Next': self.visible_rows}
+        if event.keysym == 'Home':
+            index = 0
+        elif event.keysym == 'End':
+            index = len(self.keys) - 1
+        else:
+            index += steps.get(event.keysym, 0)
+        index = max(0, min(index, len(self.keys) - 1))
+        self.selected_key = self.keys[index]
+        if index < self.offset:
+            self.offset = self._clamp_offset(index)
+        elif index >= self.offset + self.visible_rows:
+            self.offset = self._clamp_offset(index - self.visible_rows + 1)
+        self._render()
+        return "break"
+
+    def _render(self):
+        """
+        Материализует в Treeview только строки видимого окна, переиспользуя существующие элементы.
+        Ключи, записей которых уже нет (их удалила фоновая операция, индекс обновится по её
+        завершении), пропускаются.
+        """
+        window = []
+        for key in self.keys[self.offset:self.offset + self.visible_rows]:
+            try:
+                window.append((key, self.get_record(key)))
+            except (KeyError, ValueError):
+                continue
+        items = self.tree.get_children()
+        for item in items[len(window):]:
+            self.tree.delete(item)
+        selected = None
+        for i, (key, record) in enumerate(window):
+            values = [record.get(field, "") for field in self.fields]
+            if i < len(items):
+                item = items[i]
+                self.tree.item(item, values=values)
+            else:
+                item = self.tree.insert('', 'end', values=values)
+            if key == self.selected_key:
+                selected = item
+        if selected:
+            self.tree.selection_set(selected)
+            self.tree.focus(selected)
+        elif self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.keys)
+        if total <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible_rows) / total)
+
 
-    def export_to_xlsx(self, export_filename):
-        """Экспорт данных базы данных в файл XLSX."""
+class BackgroundJobRunner:
+    """
+    Выполняет долгие файловые операции в фоновом потоке, чтобы окно не зависало.
+
+    Рабочий поток не обращается к Tk: прогресс и результат передаются через очередь,
+    которую главный поток опрашивает через root.after.
+    """
+    POLL_INTERVAL = 50  # мс
+
+    def __init__(self, root, progressbar, status_label, cancel_button):
+        self.root = root
+        self.progressbar = progressbar
+        self.status_label = status_label
+        self.cancel_button = cancel_button
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.events = queue.Queue()
+        self.cancel_event = None
+        self.job = None
+
+    @property
+    def busy(self):
+        return self.job is not None
+
+    def submit(self, title, func, on_success, on_error, on_done=None, cancellable=True):
+        """
+        Запускает func(progress, cancel_event) в фоне.
+        on_success(result), on_error(exception) и on_done() вызываются в главном потоке.
+        """
+        if self.busy:
+            raise RuntimeError("Уже выполняется другая операция.")
+        self.cancel_event = threading.Event()
+        cancel_event = self.cancel_event
+
+        def progress(done, total=None):
+            self.events.put((done, total))
+
+        future = self.executor.submit(func, progress, cancel_event)
+        self.job = (title, future, on_success, on_error, on_done)
+        self.status_label.config(text=f"{title}...")
+        self.progressbar.config(mode='indeterminate')
+        self.progressbar.start()
+        self.cancel_button.config(state=tk.NORMAL if cancellable else tk.DISABLED)
+        self.root.after(self.POLL_INTERVAL, self._poll)
+
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.status_label.config(text="Отмена...")
+
+    def _poll(self):
+        title, future, on_success, on_error, on_done = self.job
+        last = self._drain_events()
+        if not future.done():
+            if last is not None and not self.cancel_event.is_set():
+                self._show_progress(title, *last)
+            self.root.after(self.POLL_INTERVAL, self._poll)
+            return
+
+        self.job = None
+        self.cancel_event = None
+        self._drain_events()
+        self.progressbar.stop()
+        self.progressbar.config(mode='determinate', value=0)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="")
+        if on_done:
+            on_done()
         try:
-            df = self.to_dataframe()
-            df.to_excel(export_filename, index=False, engine='openpyxl')
+            result = future.result()
+        except JobCancelled:
+            self.status_label.config(text=f"{title}: отменено")
+            return
         except Exception as e:
-            raise Exception(f"Не удалось экспортировать данные в XLSX: {e}")
+            on_error(e)
+            return
+        on_success(result)
+
+    def _drain_events(self):
+        last = None
+        while True:
+            try:
+                last = self.events.get_nowait()
+            except queue.Empty:
+                return last
+
+    def _show_progress(self, title, done, total):
+        if not total:
+            # Общее число строк неизвестно (например, CSV) - показываем только счётчик
+            self.status_label.config(text=f"{title}: {done}")
+            return
+        if str(self.progressbar['mode']) != 'determinate':
+            self.progressbar.stop()
+            self.progressbar.config(mode='determinate')
+        self.progressbar.config(maximum=total, value=min(done, total))
+        self.status_label.config(text=f"{title}: {done} из {total}")
+
 
 class DatabaseGUI:
+    SYNC_INTERVAL = 2000  # мс, период синхронизации с сервером
+
     def __init__(self, root):
         self.root = root
         self.root.title("Файловая База Данных")
         self.db = None
         self.create_widgets()
+        self.root.after(self.SYNC_INTERVAL, self.sync_remote)
 
     def create_widgets(self):
         menubar = tk.Menu(self.root)
@@ -164,8 +2249,14 @@ class DatabaseGUI:
         filemenu.add_command(label="Удалить БД", command=self.delete_db)
         filemenu.add_command(label="Очистить БД", command=self.clear_db)
         filemenu.add_command(label="Сохранить БД", command=self.save_db)
-        filemenu.add_command(label="Импорт из XLSX", command=self.import_from_xlsx)
-        filemenu.add_command(label="Экспорт в XLSX", command=self.export_to_xlsx)
+        filemenu.add_command(label="Обновить из файла", command=self.reload_db)
+        filemenu.add_command(label="Подключиться к серверу", command=self.connect_to_server)
+        filemenu.add_command(label="Импорт из XLSX/CSV", command=self.import_from_xlsx)
+        filemenu.add_command(label="Экспорт в XLSX/CSV", command=self.export_to_xlsx)
+        filemenu.add_command(label="Типы столбцов...", command=self.edit_schema)
+        filemenu.add_separator()
+        self.columnar_storage = tk.BooleanVar(value=False)
+        filemenu.add_checkbutton(label="Компактное хранение в памяти", variable=self.columnar_storage)
         filemenu.add_separator()
         filemenu.add_command(label="Выход", command=self.root.quit)
         menubar.add_cascade(label="Файл", menu=filemenu)
@@ -173,20 +2264,48 @@ class DatabaseGUI:
         backupmenu = tk.Menu(menubar, tearoff=0)
         backupmenu.add_command(label="Создать Backup", command=self.create_backup)
         backupmenu.add_command(label="Восстановить из Backup", command=self.restore_backup)
+        backupmenu.add_separator()
+        backupmenu.add_command(label="Инкрементный Backup", command=self.create_incremental_backup)
+        backupmenu.add_command(label="Точки восстановления...", command=self.show_restore_points)
         menubar.add_cascade(label="Backup", menu=backupmenu)
 
+        editmenu = tk.Menu(menubar, tearoff=0)
+        editmenu.add_command(label="Отменить", accelerator="Ctrl+Z", command=self.undo)
+        editmenu.add_command(label="Повторить", accelerator="Ctrl+Y", command=self.redo)
+        menubar.add_cascade(label="Правка", menu=editmenu)
+        self.root.bind_all("<Control-z>", lambda event: self.undo())
+        self.root.bind_all("<Control-y>", lambda event: self.redo())
+
         self.root.config(menu=menubar)
+        self.menubar = menubar
 
         operation_frame = tk.Frame(self.root)
         operation_frame.pack(pady=10)
 
-        tk.Button(operation_frame, text="Добавить", command=self.add_record).grid(row=0, column=0, padx=5)
-        tk.Button(operation_frame, text="Удалить", command=self.delete_record).grid(row=0, column=1, padx=5)
-        tk.Button(operation_frame, text="Поиск", command=self.search_records).grid(row=0, column=2, padx=5)
-        tk.Button(operation_frame, text="Редактировать", command=self.edit_record).grid(row=0, column=3, padx=5)
-
-        self.tree = ttk.Treeview(self.root, show='headings', selectmode='browse')
-        self.tree.pack(pady=10, fill=tk.BOTH, expand=True)
+        self.operation_buttons = [
+            tk.Button(operation_frame, text="Добавить", command=self.add_record),
+            tk.Button(operation_frame, text="Удалить", command=self.delete_record),
+            tk.Button(operation_frame, text="Поиск", command=self.search_records),
+            tk.Button(operation_frame, text="Редактировать", command=self.edit_record),
+        ]
+        for column, button in enumerate(self.operation_buttons):
+            button.grid(row=0, column=column, padx=5)
+
+        # Строка состояния фоновых операций (пакуется до таблицы, чтобы не вытесняться ею)
+        status_frame = tk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
+        status_label = tk.Label(status_frame, anchor='w')
+        status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        cancel_button = tk.Button(status_frame, text="Отмена", state=tk.DISABLED)
+        cancel_button.pack(side=tk.RIGHT, padx=5)
+        progressbar = ttk.Progressbar(status_frame, length=200)
+        progressbar.pack(side=tk.RIGHT)
+        self.jobs = BackgroundJobRunner(self.root, progressbar, status_label, cancel_button)
+        cancel_button.config(command=self.jobs.cancel)
+
+        self.table = VirtualTreeview(self.root)
+        self.table.pack(pady=10, fill=tk.BOTH, expand=True)
+        self.tree = self.table.tree
 
         self.tree.bind("<Control-c>", self.copy_selected)
         self.tree.bind("<Control-C>", self.copy_selected)
@@ -226,7 +2345,10 @@ class DatabaseGUI:
                 messagebox.showerror("Ошибка", "Не заданы ключевые поля.")
                 return
             try:
-                self.db = FileDatabase(filename, key_fields)
+                db = FileDatabase(filename, key_fields, storage=self.storage_mode())
+                if self.db:
+                    self.db.close()
+                self.db = db
                 self.db.fields = fields
                 self.db.save()
                 self.refresh_table()
@@ -239,28 +2361,38 @@ class DatabaseGUI:
                                               title="Открыть базу данных")
         if filename:
             try:
-                self.db = FileDatabase(filename, [])
-                with pd.ExcelFile(filename, engine='openpyxl') as xls:
-                    df = pd.read_excel(xls, sheet_name=0)
-                    fields = df.columns.tolist()
-                key_fields = self.get_key_fields_dialog(fields)
-                if not key_fields:
-                    messagebox.showerror("Ошибка", "Не заданы ключевые поля.")
-                    return
-                if not set(key_fields).issubset(fields):
-                    messagebox.showerror("Ошибка", "Ключевые поля отсутствуют в заголовках файла.")
-                    return
-                self.db = FileDatabase(filename, key_fields)
-                self.refresh_table()
-                messagebox.showinfo("Открытие БД", "База данных успешно открыта.")
+                fields = read_headers(filename)
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Не удалось открыть базу данных: {e}")
+                return
+            key_fields = self.get_key_fields_dialog(fields)
+            if not key_fields:
+                messagebox.showerror("Ошибка", "Не заданы ключевые поля.")
+                return
+            if not set(key_fields).issubset(fields):
+                messagebox.showerror("Ошибка", "Ключевые поля отсутствуют в заголовках файла.")
+                return
+
+            def opened(db):
+                if self.db:
+                    self.db.close()
+                self.db = db
+                self.refresh_table()
+                messagebox.showinfo("Открытие БД", "База данных успешно открыта.")
+
+            self.run_job("Открытие БД",
+                         lambda progress, cancel_event: FileDatabase(filename, key_fields, progress, cancel_event,
+                                                                     storage=self.storage_mode()),
+                         opened, "Не удалось открыть базу данных")
 
     def delete_db(self):
         if self.db:
+            if isinstance(self.db, RemoteDatabase):
+                messagebox.showwarning("Удаление БД", "Удалить можно только локальную базу данных.")
+                return
             if messagebox.askyesno("Удаление БД", f"Удалить базу данных {os.path.basename(self.db.filename)}?"):
                 try:
-                    os.remove(self.db.filename)
+                    self.db.delete()
                     self.db = None
                     self.refresh_table()
                     messagebox.showinfo("Удаление БД", "База данных успешно удалена.")
@@ -281,16 +2413,77 @@ class DatabaseGUI:
         else:
             messagebox.showwarning("Очистка БД", "Нет открытой базы данных.")
 
-    def save_db(self):
+    def save_db(self, force=False):
         if self.db:
-            try:
-                self.db.save()
-                messagebox.showinfo("Сохранение БД", "База данных успешно сохранена.")
-            except Exception as e:
+            def failed(e):
+                if isinstance(e, ConcurrentModificationError):
+                    if messagebox.askyesno("Сохранение БД", "Файл базы изменён другим процессом после загрузки.\n"
+                                           "Перезаписать его вашими данными? (Нет - оставить файл без изменений)"):
+                        self.save_db(force=True)
+                    return
                 messagebox.showerror("Ошибка", f"Не удалось сохранить базу данных: {e}")
+
+            self.run_job("Сохранение БД",
+                         lambda progress, cancel_event: self.db.save(progress, cancel_event, force=force),
+                         lambda result: messagebox.showinfo("Сохранение БД", "База данных успешно сохранена."),
+                         "Не удалось сохранить базу данных", on_error=failed)
         else:
             messagebox.showwarning("Сохранение БД", "Нет открытой базы данных.")
 
+    def reload_db(self):
+        """Перечитывает базу, если файл изменил другой процесс (несохранённые изменения теряются)."""
+        if not self.db:
+            messagebox.showwarning("Обновление БД", "Нет открытой базы данных.")
+            return
+
+        def reloaded(changed):
+            if changed:
+                self.refresh_table()
+            messagebox.showinfo("Обновление БД", "Данные обновлены." if changed else "Изменений нет.")
+
+        self.run_job("Обновление БД",
+                     lambda progress, cancel_event: self.db.reload_if_changed(progress, cancel_event),
+                     reloaded, "Не удалось обновить базу данных")
+
+    def connect_to_server(self):
+        address = simpledialog.askstring("Подключение к серверу", "Адрес сервера (хост:порт):",
+                                         initialvalue="127.0.0.1:6000", parent=self.root)
+        if not address:
+            return
+        authkey = simpledialog.askstring("Подключение к серверу", "Ключ доступа:", show='*', parent=self.root)
+        if not authkey:
+            return
+        try:
+            host, port = address.rsplit(':', 1)
+            port = int(port)
+        except ValueError:
+            messagebox.showerror("Ошибка", "Адрес должен быть в виде хост:порт.")
+            return
+
+        def connected(db):
+            if self.db:
+                self.db.close()
+            self.db = db
+            self.refresh_table()
+            messagebox.showinfo("Подключение к серверу", "Подключение установлено.")
+
+        self.run_job("Подключение к серверу",
+                     lambda progress, cancel_event: RemoteDatabase((host, port), authkey.encode('utf-8'),
+                                                                   storage=self.storage_mode()),
+                     connected, "Не удалось подключиться к серверу")
+
+    def sync_remote(self):
+        """Периодически подтягивает изменения других клиентов сервера."""
+        if isinstance(self.db, RemoteDatabase) and not self.jobs.busy:
+            try:
+                if self.db.sync():
+                    self.refresh_table()
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Связь с сервером потеряна: {e}")
+                self.db = None
+                self.refresh_table()
+        self.root.after(self.SYNC_INTERVAL, self.sync_remote)
+
     def create_backup(self):
         if self.db:
             backup_filename = filedialog.asksaveasfilename(defaultextension=".xlsx",
@@ -319,33 +2512,129 @@ class DatabaseGUI:
         else:
             messagebox.showwarning("Restore", "Нет открытой базы данных.")
 
+    def create_incremental_backup(self):
+        if not self.db:
+            messagebox.showwarning("Backup", "Нет открытой базы данных.")
+            return
+        self.run_job("Инкрементный Backup",
+                     lambda progress, cancel_event: self.db.incremental_backup(progress=progress, cancel_event=cancel_event),
+                     lambda manifest: messagebox.showinfo(
+                         "Backup", f"Backup успешно создан.\nЗаписей: {manifest['records']}\n"
+                                   f"Новых чанков: {manifest['new_chunks']} из {len(manifest['chunks'])}"),
+                     "Не удалось создать backup")
+
+    def show_restore_points(self):
+        if not self.db:
+            messagebox.showwarning("Restore", "Нет открытой базы данных.")
+            return
+        try:
+            points = self.db.list_restore_points()
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось прочитать точки восстановления: {e}")
+            return
+        if not points:
+            messagebox.showinfo("Restore", "Точек восстановления пока нет.")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Точки восстановления")
+        listbox = tk.Listbox(dialog, width=70, selectmode=tk.BROWSE)
+        for point in reversed(points):
+            listbox.insert(tk.END, f"{point['created']}  —  записей: {point['records']}, "
+                                   f"новых чанков: {point['new_chunks']} из {len(point['chunks'])}")
+        listbox.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
+
+        def restored(stats):
+            self.refresh_table()
+            messagebox.showinfo("Restore", "База данных успешно восстановлена из backup.\n"
+                                f"Прочитано чанков: {stats['chunks_read']}, без изменений: {stats['chunks_kept']}")
+
+        def submit():
+            selected = listbox.curselection()
+            if not selected:
+                messagebox.showerror("Ошибка", "Выберите точку восстановления.")
+                return
+            snapshot_id = list(reversed(points))[selected[0]]['id']
+            dialog.destroy()
+            self.run_job("Восстановление из Backup",
+                         lambda progress, cancel_event: self.db.restore_point(
+                             snapshot_id, progress=progress, cancel_event=cancel_event),
+                         restored, "Не удалось восстановить из backup")
+
+        tk.Button(dialog, text="Восстановить", command=submit).pack(pady=5)
+
     def import_from_xlsx(self):
         if not self.db:
             messagebox.showwarning("Импорт из XLSX", "Нет открытой базы данных.")
             return
-        import_filename = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")],
-                                                     title="Импорт из XLSX")
+        import_filename = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")],
+                                                     title="Импорт из XLSX/CSV")
         if import_filename:
-            try:
-                self.db.import_from_xlsx(import_filename)
-                self.refresh_table()
-                messagebox.showinfo("Импорт из XLSX", "Импорт успешно выполнен.")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось импортировать данные: {e}")
+            on_conflict = self.get_conflict_policy_dialog()
+            if not on_conflict:
+                return
 
-    def export_to_xlsx(self):
+            def imported(summary):
+                self.refresh_table()
+                messagebox.showinfo("Импорт из XLSX", "Импорт успешно выполнен.\n"
+                                    f"Добавлено: {summary['inserted']}\n"
+                                    f"Обновлено: {summary['updated']}\n"
+                                    f"Пропущено: {summary['skipped']}")
+
+            self.run_job("Импорт из XLSX",
+                         lambda progress, cancel_event: self.db.import_from_xlsx(
+                             import_filename, on_conflict, progress=progress, cancel_event=cancel_event),
+                         imported, "Не удалось импортировать данные")
+
+    def export_to_xlsx(self, records=None):
+        """Экспорт всей базы или переданного подмножества записей (например, результатов поиска)."""
         if not self.db:
             messagebox.showwarning("Экспорт в XLSX", "Нет открытой базы данных.")
             return
         export_filename = filedialog.asksaveasfilename(defaultextension=".xlsx",
-                                                       filetypes=[("Excel files", "*.xlsx")],
+                                                       filetypes=[("Excel files", "*.xlsx"),
+                                                                  ("CSV files", "*.csv"),
+                                                                  ("Parquet files", "*.parquet")],
                                                        title="Экспорт в XLSX")
         if export_filename:
-            try:
-                self.db.export_to_xlsx(export_filename)
-                messagebox.showinfo("Экспорт в XLSX", "Экспорт успешно выполнен.")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось экспортировать данные: {e}")
+            self.run_job("Экспорт в XLSX",
+                         lambda progress, cancel_event: self.db.export_to_xlsx(
+                             export_filename, records, progress, cancel_event),
+                         lambda count: messagebox.showinfo("Экспорт в XLSX", f"Экспорт успешно выполнен. Записей: {count}"),
+                         "Не удалось экспортировать данные")
+
+    def storage_mode(self):
+        """Режим хранения для новых и открываемых баз (пункт меню «Компактное хранение»)."""
+        return 'columnar' if self.columnar_storage.get() else 'dict'
+
+    def run_job(self, title, func, on_success, error_message, cancellable=True, on_error=None):
+        """
+        Запускает func(progress, cancel_event) в фоновом потоке.
+        На время работы меню и кнопки операций блокируются, чтобы данные не менялись параллельно.
+        """
+        if not self.ensure_idle(title):
+            return
+        self.set_controls_state(tk.DISABLED)
+        self.jobs.submit(title, func, on_success,
+                         on_error=on_error or (lambda e: messagebox.showerror("Ошибка", f"{error_message}: {e}")),
+                         on_done=lambda: self.set_controls_state(tk.NORMAL),
+                         cancellable=cancellable)
+
+    def ensure_idle(self, title):
+        """
+        Можно ли менять или читать базу: пока фоновая операция её сохраняет, восстанавливает
+        или импортирует, окна, открытые раньше, не должны к ней обращаться.
+        """
+        if self.jobs.busy:
+            messagebox.showwarning(title, "Дождитесь завершения текущей операции.")
+            return False
+        return True
+
+    def set_controls_state(self, state):
+        for button in self.operation_buttons:
+            button.config(state=state)
+        for label in ("Файл", "Backup", "Правка"):
+            self.menubar.entryconfig(label, state=state)
 
     def add_record(self):
         if not self.db:
@@ -371,22 +2660,55 @@ class DatabaseGUI:
             return
         EditWindow(self)
 
+    def edit_schema(self):
+        if not self.db:
+            messagebox.showwarning("Типы столбцов", "Нет открытой базы данных.")
+            return
+        SchemaWindow(self)
+
     def refresh_table(self, df=None):
-        """Обновляет данные в таблице GUI."""
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        if self.db:
-            try:
-                self.tree["columns"] = self.db.fields
-                for col in self.db.fields:
-                    self.tree.heading(col, text=col)
-                    self.tree.column(col, width=100, anchor='center')
-                display_df = df if df is not None else self.db.to_dataframe()
-                for _, row in display_df.iterrows():
-                    values = [row.get(field, "") for field in self.db.fields]
-                    self.tree.insert('', 'end', values=values)
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось обновить таблицу: {e}")
+        """Перестраивает индекс таблицы GUI. Отрисовывается только видимое окно строк."""
+        if not self.db:
+            self.table.clear()
+            return
+        try:
+            if df is not None:
+                records = df.to_dict('records')
+                self.table.set_source(self.db.fields, range(len(records)), records.__getitem__)
+            else:
+                self.table.set_source(self.db.fields, self.db.hash_table.keys(), self.db.search_records)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить таблицу: {e}")
+
+    def undo(self):
+        self._apply_history(lambda: self.db.undo(), "Отмена")
+
+    def redo(self):
+        self._apply_history(lambda: self.db.redo(), "Повтор")
+
+    def _apply_history(self, action, title):
+        if not self.db:
+            messagebox.showwarning(title, "Нет открытой базы данных.")
+            return
+        if self.jobs.busy:
+            return
+        try:
+            changes = action()
+        except ValueError as ve:
+            messagebox.showinfo(title, str(ve))
+            return
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"{title} не выполнена: {e}")
+            return
+        # Изменённые записи на месте перерисуются из базы вместе с видимым окном
+        self.refresh_rows(added=changes['added'], removed=changes['removed'])
+
+    def refresh_rows(self, added=(), removed=(), replaced=()):
+        """Точечно обновляет таблицу после изменения отдельных записей."""
+        try:
+            self.table.apply_changes(added=added, removed=removed, replaced=replaced)
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить таблицу: {e}")
 
     def get_fields_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -413,6 +2735,26 @@ class DatabaseGUI:
         self.root.wait_window(dialog)
         return fields
 
+    def get_conflict_policy_dialog(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Импорт: совпадающие ключи")
+        tk.Label(dialog, text="Что делать с записями, ключ которых уже есть в базе?").pack(padx=10, pady=5)
+        policy = tk.StringVar(value='skip')
+        options = [("Пропустить", 'skip'), ("Заменить", 'overwrite'), ("Дополнить непустыми полями", 'merge')]
+        for text, value in options:
+            tk.Radiobutton(dialog, text=text, variable=policy, value=value).pack(anchor='w', padx=10)
+
+        result = None
+
+        def submit():
+            nonlocal result
+            result = policy.get()
+            dialog.destroy()
+
+        tk.Button(dialog, text="OK", command=submit).pack(pady=5)
+        self.root.wait_window(dialog)
+        return result
+
     def get_key_fields_dialog(self, available_fields):
         dialog = tk.Toplevel(self.root)
         dialog.title("Выбор Ключевых Полей")
@@ -472,8 +2814,8 @@ class AddEditWindow:
             entry.bind("<Control-v>", on_paste)
             entry.bind("<Control-V>", on_paste)
 
-            if record:
-                entry.insert(0, record.get(field, ""))
+            if record and record.get(field) is not None:
+                entry.insert(0, record[field])
 
             self.entries[field] = entry
 
@@ -481,6 +2823,8 @@ class AddEditWindow:
         tk.Button(self.window, text="Отмена", command=self.window.destroy).grid(row=len(self.fields)+start_row, column=1, pady=10, padx=5)
 
     def save(self):
+        if not self.parent.ensure_idle("Сохранение"):
+            return
         record = {}
         for field, entry in self.entries.items():
             value = entry.get().strip()
@@ -491,10 +2835,11 @@ class AddEditWindow:
         try:
             if self.record:
                 key = tuple(self.record[f] for f in self.parent.db.key_fields)
-                self.parent.db.edit_record(key, record)
+                new_key = self.parent.db.edit_record(key, record)
+                self.parent.refresh_rows(replaced=[(key, new_key)])
             else:
-                self.parent.db.add_record(record)
-            self.parent.refresh_table()
+                key = self.parent.db.add_record(record)
+                self.parent.refresh_rows(added=[key])
             self.window.destroy()
             messagebox.showinfo("Сохранение", "Запись успешно сохранена.")
         except ValueError as ve:
@@ -502,6 +2847,45 @@ class AddEditWindow:
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось сохранить запись: {e}")
 
+class SchemaWindow:
+    """Задание типов столбцов; значения всех записей приводятся к выбранным типам."""
+    def __init__(self, parent):
+        self.parent = parent
+        self.window = tk.Toplevel()
+        self.window.title("Типы Столбцов")
+        self.type_vars = {}
+
+        fields = parent.db.fields
+        for idx, field in enumerate(fields):
+            label = f"{field} (ключ)" if field in parent.db.key_fields else field
+            tk.Label(self.window, text=label).grid(row=idx, column=0, padx=5, pady=5, sticky='e')
+            var = tk.StringVar(value=parent.db.column_type(field))
+            ttk.Combobox(self.window, textvariable=var, values=COLUMN_TYPES,
+                         state='readonly', width=10).grid(row=idx, column=1, padx=5, pady=5, sticky='w')
+            self.type_vars[field] = var
+
+        tk.Button(self.window, text="Применить", command=self.apply).grid(row=len(fields), column=0, pady=10, padx=5)
+        tk.Button(self.window, text="Отмена", command=self.window.destroy).grid(row=len(fields), column=1, pady=10, padx=5)
+
+    def apply(self):
+        if not self.parent.ensure_idle("Типы столбцов"):
+            return
+        db = self.parent.db
+        try:
+            for field, var in self.type_vars.items():
+                if var.get() != db.column_type(field):
+                    db.set_field_type(field, var.get())
+        except ValueError as ve:
+            messagebox.showerror("Ошибка", str(ve))
+            return
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось изменить типы столбцов: {e}")
+            return
+        finally:
+            self.parent.refresh_table()
+        self.window.destroy()
+        messagebox.showinfo("Типы столбцов", "Типы столбцов изменены. Сохраните базу, чтобы записать их в файл.")
+
 class DeleteWindow:
     def __init__(self, parent):
         self.parent = parent
@@ -519,14 +2903,16 @@ class DeleteWindow:
         tk.Button(self.window, text="Удалить", command=self.delete).grid(row=2, column=0, columnspan=2, pady=10)
 
     def delete(self):
+        if not self.parent.ensure_idle("Удаление"):
+            return
         field = self.field_var.get()
         value = self.value_entry.get().strip()
         if not value:
             messagebox.showerror("Ошибка", "Значение не может быть пустым.")
             return
         try:
-            self.parent.db.delete_records(field=field, value=value)  # Передаём field и value
-            self.parent.refresh_table()
+            deleted = self.parent.db.delete_records(field=field, value=value)  # Передаём field и value
+            self.parent.refresh_rows(removed=deleted)
             self.window.destroy()
             messagebox.showinfo("Удаление", "Запись(и) успешно удалены.")
         except ValueError as ve:
@@ -552,6 +2938,8 @@ class SearchWindow:
         tk.Button(self.window, text="Поиск", command=self.search).grid(row=2, column=0, columnspan=2, pady=10)
 
     def search(self):
+        if not self.parent.ensure_idle("Поиск"):
+            return
         field = self.field_var.get()
         value = self.value_entry.get().strip()
         if not value:
@@ -559,11 +2947,10 @@ class SearchWindow:
             return
 
         try:
-            df = self.parent.db.to_dataframe()
-            mask = (df[field] == value)
-            results = df[mask]
+            # Значение приводится к типу поля один раз, сравнение идёт без преобразований записей
+            results = list(self.parent.db.iter_records(field, value))
 
-            if results.empty:
+            if not results:
                 messagebox.showinfo("Поиск", "Записи не найдены.")
                 return
 
@@ -573,16 +2960,19 @@ class SearchWindow:
             tree = ttk.Treeview(result_window, show='headings', selectmode='browse')
             tree.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
 
-            cols = results.columns.tolist()
+            cols = self.parent.db.fields
             tree["columns"] = cols
             for col in cols:
                 tree.heading(col, text=col)
                 tree.column(col, width=100, anchor='center')
 
-            for _, row in results.iterrows():
-                values = [row[col] for col in cols]
+            for record in results:
+                values = [record.get(col, "") for col in cols]
                 tree.insert('', 'end', values=values)
 
+            tk.Button(result_window, text="Экспорт результатов",
+                      command=lambda: self.parent.export_to_xlsx(results)).pack(pady=5)
+
             messagebox.showinfo("Поиск", f"Найдено записей: {len(results)}")
             self.window.destroy()
 
@@ -605,22 +2995,29 @@ class EditWindow:
         tk.Button(self.window, text="Загрузить", command=self.load_record).grid(row=1, column=0, columnspan=2, pady=10)
 
     def load_record(self):
+        if not self.parent.ensure_idle("Редактирование"):
+            return
         key_input = self.key_entry.get().strip()
         if not key_input:
             messagebox.showerror("Ошибка", "Ключ не может быть пустым.")
             return
 
         try:
-            key_field = self.parent.db.key_fields[0]
-            df = self.parent.db.to_dataframe()  # Создаём DataFrame для фильтрации
-            mask = (df[key_field] == key_input)
-            results = df[mask]
+            db = self.parent.db
+            key_field = db.key_fields[0]
+            if len(db.key_fields) == 1:
+                # Ключ целиком - поиск по хеш-таблице за O(1)
+                try:
+                    record_dict = db.search_records([key_input])
+                except ValueError:
+                    record_dict = None
+            else:
+                record_dict = next(db.iter_records(key_field, key_input), None)
 
-            if results.empty:
+            if record_dict is None:
                 messagebox.showerror("Ошибка", "Запись не найдена.")
                 return
 
-            record_dict = results.iloc[0].to_dict()
             self.window.destroy()
             AddEditWindow(self.parent, "Редактировать Запись", record_dict)
 
@@ -628,7 +3025,38 @@ class EditWindow:
             messagebox.showerror("Ошибка", f"Не удалось загрузить запись: {e}")
 
 
+def serve(filename, key_fields, host, port, authkey):
+    """Запускает локальный сервер базы до Ctrl+C, после чего база сохраняется."""
+    server = DatabaseServer(FileDatabase(filename, key_fields, access='w'), (host, port), authkey)
+    print(f"Сервер базы {filename} запущен на {server.address[0]}:{server.address[1]}. Ctrl+C - остановка.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            server.shutdown()
+        except Exception as e:
+            print(f"Не удалось сохранить базу: {e}")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Файловая база данных на Excel")
+    parser.add_argument('--serve', metavar='FILE', help="вместо GUI запустить локальный сервер для файла базы")
+    parser.add_argument('--keys', help="ключевые поля через запятую (для --serve)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6000)
+    args = parser.parse_args()
+    if args.serve:
+        authkey = os.environ.get('PERSONAL_EXCEL_AUTHKEY')
+        if not authkey:
+            parser.error("задайте ключ доступа в переменной окружения PERSONAL_EXCEL_AUTHKEY")
+        if not args.keys:
+            parser.error("для --serve нужно указать --keys")
+        key_fields = [field.strip() for field in args.keys.split(',') if field.strip()]
+        serve(args.serve, key_fields, args.host, args.port, authkey.encode('utf-8'))
+        return
+
     root = tk.Tk()
     app = DatabaseGUI(root)
     root.geometry("800x600")